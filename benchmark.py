@@ -0,0 +1,89 @@
+import argparse
+import sys
+
+from hyperprob import benchmarkrunner, modelgenerator
+from hyperprob.utility import common
+
+
+def parseArguments():
+    parser = argparse.ArgumentParser(description='Runs the A-HyperProb benchmarks and compares their results.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='run the benchmark matrix')
+    run_parser.add_argument('-matrix', default='benchmark/benchmarks.json',
+                            help='path to the JSON file declaring the benchmark matrix')
+    run_parser.add_argument('-output', required=True, help='result file, written as CSV if it ends with .csv and as JSON otherwise')
+    run_parser.add_argument('-timeout', type=float, required=False, help='timeout per instance in seconds')
+    run_parser.add_argument('-filter', required=False, help='only run benchmarks whose name contains this string')
+    run_parser.add_argument('--verbose', action='store_true', help='show the output of the model checker')
+
+    compare_parser = subparsers.add_parser('compare', help='compare results against a stored baseline')
+    compare_parser.add_argument('-baseline', required=True, help='result file of the baseline')
+    compare_parser.add_argument('-current', required=True, help='result file to compare')
+    compare_parser.add_argument('-tolerance', type=float, default=0.2, help='relative increase tolerated')
+    compare_parser.add_argument('-minSeconds', type=float, default=1.0,
+                                help='absolute increase in seconds tolerated for times')
+
+    plot_parser = subparsers.add_parser('plot', help='plot a measured quantity against a parameter')
+    plot_parser.add_argument('-results', required=True, help='result file to plot')
+    plot_parser.add_argument('-x', default='size', help='parameter on the x-axis, e.g. size or stutterLength')
+    plot_parser.add_argument('-y', default='encoding_time', help='quantity on the y-axis, e.g. smt_time or peak_memory')
+    plot_parser.add_argument('-groupBy', required=False, help='draw one curve per value of this parameter')
+    plot_parser.add_argument('-output', required=True, help='image file to write')
+
+    generate_parser = subparsers.add_parser('generate', help='generate a synthetic model and a matching property')
+    generate_parser.add_argument('-size', type=int, required=True, help='number of steps of the generated thread')
+    generate_parser.add_argument('-branching', type=int, default=1, help='number of probabilistic successors')
+    generate_parser.add_argument('-actionSets', type=int, default=1, help='number of different sets of enabled actions')
+    generate_parser.add_argument('-quantifiers', type=int, default=2, help='number of state quantifiers')
+    generate_parser.add_argument('-template', default='future', choices=modelgenerator.TEMPLATES,
+                                 help='temporal operator used in the property')
+    generate_parser.add_argument('-output', required=True, help='PRISM file to write')
+
+    terms_parser = subparsers.add_parser('terms', help='compare the construction of terms through the z3 Python API '
+                                                       'and the TermBuilder')
+    terms_parser.add_argument('-states', type=int, default=10000, help='number of composed states encoded')
+    terms_parser.add_argument('-successors', type=int, default=4, help='number of successors of each composed state')
+    return parser.parse_args()
+
+
+def main():
+    input_args = parseArguments()
+    if input_args.command == 'run':
+        records = benchmarkrunner.runBenchmarks(input_args.matrix, input_args.timeout, input_args.filter,
+                                                input_args.verbose)
+        benchmarkrunner.writeResults(records, input_args.output)
+        common.colouroutput("Results written to " + input_args.output)
+    elif input_args.command == 'compare':
+        regressions = benchmarkrunner.compareResults(benchmarkrunner.loadResults(input_args.baseline),
+                                                     benchmarkrunner.loadResults(input_args.current),
+                                                     input_args.tolerance, input_args.minSeconds)
+        if regressions:
+            common.colourerror("Found " + str(len(regressions)) + " regressions:")
+            for regression in regressions:
+                common.colourerror(regression, False)
+            sys.exit(1)
+        common.colouroutput("No regressions found.")
+    elif input_args.command == 'plot':
+        try:
+            benchmarkrunner.plotResults(benchmarkrunner.loadResults(input_args.results), input_args.x, input_args.y,
+                                        input_args.output, input_args.groupBy)
+        except ImportError as err:
+            common.colourerror(str(err))
+            sys.exit(1)
+        common.colouroutput("Plot written to " + input_args.output)
+    elif input_args.command == 'generate':
+        with open(input_args.output, 'w') as model_file:
+            model_file.write(modelgenerator.generateModel(input_args.size, input_args.branching, input_args.actionSets))
+        common.colouroutput("Model written to " + input_args.output)
+        common.colouroutput("Property: " + modelgenerator.generateProperty(input_args.quantifiers, input_args.template), False)
+    elif input_args.command == 'terms':
+        rates = benchmarkrunner.measureTermConstruction(input_args.states, input_args.successors)
+        common.colouroutput("Built " + str(rates['terms']) + " terms each way.")
+        common.colouroutput("z3 Python API: " + str(round(rates['python_api'])) + " terms per second", False)
+        common.colouroutput("TermBuilder: " + str(round(rates['term_builder'])) + " terms per second", False)
+        common.colouroutput("Speedup: " + str(round(rates['term_builder'] / rates['python_api'], 2)), False)
+
+
+if __name__ == "__main__":
+    main()
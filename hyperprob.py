@@ -1,34 +1,150 @@
+import sys
+
 from hyperprob.inputparser import parseArguments
 from hyperprob.utility import common
 from hyperprob.propertyparser import Property
-from hyperprob.modelparser import Model
-from hyperprob.modelchecker import ModelChecker
+from hyperprob.utility.tracing import tracer
+
+# stormpy and z3 take seconds to import, so hyperprob.modelparser and hyperprob.modelchecker
+# are only imported on the paths that need them
+
+
+def readPropertyFile(path):
+    """
+    Parse the properties in a file, one per line. Empty lines and lines starting with # are skipped.
+    :return: list of parsed properties
+    """
+    list_of_properties = []
+    with open(path) as property_file:
+        for line in property_file:
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            hyperproperty = Property(line)
+            hyperproperty.parseProperty(False)
+            if hyperproperty.parsed_property is None:
+                raise ValueError("Property " + line + " could not be parsed")
+            list_of_properties.append(hyperproperty)
+    if len(list_of_properties) == 0:
+        raise ValueError("The property file " + path + " contains no properties")
+    return list_of_properties
 
 
 def main():
     try:
         input_args = parseArguments()
-        if input_args.checkProperty:
+        if input_args.traceFile:
+            tracer.enable()
+        if input_args.server:
+            from hyperprob.server import Server
+            server = Server(input_args.workers, input_args.cacheSize)
+            if input_args.socket:
+                server.serveSocket(input_args.socket)
+            else:
+                server.serveStdin()
+            return
+        if input_args.coordinator:
+            from hyperprob.distributed import Coordinator, readJobs
+            if input_args.jobFile:
+                with open(input_args.jobFile) as job_file:
+                    jobs, invalid = readJobs(job_file)
+            else:
+                jobs, invalid = readJobs(sys.stdin)
+            Coordinator(jobs, input_args.retries, input_args.jobTimeout).serve(input_args.host, input_args.port,
+                                                                                invalid)
+            return
+        if input_args.worker:
+            from hyperprob.distributed import serveWorkers
+            serveWorkers(input_args.host, input_args.port, input_args.workers, input_args.cacheSize,
+                         input_args.memoryLimit)
+            return
+        if input_args.checkProperty and input_args.hyperString:
             hyperproperty = Property(input_args.hyperString)
             hyperproperty.parseProperty(True)
         if input_args.checkModel:
+            from hyperprob.modelparser import Model
             model = Model(input_args.modelPath)
             model.parseModel(False)
+        if input_args.propertyFile and not input_args.checkModel:
+            list_of_properties = readPropertyFile(input_args.propertyFile)
+            if input_args.checkProperty:
+                for hyperproperty in list_of_properties:
+                    hyperproperty.printProperty()
         if not input_args.checkModel and not input_args.checkProperty:
-            hyperproperty = Property(input_args.hyperString)
-            hyperproperty.parseProperty(False)
-            model = Model(input_args.modelPath)
+            from hyperprob.resultcache import ResultCache, printCachedResult
+            from hyperprob.witnesscache import WitnessCache, DEFAULT_CACHE_DIRECTORY
+            if not input_args.propertyFile:
+                hyperproperty = Property(input_args.hyperString)
+                hyperproperty.parseProperty(False)
             if input_args.stutterLength:
                 stutterLength = int(input_args.stutterLength)
             else:
                 stutterLength = 1
-            model.parseModel(True)
             if input_args.maxSchedProb:
                 maxSchedProb = float(input_args.maxSchedProb)
             else:
                 maxSchedProb = 0.99
-            modelchecker = ModelChecker(model, hyperproperty, stutterLength, maxSchedProb)
-            modelchecker.modelCheck()
+            # results of single properties are cached, unless the encoding itself is asked for
+            resultCache = None
+            cached_result = None
+            parameters = {'stutterLength': stutterLength, 'maxSchedProb': maxSchedProb,
+                          'boundedHorizon': input_args.boundedHorizon}
+            if not input_args.propertyFile and not input_args.dryRun and hyperproperty.parsed_property is not None:
+                resultCache = ResultCache(input_args.cacheDir or DEFAULT_CACHE_DIRECTORY)
+                if not input_args.noCache and not input_args.smtLibFile and not input_args.encodingReport:
+                    cached_result = resultCache.load(input_args.modelPath, hyperproperty.parsed_property, parameters)
+            if cached_result is None:
+                from hyperprob.modelparser import Model
+                from hyperprob.modelchecker import ModelChecker, MultiPropertyChecker
+                model = Model(input_args.modelPath)
+                model.parseModel(True)
+            witnessCache = None
+            if not input_args.noWarmStart:
+                witnessCache = WitnessCache(input_args.cacheDir or DEFAULT_CACHE_DIRECTORY)
+            if cached_result is not None:
+                printCachedResult(cached_result)
+            elif input_args.propertyFile and input_args.dryRun:
+                fits = [ModelChecker(model, hyperproperty, stutterLength, maxSchedProb,
+                                     boundedHorizon=input_args.boundedHorizon,
+                                     probabilityBounds=input_args.probabilityBounds).dryRun(input_args.memoryLimit)
+                        for hyperproperty in list_of_properties]
+                if not all(fits):
+                    sys.exit(2)
+            elif input_args.propertyFile:
+                MultiPropertyChecker(model, list_of_properties, stutterLength, maxSchedProb,
+                                     encodingWorkers=input_args.encodingWorkers,
+                                     boundedHorizon=input_args.boundedHorizon,
+                                     witnessCache=witnessCache,
+                                     lazyQuantifiers=input_args.lazyQuantifiers,
+                                     probabilityBounds=input_args.probabilityBounds,
+                                     preCheck=input_args.preCheck,
+                                     witnessSearch=input_args.witnessSearch,
+                                     searchWorkers=input_args.searchWorkers,
+                                     encodingReport=input_args.encodingReport).modelCheck()
+            else:
+                modelchecker = ModelChecker(model, hyperproperty, stutterLength, maxSchedProb,
+                                            encodingWorkers=input_args.encodingWorkers,
+                                            boundedHorizon=input_args.boundedHorizon,
+                                            witnessCache=witnessCache,
+                                            lazyQuantifiers=input_args.lazyQuantifiers,
+                                            probabilityBounds=input_args.probabilityBounds,
+                                            preCheck=input_args.preCheck,
+                                            witnessSearch=input_args.witnessSearch,
+                                            searchWorkers=input_args.searchWorkers,
+                                            smtLibFile=input_args.smtLibFile,
+                                            encodingReport=input_args.encodingReport)
+                if input_args.dryRun:
+                    if not modelchecker.dryRun(input_args.memoryLimit):
+                        sys.exit(2)
+                else:
+                    modelchecker.modelCheck()
+                    if resultCache is not None:
+                        resultCache.store(input_args.modelPath, hyperproperty.parsed_property, parameters,
+                                          modelchecker.statistics, modelchecker.witness,
+                                          modelchecker.satisfying_tuples)
+        if input_args.traceFile:
+            tracer.exportChromeTrace(input_args.traceFile)
+            common.colourinfo("Trace written to " + input_args.traceFile)
         print("\n")
     except Exception as err:
         common.colourerror("Unexpected error encountered: " + str(err))
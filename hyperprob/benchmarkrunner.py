@@ -0,0 +1,328 @@
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from hyperprob import modelgenerator
+from hyperprob.utility import common
+from hyperprob.utility.memory import getPeakMemory
+
+# order of the columns in the result files, additional entries are appended in alphabetical order
+FIELDS = ['name', 'model', 'property', 'stutterLength', 'maxSchedProb', 'status', 'verdict',
+          'parse_time', 'build_time', 'rebuild_time', 'encoding_time', 'smt_time', 'wall_time',
+          'no_of_variables', 'no_of_subformula', 'states', 'actions', 'transitions', 'peak_memory',
+          'quantifier_peak_memory', 'error']
+TIME_FIELDS = ['parse_time', 'build_time', 'rebuild_time', 'encoding_time', 'smt_time', 'wall_time']
+SIZE_FIELDS = ['no_of_variables', 'no_of_subformula', 'peak_memory', 'quantifier_peak_memory']
+GENERATOR_FIELDS = ['size', 'branching', 'actionSets', 'quantifiers', 'template']
+
+
+def loadMatrix(matrix_path):
+    """
+    Expand the declared benchmark matrix into single instances.
+    Each benchmark lists models, properties, stutterLength and maxSchedProb values; every combination is one instance.
+    Instead of models and properties, a benchmark can declare value lists for the parameters of the synthetic
+    model generator. Generated models are written to the directory 'generated' next to the matrix file.
+    Model paths are relative to the directory of the matrix file.
+    :param matrix_path: path to the JSON file declaring the matrix
+    :return: list of instances, timeout per instance in seconds
+    """
+    with open(matrix_path) as matrix_file:
+        matrix = json.load(matrix_file)
+    base_directory = os.path.dirname(os.path.abspath(matrix_path))
+    instances = []
+    for benchmark in matrix['benchmarks']:
+        if 'generator' in benchmark:
+            instances.extend(generateInstances(benchmark, base_directory))
+            continue
+        for model, hyperstring, stutter_length, max_sched_prob in itertools.product(
+                benchmark['models'], benchmark['properties'],
+                benchmark.get('stutterLength', [1]), benchmark.get('maxSchedProb', [0.99])):
+            instances.append({'name': benchmark['name'], 'model': model, 'property': hyperstring,
+                              'stutterLength': int(stutter_length), 'maxSchedProb': float(max_sched_prob)})
+    return instances, matrix.get('timeout')
+
+
+def generateInstances(benchmark, base_directory):
+    """
+    Generate the models of a synthetic benchmark and expand it into single instances
+    :param benchmark: benchmark declaring value lists for size, branching, actionSets, quantifiers and template
+    :param base_directory: directory of the matrix file
+    :return: list of instances
+    """
+    generator = benchmark['generator']
+    os.makedirs(os.path.join(base_directory, 'generated'), exist_ok=True)
+    instances = []
+    for size, branching, action_sets in itertools.product(
+            generator['size'], generator.get('branching', [1]), generator.get('actionSets', [1])):
+        model = os.path.join('generated', benchmark['name'] + "_n" + str(size) + "_b" + str(branching) +
+                             "_a" + str(action_sets) + ".nm")
+        with open(os.path.join(base_directory, model), 'w') as model_file:
+            model_file.write(modelgenerator.generateModel(size, branching, action_sets))
+        for quantifiers, template, stutter_length, max_sched_prob in itertools.product(
+                generator.get('quantifiers', [2]), generator.get('template', ['future']),
+                benchmark.get('stutterLength', [1]), benchmark.get('maxSchedProb', [0.99])):
+            instances.append({'name': benchmark['name'], 'model': model,
+                              'property': modelgenerator.generateProperty(quantifiers, template),
+                              'stutterLength': int(stutter_length), 'maxSchedProb': float(max_sched_prob),
+                              'size': size, 'branching': branching, 'actionSets': action_sets,
+                              'quantifiers': quantifiers, 'template': template})
+    return instances
+
+
+def runInstance(instance, model_path, connection, verbose):
+    """
+    Model check a single instance and send the collected statistics through the connection.
+    Runs in a separate process so that peak memory usage is measured per instance.
+    """
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+    record = dict()
+    model = None
+    modelchecker = None
+    try:
+        from hyperprob.propertyparser import Property
+        from hyperprob.modelparser import Model
+        from hyperprob.modelchecker import ModelChecker
+
+        hyperproperty = Property(instance['property'])
+        hyperproperty.parseProperty(False)
+        if hyperproperty.parsed_property is None:
+            raise ValueError("Property could not be parsed")
+        model = Model(model_path)
+        model.parseModel(True)
+        if model.parsed_model is None:
+            raise ValueError("Model could not be parsed")
+        modelchecker = ModelChecker(model, hyperproperty, instance['stutterLength'], instance['maxSchedProb'])
+        modelchecker.modelCheck()
+        record['status'] = 'ok'
+    except Exception as err:
+        record['status'] = 'error'
+        record['error'] = str(err)
+    if model is not None:
+        record.update(model.statistics)
+    if modelchecker is not None:
+        record.update(modelchecker.statistics)
+    record['peak_memory'] = getPeakMemory()
+    connection.send(record)
+    connection.close()
+
+
+def runBenchmarks(matrix_path, timeout=None, name_filter=None, verbose=False):
+    """
+    Run all instances of the benchmark matrix one after another
+    :param matrix_path: path to the JSON file declaring the matrix
+    :param timeout: timeout per instance in seconds, overrides the timeout of the matrix
+    :param name_filter: only run benchmarks whose name contains this string
+    :param verbose: show the output of the model checker
+    :return: list of records, one per instance
+    """
+    instances, matrix_timeout = loadMatrix(matrix_path)
+    if timeout is None:
+        timeout = matrix_timeout
+    if name_filter is not None:
+        instances = [instance for instance in instances if name_filter in instance['name']]
+    base_directory = os.path.dirname(os.path.abspath(matrix_path))
+    records = []
+    for number, instance in enumerate(instances):
+        common.colourinfo("Running instance " + str(number + 1) + "/" + str(len(instances)) + ": " +
+                          instance['name'] + " " + instance['model'] +
+                          " (stutterLength " + str(instance['stutterLength']) +
+                          ", maxSchedProb " + str(instance['maxSchedProb']) + ")", False)
+        records.append(runSingleInstance(instance, os.path.join(base_directory, instance['model']), timeout, verbose))
+        record = records[-1]
+        common.colourinfo("Finished with status " + record['status'] + (
+            ", verdict " + record['verdict'] if 'verdict' in record else "") +
+                          " in " + str(round(record['wall_time'], 2)) + " seconds", False)
+    return records
+
+
+def runSingleInstance(instance, model_path, timeout, verbose):
+    """
+    Run one instance in a child process and collect its record
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=runInstance, args=(instance, model_path, sender, verbose))
+    starting_time = time.perf_counter()
+    process.start()
+    sender.close()
+    record = dict(instance)
+    if receiver.poll(timeout):
+        try:
+            record.update(receiver.recv())
+        except EOFError:
+            pass
+    else:
+        record['status'] = 'timeout'
+    process.terminate()
+    process.join()
+    if 'status' not in record:
+        record['status'] = 'error'
+        record['error'] = "Process terminated with exit code " + str(process.exitcode)
+    record['wall_time'] = time.perf_counter() - starting_time
+    return record
+
+
+def writeResults(records, output_path):
+    """
+    Write records as JSON or CSV, depending on the file extension
+    """
+    if output_path.endswith('.csv'):
+        extra_fields = sorted({key for record in records for key in record.keys()} - set(FIELDS + GENERATOR_FIELDS))
+        extra_fields = [field for field in GENERATOR_FIELDS if any(field in record for record in records)] + extra_fields
+        with open(output_path, 'w', newline='') as output_file:
+            writer = csv.DictWriter(output_file, fieldnames=FIELDS + extra_fields)
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        with open(output_path, 'w') as output_file:
+            json.dump(records, output_file, indent=2)
+
+
+def loadResults(path):
+    """
+    Read records written by writeResults
+    """
+    if path.endswith('.csv'):
+        records = []
+        with open(path, newline='') as input_file:
+            for row in csv.DictReader(input_file):
+                record = dict()
+                for key, value in row.items():
+                    if value == '':
+                        continue
+                    try:
+                        record[key] = float(value)
+                    except ValueError:
+                        record[key] = value
+                records.append(record)
+        return records
+    with open(path) as input_file:
+        return json.load(input_file)
+
+
+def instanceKey(record):
+    return record['model'], record['property'], int(record['stutterLength']), float(record['maxSchedProb'])
+
+
+def compareResults(baseline, current, tolerance=0.2, min_seconds=1.0):
+    """
+    Compare results against a baseline and collect regressions.
+    A time is a regression if it grew by more than the relative tolerance and more than min_seconds,
+    a size or the peak memory if it grew by more than the relative tolerance.
+    Changed verdicts and instances that no longer finish are always reported.
+    :return: list of messages describing the regressions
+    """
+    baseline_by_key = {instanceKey(record): record for record in baseline}
+    regressions = []
+    for record in current:
+        key = instanceKey(record)
+        description = record['name'] + " " + record['model'] + " (stutterLength " + str(key[2]) + \
+                      ", maxSchedProb " + str(key[3]) + ")"
+        if key not in baseline_by_key:
+            common.colourother("No baseline for " + description, False)
+            continue
+        old = baseline_by_key[key]
+        if old.get('status') == 'ok' and record.get('status') != 'ok':
+            regressions.append(description + ": status changed from ok to " + str(record.get('status')))
+            continue
+        if old.get('verdict') is not None and record.get('verdict') is not None \
+                and old['verdict'] != record['verdict']:
+            regressions.append(description + ": verdict changed from " + old['verdict'] + " to " + record['verdict'])
+        for field in TIME_FIELDS + SIZE_FIELDS:
+            if field not in old or field not in record:
+                continue
+            old_value = float(old[field])
+            new_value = float(record[field])
+            if new_value <= old_value * (1 + tolerance):
+                continue
+            if field in TIME_FIELDS and new_value - old_value <= min_seconds:
+                continue
+            regressions.append(description + ": " + field + " increased from " + str(round(old_value, 2)) +
+                               " to " + str(round(new_value, 2)))
+    return regressions
+
+
+def plotResults(records, x_field, y_field, output_path, group_field=None):
+    """
+    Plot a measured quantity against a parameter, with one curve per value of group_field.
+    Instances that did not finish are left out.
+    """
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise ImportError("Plotting requires matplotlib, install it with 'pip install matplotlib'.")
+    curves = dict()
+    for record in records:
+        if record.get('status') != 'ok' or x_field not in record or y_field not in record:
+            continue
+        group = record.get(group_field) if group_field is not None else None
+        curves.setdefault(group, []).append((float(record[x_field]), float(record[y_field])))
+    figure, axes = plt.subplots()
+    for group in sorted(curves, key=str):
+        points = sorted(curves[group])
+        label = group_field + " = " + str(group) if group_field is not None else None
+        axes.plot([x for x, _ in points], [y for _, y in points], marker='o', label=label)
+    axes.set_xlabel(x_field)
+    axes.set_ylabel(y_field)
+    if group_field is not None:
+        axes.legend()
+    figure.savefig(output_path)
+    plt.close(figure)
+
+
+def measureTermConstruction(no_of_states, no_of_successors):
+    """
+    Build the terms encoding P(F phi) in composed states of two stutter quantifiers on a cycle, as in
+    encodeFutureState, once with the wrappers of the z3 Python API and once with the TermBuilder.
+    :param no_of_states: number of composed states encoded
+    :param no_of_successors: number of successors of each composed state
+    :return: dict[way of building] = terms per second, and the number of terms built per way
+    """
+    from z3 import And, Bool, Implies, Not, Or, Product, Real, RealVal, Sum
+    from hyperprob.termbuilder import TermBuilder
+
+    step_probs = [(Real("stepProb_1_" + str(succ)), Real("stepProb_2_" + str(succ)))
+                  for succ in range(no_of_successors)]
+    probs = [Real("prob_" + str(succ)) for succ in range(no_of_successors)]
+    holds = [Bool("holds_" + str(succ)) for succ in range(no_of_successors)]
+    distances = [Real("d_" + str(succ)) for succ in range(no_of_successors)]
+    prob_phi, holds_phi, d_current = Real("prob"), Bool("holds"), Real("d")
+    # per successor a product for the sum and the five terms of the loop condition; per state the negated premise,
+    # the sum, the equation, the comparison, the disjunction, the two implications and the conjunction
+    no_of_terms = no_of_states * (6 * no_of_successors + 8)
+
+    starting_time = time.perf_counter()
+    for _ in range(no_of_states):
+        sum_of_probs_list = []
+        loop_condition = []
+        for succ in range(no_of_successors):
+            sum_of_probs_list.append(Product([step_probs[succ][0], step_probs[succ][1], probs[succ]]))
+            loop_condition.append(And(Product([step_probs[succ][0], step_probs[succ][1]]) > RealVal(0),
+                                      Or(holds[succ], d_current > distances[succ])))
+        Implies(Not(holds_phi), And(prob_phi == Sum(sum_of_probs_list),
+                                   Implies(prob_phi > RealVal(0), Or(loop_condition))))
+    python_api_time = time.perf_counter() - starting_time
+
+    terms = TermBuilder()
+    starting_time = time.perf_counter()
+    for _ in range(no_of_states):
+        sum_of_probs_list = []
+        loop_condition = []
+        for succ in range(no_of_successors):
+            sum_of_probs_list.append(terms.product([step_probs[succ][0], step_probs[succ][1], probs[succ]]))
+            loop_condition.append(terms.conjunction([
+                terms.less(terms.real(0), terms.product([step_probs[succ][0], step_probs[succ][1]])),
+                terms.disjunction([holds[succ], terms.greater(d_current, distances[succ])])]))
+        terms.expression(terms.implies(terms.negation(holds_phi), terms.conjunction([
+            terms.equal(prob_phi, terms.sum(sum_of_probs_list)),
+            terms.implies(terms.less(terms.real(0), prob_phi), terms.disjunction(loop_condition))])))
+        terms.release()
+    term_builder_time = time.perf_counter() - starting_time
+    return {'terms': no_of_terms, 'python_api': no_of_terms / python_api_time,
+            'term_builder': no_of_terms / term_builder_time}
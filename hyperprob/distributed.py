@@ -0,0 +1,335 @@
+import collections
+import json
+import multiprocessing
+import os
+import resource
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import hyperprob.server
+from hyperprob.server import initialiseWorker, runJob
+
+DEFAULT_PORT = 7421
+# results with these statuses are caused by the worker rather than the job, their jobs are handed out again
+RETRIED_STATUSES = ('timeout', 'crashed')
+# seconds the coordinator waits for a result beyond the timeout of its job before it gives up on the worker
+TIMEOUT_GRACE = 30.0
+# seconds a worker keeps trying to connect to a coordinator that is not listening yet
+CONNECT_TIMEOUT = 60.0
+
+
+def readJobs(lines):
+    """
+    :param lines: jobs as JSON lines, empty lines are skipped
+    :return: list of the jobs, list of the error results of the lines that are not valid jobs
+    """
+    jobs = []
+    invalid = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("a job has to be a JSON object")
+        except ValueError as err:
+            invalid.append({'id': None, 'status': 'error', 'error': "Invalid job: " + str(err)})
+            continue
+        jobs.append(job)
+    return jobs, invalid
+
+
+def sendMessage(stream, message):
+    stream.write((json.dumps(message) + "\n").encode())
+    stream.flush()
+
+
+def receiveMessage(stream):
+    """
+    :return: next message, None if the connection has been closed
+    """
+    line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+class Coordinator:
+    """
+    Holds a queue of jobs and hands them out to workers connecting over TCP, one job at a time per connection.
+    Messages are JSON lines: a worker sends ready whenever it can take a job and is answered with the next job, or
+    with stop once all jobs have a result; it then sends the result of the job.
+    If a worker disconnects or does not answer within the timeout of its job, or reports a timeout or a crash of the
+    process running the job, the job is put back into the queue and handed out again, at most retries times.
+    Results are written as JSON lines as soon as they arrive, with the worker and the number of attempts added.
+    """
+
+    def __init__(self, jobs, retries=2, job_timeout=None, output=None):
+        """
+        :param jobs: list of jobs as dicts, see server.runJob
+        :param job_timeout: seconds a job may take if it does not set a timeout of its own, None for no limit
+        :param output: stream the results are written to, stdout if not given
+        """
+        self.queue = collections.deque((job, 0) for job in jobs)  # (job, number of attempts so far)
+        self.retries = retries
+        self.job_timeout = job_timeout
+        self.output = output if output is not None else sys.stdout
+        self.unfinished = len(jobs)
+        self.condition = threading.Condition()
+        self.tcp_server = None
+
+    def take(self):
+        """
+        Wait until a job is queued, jobs handed out to workers that fail are queued again
+        :return: job and its number of attempts so far, None if all jobs have a result
+        """
+        with self.condition:
+            while len(self.queue) == 0 and self.unfinished > 0:
+                self.condition.wait()
+            if self.unfinished == 0:
+                return None
+            return self.queue.popleft()
+
+    def finish(self, job, attempts, worker, result):
+        """
+        Write the result of a job, or queue the job again if the worker failed and it has attempts left
+        :param attempts: number of attempts including this one
+        """
+        result['worker'] = worker
+        result['attempts'] = attempts
+        if result.get('status') in RETRIED_STATUSES and attempts <= self.retries:
+            print("Job " + str(job.get('id')) + " failed on " + worker + " (" + str(result.get('error')) +
+                  "), retrying", file=sys.stderr)
+            with self.condition:
+                self.queue.append((job, attempts))
+                self.condition.notify()
+            return
+        self.respond(result)
+
+    def respond(self, result):
+        with self.condition:
+            self.output.write(json.dumps(result) + "\n")
+            self.output.flush()
+            self.unfinished -= 1
+            if self.unfinished == 0:
+                self.condition.notify_all()
+                if self.tcp_server is not None:
+                    # shutdown waits for serve_forever to return, so it cannot be called by a handler directly
+                    threading.Thread(target=self.tcp_server.shutdown).start()
+
+    def timeout(self, job):
+        timeout = job.get('timeout', self.job_timeout)
+        return float(timeout) if timeout is not None else None
+
+    def serve(self, host='localhost', port=DEFAULT_PORT, invalid=None):
+        """
+        Accept workers until all jobs have a result
+        :param invalid: results of invalid jobs, written before the jobs are handed out
+        """
+        coordinator = self
+        for result in invalid or []:
+            self.output.write(json.dumps(result) + "\n")
+        self.output.flush()
+
+        class WorkerHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                worker = self.client_address[0] + ":" + str(self.client_address[1])
+                while True:
+                    try:
+                        message = receiveMessage(self.rfile)
+                    except (OSError, ValueError):
+                        return
+                    if message is None:
+                        return
+                    worker = message.get('worker', worker)
+                    entry = coordinator.take()
+                    if entry is None:
+                        try:
+                            sendMessage(self.wfile, {'type': 'stop'})
+                        except OSError:
+                            pass
+                        return
+                    job, attempts = entry
+                    attempts += 1
+                    timeout = coordinator.timeout(job)
+                    self.connection.settimeout(timeout + TIMEOUT_GRACE if timeout is not None else None)
+                    try:
+                        sendMessage(self.wfile, {'type': 'job', 'job': job, 'timeout': timeout})
+                        message = receiveMessage(self.rfile)
+                    except (OSError, ValueError) as err:
+                        message = None
+                        reason = "lost the worker: " + (str(err) or type(err).__name__)
+                    else:
+                        reason = "the worker disconnected"
+                    self.connection.settimeout(None)
+                    if message is None or message.get('type') != 'result':
+                        coordinator.finish(job, attempts, worker, {'id': job.get('id'), 'status': 'crashed',
+                                                                   'error': reason})
+                        return
+                    coordinator.finish(job, attempts, worker, message['result'])
+
+        class CoordinatorServer(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            # handlers waiting for a job are not joined when the coordinator is interrupted
+            daemon_threads = True
+
+        if self.unfinished == 0:
+            return
+        with CoordinatorServer((host, port), WorkerHandler) as tcp_server:
+            self.tcp_server = tcp_server
+            print("Coordinating " + str(self.unfinished) + " jobs on " + host + ":" +
+                  str(tcp_server.server_address[1]), file=sys.stderr)
+            try:
+                tcp_server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
+
+def serveJobs(connection, size_of_cache):
+    """
+    Loop of the process running the jobs of a worker, it keeps its caches of models and properties between jobs.
+    The caches are cleared before a job with a memory limit, so that the models of earlier jobs do not count against it
+    :param connection: end of a pipe receiving jobs and their memory limits, and sending the results
+    """
+    initialiseWorker(size_of_cache)
+    hard_limit = resource.getrlimit(resource.RLIMIT_AS)[1]
+    connection.send('ready')
+    while True:
+        try:
+            job, memory_limit = connection.recv()
+        except EOFError:
+            return
+        if memory_limit is not None:
+            hyperprob.server.model_cache.clear()
+            hyperprob.server.property_cache.clear()
+        # the soft limit can be raised again up to the hard limit for the next job
+        soft_limit = hard_limit if memory_limit is None else int(memory_limit * 1024 * 1024)
+        if hard_limit != resource.RLIM_INFINITY:
+            soft_limit = min(soft_limit, hard_limit)
+        resource.setrlimit(resource.RLIMIT_AS, (soft_limit, hard_limit))
+        result = runJob(job)
+        resource.setrlimit(resource.RLIMIT_AS, (hard_limit, hard_limit))
+        connection.send(result)
+
+
+class Worker:
+    """
+    Connects to a coordinator and model checks the jobs it hands out, one at a time, in a separate process.
+    The process is limited to the memory of the job and killed when the job exceeds its timeout; a new process is
+    started for the next job. Jobs may set timeout (seconds) and memoryLimit (MB), otherwise the timeout sent by the
+    coordinator and the memory limit of the worker apply.
+    """
+
+    def __init__(self, host='localhost', port=DEFAULT_PORT, size_of_cache=8, memory_limit=None, name=None):
+        self.host = host
+        self.port = port
+        self.size_of_cache = size_of_cache
+        self.memory_limit = memory_limit  # MB available to a job, None for no limit
+        self.name = name if name is not None else socket.gethostname() + "/" + str(os.getpid())
+        # the worker may run a thread per connection, forking it could copy locks held by other threads
+        self.context = multiprocessing.get_context('spawn')
+        self.process = None
+        self.connection = None
+
+    def startProcess(self):
+        self.connection, child_connection = self.context.Pipe()
+        self.process = self.context.Process(target=serveJobs, args=(child_connection, self.size_of_cache),
+                                            daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.connection.recv()  # the imports are done
+
+    def stopProcess(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.join()
+            self.connection.close()
+            self.process = None
+
+    def run(self, job, timeout):
+        """
+        :param timeout: seconds the job may take, None for no limit
+        :return: result of the job, with status timeout if it was killed and crashed if its process died
+        """
+        starting_time = time.perf_counter()
+        memory_limit = job.get('memoryLimit', self.memory_limit)
+        try:
+            self.connection.send((job, float(memory_limit) if memory_limit is not None else None))
+            if self.connection.poll(timeout):
+                return self.connection.recv()
+            self.stopProcess()
+            return {'id': job.get('id'), 'status': 'timeout',
+                    'error': "Job exceeded its timeout of " + str(timeout) + " seconds",
+                    'time': time.perf_counter() - starting_time}
+        except (EOFError, OSError):
+            self.process.join()
+            exitcode = self.process.exitcode
+            self.stopProcess()
+            return {'id': job.get('id'), 'status': 'crashed',
+                    'error': "The process running the job died with exit code " + str(exitcode),
+                    'time': time.perf_counter() - starting_time}
+
+    def connect(self):
+        """
+        Connect to the coordinator, waiting for it for at most CONNECT_TIMEOUT seconds
+        """
+        deadline = time.perf_counter() + CONNECT_TIMEOUT
+        while True:
+            try:
+                return socket.create_connection((self.host, self.port))
+            except OSError:
+                if time.perf_counter() > deadline:
+                    raise
+                time.sleep(1.0)
+
+    def serve(self):
+        """
+        Take jobs from the coordinator until it has no more jobs or closes the connection
+        :return: number of jobs run
+        """
+        no_of_jobs = 0
+        try:
+            connection = self.connect()
+        except OSError as err:
+            print("Cannot connect to the coordinator at " + self.host + ":" + str(self.port) + ": " + str(err),
+                  file=sys.stderr)
+            return no_of_jobs
+        with connection, connection.makefile('rwb') as stream:
+            try:
+                while True:
+                    # the process is started before asking for a job, so its start does not count against the timeout
+                    if self.process is None:
+                        try:
+                            self.startProcess()
+                        except EOFError:
+                            print("The process running the jobs could not be started", file=sys.stderr)
+                            break
+                    sendMessage(stream, {'type': 'ready', 'worker': self.name})
+                    message = receiveMessage(stream)
+                    if message is None or message.get('type') != 'job':
+                        break
+                    result = self.run(message['job'], message.get('timeout'))
+                    sendMessage(stream, {'type': 'result', 'result': result})
+                    no_of_jobs += 1
+            except OSError:
+                pass  # the coordinator has gone away
+            finally:
+                self.stopProcess()
+        return no_of_jobs
+
+
+def serveWorkers(host, port, workers=1, size_of_cache=8, memory_limit=None):
+    """
+    Run several workers in threads, each with a connection to the coordinator and a process of its own
+    """
+    name = socket.gethostname() + "/" + str(os.getpid())
+    threads = [threading.Thread(target=Worker(host, port, size_of_cache, memory_limit,
+                                              name + "/" + str(index)).serve)
+               for index in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,441 @@
+import itertools
+import math
+
+from hyperprob.propertyparser import formulaToString, untilBounds
+from hyperprob.semanticencoder import extendWithoutDuplicates, successorTable, stutterComponents, \
+    BOUNDED_APPROXIMATION
+from hyperprob.utility import common
+from hyperprob.utility.memory import getPeakMemory
+
+# approximate memory held by z3 and its Python bindings, measured with z3 4.x on Linux
+BYTES_PER_VARIABLE = 1900  # variable with its Python wrapper and the entry in dictOfReals/dictOfBools
+BYTES_PER_TERM = 120  # application node, e.g. And, Product or ==
+BYTES_PER_ARGUMENT = 12  # each argument of an application node
+
+# application nodes created per composed state by the encoders, not counting the successor terms
+TERMS_PER_STATE = {'atomic_proposition': 1, 'and': 6, 'or': 7, 'implies': 7, 'biconditional': 12, 'not': 1,
+                   'less_probability': 6, 'equal_probability': 7, 'greater_probability': 6,
+                   'greater_and_equal_probability': 6, 'less_and_equal_probability': 6,
+                   'add_probability': 2, 'subtract_probability': 2, 'multiply_probability': 2,
+                   'next': 8, 'until_unbounded': 17, 'future': 11, 'global': 11}
+# application nodes created per successor term by the encoders of temporal operators
+TERMS_PER_SUCCESSOR = {'next': 1, 'until_unbounded': 6, 'future': 6, 'global': 7}
+# application nodes and arguments per assertion of a layer of bounded temporal operators, not counting the successors
+TERMS_PER_BOUNDED_ASSERTION = 4
+ARGUMENTS_PER_BOUNDED_ASSERTION = 7
+TERMS_PER_STUTTER_SUCCESSOR = 26
+ARGUMENTS_PER_STUTTER_SUCCESSOR = 38
+
+
+class EncodingEstimator:
+    """
+    Computes the number of variables and assertions the encoding of a property will produce,
+    without creating the encoding. The counts follow the encoders in modelchecker and semanticencoder:
+    the variables of each kind and subformula form a union of products of per-quantifier state sets,
+    which are counted instead of enumerated. Term nodes and memory are an approximation.
+    """
+
+    def __init__(self, modelchecker):
+        self.modelchecker = modelchecker
+        self.model = modelchecker.model
+        self.stutterLength = modelchecker.stutterLength
+        self.list_of_subformula = modelchecker.list_of_subformula
+        self.boundedHorizon = modelchecker.boundedHorizon
+        self.no_of_stutter_quantifier = modelchecker.no_of_stutter_quantifier
+        self.rows = []  # one row per phase and encoded subformula
+        self.statistics = dict()  # totals and projected memory usage
+        self.fixed_variables = 0  # scheduler, stutter-scheduler, Tr and go variables, all distinct
+        self.families = dict()  # dict[(kind, index of subformula)] = set of products
+        self.explicit = dict()  # dict[(kind, index of subformula)] = set of composed states not given as a product
+        self.family_sizes = dict()
+        self.estimated_subformulas = dict()  # dict[index of subformula] = relevant quantifiers
+        self.components = dict()  # dict[stutter quantifier] = frozenset of (state, stutter) pairs
+        self.successor_images = dict()  # dict[stutter quantifier] = frozenset of (state, stutter) successors
+        self.successor_terms = dict()  # dict[stutter quantifier] = number of (action, successor) pairs
+        # states lying on a cycle, only they get loop conditions, dict[stutter quantifier] = frozenset of pairs
+        self.cyclic_components = dict()
+        self.cyclic_successor_terms = dict()  # dict[stutter quantifier] = number of pairs of states on a cycle
+        on_cycle = set()
+        if self.no_of_stutter_quantifier > 0:
+            on_cycle = stutterComponents(successorTable(self.model, self.stutterLength))[1]
+        for quant in range(1, self.no_of_stutter_quantifier + 1):
+            self.components[quant] = frozenset(
+                itertools.product(modelchecker.reachable_states[quant], range(self.stutterLength)))
+            self.cyclic_components[quant] = frozenset(node for node in self.components[quant]
+                                                      if str(node) in on_cycle)
+            image = set()
+            terms = 0
+            cyclic_terms = 0
+            for state, stutter in self.components[quant]:
+                for action in self.model.dict_of_acts[state]:
+                    successors = self.successors(state, stutter, action)
+                    image.update(successors)
+                    terms += len(successors)
+                    if (state, stutter) in self.cyclic_components[quant]:
+                        cyclic_terms += len(successors)
+            self.successor_images[quant] = frozenset(image)
+            self.successor_terms[quant] = terms
+            self.cyclic_successor_terms[quant] = cyclic_terms
+
+    def successors(self, state, stutter, action):
+        successors = set()
+        for s in self.model.dict_of_acts_tran[str(state) + " " + str(action)]:
+            successors.add((int(s[0:s.find(' ')]), 0))
+        if stutter < self.stutterLength - 1:
+            successors.add((state, stutter + 1))
+        return successors
+
+    def estimate(self, non_quantified_property):
+        """
+        Estimate the encoding phase by phase, in the order used by ModelChecker.modelCheck
+        :param non_quantified_property: the property without its quantifiers
+        :return: list of rows with the name of the phase or subformula, variables, assertions and term nodes
+        """
+        self.estimateScheduler()
+        self.estimateStuttering()
+        self.estimateTruth()
+        self.estimateSemantics(non_quantified_property)
+        self.estimateRestrictions()
+        terms = sum(row['terms'] for row in self.rows)
+        arguments = sum(row['arguments'] for row in self.rows)
+        self.statistics['estimated_variables'] = self.totalVariables()
+        self.statistics['estimated_assertions'] = sum(row['assertions'] for row in self.rows)
+        self.statistics['estimated_terms'] = terms
+        self.statistics['projected_memory'] = getPeakMemory() + (self.totalVariables() * BYTES_PER_VARIABLE +
+                                                                 terms * BYTES_PER_TERM +
+                                                                 arguments * BYTES_PER_ARGUMENT) / (1024 * 1024)
+        return self.rows
+
+    def printEstimate(self):
+        common.colourinfo("Estimated size of the encoding:")
+        common.colourinfo("{:<60} {:>12} {:>12} {:>14}".format("Phase / subformula", "Variables", "Assertions",
+                                                               "Term nodes"), False)
+        for row in self.rows:
+            name = row['name'] if len(row['name']) <= 60 else row['name'][:57] + "..."
+            print("{:<60} {:>12} {:>12} {:>14}".format(name, row['variables'], row['assertions'], row['terms']))
+        common.colouroutput("{:<60} {:>12} {:>12} {:>14}".format("Total", self.statistics['estimated_variables'],
+                                                                 self.statistics['estimated_assertions'],
+                                                                 "~" + str(self.statistics['estimated_terms'])),
+                            False)
+        common.colouroutput("Projected memory usage: " + str(round(self.statistics['projected_memory'], 1)) +
+                            " MB (model and encoding, not including the SMT solver's search)", False)
+
+    def totalVariables(self):
+        return self.fixed_variables + sum(self.family_sizes.values())
+
+    def addRow(self, name, variables_before, assertions, terms, arguments):
+        self.rows.append({'name': name, 'variables': self.totalVariables() - variables_before,
+                          'assertions': assertions, 'terms': terms, 'arguments': arguments})
+
+    def box(self, relevant_quantifier, image=False, cyclic=False):
+        """
+        Product of the per-quantifier state sets ranged over by generateComposedStatesWithStutter
+        :param image: take the successors of the composed states instead
+        :param cyclic: take the composed states lying on a cycle instead
+        """
+        sets = self.successor_images if image else self.cyclic_components if cyclic else self.components
+        return tuple(sets[quant] if quant in relevant_quantifier else frozenset([(0, 0)])
+                     for quant in range(1, self.no_of_stutter_quantifier + 1))
+
+    def addVariables(self, kind, index, *boxes):
+        family = self.families.setdefault((kind, index), set())
+        family.update(boxes)
+        size = unionSize(family)
+        for composed_state in self.explicit.get((kind, index), []):
+            if not any(all(composed_state[q] in box[q] for q in range(len(box))) for box in family):
+                size += 1
+        self.family_sizes[(kind, index)] = size
+
+    def boxSize(self, relevant_quantifier):
+        return math.prod(len(self.components[quant]) for quant in set(relevant_quantifier))
+
+    def successorTerms(self, relevant_quantifier, cyclic=False):
+        terms = self.cyclic_successor_terms if cyclic else self.successor_terms
+        return math.prod(terms[quant] for quant in set(relevant_quantifier))
+
+    def estimateScheduler(self):
+        terms = 1
+        arguments = 0
+        for A in {frozenset(x) for x in self.model.getDictOfActions().values()}:
+            self.fixed_variables += len(A)
+            if len(A) == 1:
+                terms += 1
+                arguments += 3
+            else:
+                terms += 2 * len(A) + 2
+                arguments += 6 * len(A) + 3
+        self.addRow("encodeScheduler", 0, 1, terms, arguments)
+
+    def estimateStuttering(self):
+        variables_before = self.totalVariables()
+        stutter_pairs = 0
+        successors = 0
+        for state in self.model.getListOfStates():
+            stutter_pairs += len(self.model.dict_of_acts[state])
+            for stutter in range(self.stutterLength):
+                for action in self.model.dict_of_acts[state]:
+                    successors += len(self.successors(state, stutter, action))
+        # t variables, and Tr, go and stepProb variables per successor
+        self.fixed_variables += self.no_of_stutter_quantifier * (stutter_pairs + 3 * successors)
+        terms = self.no_of_stutter_quantifier * (stutter_pairs * (self.stutterLength + 1) +
+                                                 successors * TERMS_PER_STUTTER_SUCCESSOR)
+        arguments = self.no_of_stutter_quantifier * (stutter_pairs * self.stutterLength + successors * ARGUMENTS_PER_STUTTER_SUCCESSOR)
+        self.addRow("encodeStuttering", variables_before, 4, terms, arguments)
+
+    def estimateTruth(self):
+        variables_before = self.totalVariables()
+        modelchecker = self.modelchecker
+        phi = modelchecker.initial_hyperproperty.parsed_property
+        while phi.data in ['exist_scheduler', 'forall_scheduler', 'exist_state', 'forall_state', 'exist_stutter',
+                           'quantifiedformulastutter', 'quantifiedformulastate']:
+            phi = phi.children[2] if phi.data == 'exist_stutter' else phi.children[-1]
+        index_of_phi = self.list_of_subformula.index(phi)
+
+        domains = [modelchecker.state_domains[state_index] for state_index, _, _ in modelchecker.state_quantifiers]
+        position_in_prefix = {state_index: pos for pos, (state_index, _, _) in enumerate(modelchecker.state_quantifiers)}
+        positions = [position_in_prefix[modelchecker.stutter_state_mapping[q]]
+                     for q in range(1, self.no_of_stutter_quantifier + 1)]
+        if len(set(positions)) == len(positions):
+            self.addVariables('holds', index_of_phi,
+                              tuple(frozenset((state, 0) for state in domains[position]) for position in positions))
+        else:
+            # stutter quantifiers sharing a state quantifier start in the same state, which is not a product
+            self.explicit[('holds', index_of_phi)] = {
+                tuple((states[position], 0) for position in positions)
+                for states in itertools.product(*[domains[position] for position in range(len(domains))])}
+            self.addVariables('holds', index_of_phi)
+        no_of_tuples = math.prod(len(domain) for domain in domains)
+        no_of_folds = sum(math.prod(len(domain) for domain in domains[:level]) for level in range(len(domains)))
+        self.addRow("truth", variables_before, 1, no_of_folds, no_of_folds + no_of_tuples)
+
+    def estimateSemantics(self, hyperproperty, prev_relevant_quantifier=[]):
+        """
+        Mirrors SemanticsEncoder.encodeSemantics, which encodes each subformula once
+        :return: relevant quantifiers of the subformula
+        """
+        if len(prev_relevant_quantifier) > 0:
+            return self.estimateSubformula(hyperproperty, prev_relevant_quantifier)
+        index_of_phi = self.list_of_subformula.index(hyperproperty)
+        if index_of_phi not in self.estimated_subformulas:
+            self.estimated_subformulas[index_of_phi] = self.estimateSubformula(hyperproperty)
+        return list(self.estimated_subformulas[index_of_phi])
+
+    def estimateSubformula(self, hyperproperty, prev_relevant_quantifier=[]):
+        relevant_quantifier = list(prev_relevant_quantifier)
+        data = hyperproperty.data
+        index_of_phi = self.list_of_subformula.index(hyperproperty)
+
+        if data == 'true':
+            variables_before = self.totalVariables()
+            self.addVariables('holds', index_of_phi, self.box([]))
+            self.addSubformulaRow(hyperproperty, variables_before, 1, 1, 1)
+            return relevant_quantifier
+        elif data == 'atomic_proposition':
+            proposition_relevant_stutter = int(hyperproperty.children[1].children[0].value[1])
+            if proposition_relevant_stutter not in relevant_quantifier:
+                relevant_quantifier.append(proposition_relevant_stutter)
+            variables_before = self.totalVariables()
+            self.addVariables('holds', index_of_phi, self.box(relevant_quantifier))
+            size = self.boxSize(relevant_quantifier)
+            self.addSubformulaRow(hyperproperty, variables_before, 1, size + 3, 2 * size)
+            return relevant_quantifier
+        elif data in ['and', 'or', 'implies', 'biconditional',
+                      'less_probability', 'equal_probability', 'greater_probability',
+                      'greater_and_equal_probability', 'less_and_equal_probability',
+                      'add_probability', 'subtract_probability', 'multiply_probability']:
+            rel_quant1 = self.estimateSemantics(hyperproperty.children[0])
+            rel_quant2 = self.estimateSemantics(hyperproperty.children[1])
+            relevant_quantifier = extendWithoutDuplicates(rel_quant1, rel_quant2)
+            variables_before = self.totalVariables()
+            kind = 'prob' if data.endswith('_probability') and data.split('_')[0] in ['add', 'subtract', 'multiply'] \
+                else 'holds'
+            child_kind = 'holds' if data in ['and', 'or', 'implies', 'biconditional'] else 'prob'
+            self.addVariables(kind, index_of_phi, self.box(relevant_quantifier))
+            if data != 'equal_probability':
+                self.addVariables(child_kind, self.list_of_subformula.index(hyperproperty.children[0]),
+                                  self.box(rel_quant1))
+                self.addVariables(child_kind, self.list_of_subformula.index(hyperproperty.children[1]),
+                                  self.box(rel_quant2))
+            size = self.boxSize(relevant_quantifier)
+            self.addSubformulaRow(hyperproperty, variables_before, size, size * TERMS_PER_STATE[data],
+                                  size * 2 * TERMS_PER_STATE[data])
+            if kind == 'prob':
+                self.estimateProbabilityBounds(hyperproperty, relevant_quantifier)
+            return relevant_quantifier
+        elif data == 'not':
+            relevant_quantifier = extendWithoutDuplicates(relevant_quantifier,
+                                                          self.estimateSemantics(hyperproperty.children[0]))
+            variables_before = self.totalVariables()
+            box = self.box(relevant_quantifier)
+            self.addVariables('holds', index_of_phi, box)
+            self.addVariables('holds', self.list_of_subformula.index(hyperproperty.children[0]), box)
+            size = self.boxSize(relevant_quantifier)
+            self.addSubformulaRow(hyperproperty, variables_before, size, size, 2 * size)
+            return relevant_quantifier
+        elif data == 'probability':
+            child = hyperproperty.children[0]
+            if child.data == 'until_bounded' or (self.boundedHorizon is not None and
+                                                 child.data in BOUNDED_APPROXIMATION.keys()):
+                relevant_quantifier = extendWithoutDuplicates(relevant_quantifier,
+                                                              self.estimateBounded(hyperproperty,
+                                                                                   relevant_quantifier))
+            elif child.data in ['next', 'until_unbounded', 'future', 'global']:
+                relevant_quantifier = extendWithoutDuplicates(relevant_quantifier,
+                                                              self.estimateTemporal(hyperproperty,
+                                                                                    relevant_quantifier))
+            else:
+                raise ValueError("Estimating the encoding of " + child.data + " is not supported.")
+            self.estimateProbabilityBounds(hyperproperty, relevant_quantifier)
+            return relevant_quantifier
+        elif data == 'constant_probability':
+            variables_before = self.totalVariables()
+            self.addVariables('prob', index_of_phi, self.box([]))
+            self.addSubformulaRow(hyperproperty, variables_before, 1, 1, 2)
+            return relevant_quantifier
+        raise ValueError("Estimating the encoding of " + data + " is not supported.")
+
+    def estimateTemporal(self, hyperproperty, relevant_quantifier):
+        """
+        Mirrors encodeNextSemantics, encodeUnboundedUntilSemantics, encodeFutureSemantics and encodeGlobalSemantics
+        """
+        data = hyperproperty.children[0].data
+        index_of_phi = self.list_of_subformula.index(hyperproperty)
+        phi1 = hyperproperty.children[0].children[0]
+        index_of_phi1 = self.list_of_subformula.index(phi1)
+        if data == 'next':
+            relevant_quantifier = self.estimateSemantics(phi1, relevant_quantifier)
+        else:
+            rel_quant1 = self.estimateSemantics(phi1)
+            relevant_quantifier = extendWithoutDuplicates(rel_quant1, relevant_quantifier)
+        if data == 'until_unbounded':
+            phi2 = hyperproperty.children[0].children[1]
+            index_of_phi2 = self.list_of_subformula.index(phi2)
+            rel_quant2 = self.estimateSemantics(phi2)
+            relevant_quantifier = extendWithoutDuplicates(rel_quant2, relevant_quantifier)
+
+        variables_before = self.totalVariables()
+        box = self.box(relevant_quantifier)
+        image = self.box(relevant_quantifier, image=True)
+        self.addVariables('prob', index_of_phi, box, image)
+        if data == 'next':
+            self.addVariables('holds', index_of_phi1, box)
+            self.addVariables('holdsToInt', index_of_phi1, box, image)
+        elif data == 'until_unbounded':
+            # loop conditions only refer to the successors of composed states on a cycle in the same component
+            self.addVariables('holds', index_of_phi1, self.box(rel_quant1))
+            self.addVariables('holds', index_of_phi2, self.box(rel_quant2), self.box(relevant_quantifier, cyclic=True))
+            self.addVariables('d', index_of_phi2, self.box(relevant_quantifier, cyclic=True))
+        else:
+            self.addVariables('holds', index_of_phi1, box)
+            self.addVariables('d', index_of_phi1, self.box(relevant_quantifier, cyclic=True))
+
+        size = self.boxSize(relevant_quantifier)
+        successor_terms = self.successorTerms(relevant_quantifier)
+        cyclic_successor_terms = self.successorTerms(relevant_quantifier, cyclic=True)
+        no_of_relevant = len(set(relevant_quantifier))
+        terms = size * TERMS_PER_STATE[data]
+        arguments = size * 2 * TERMS_PER_STATE[data] + successor_terms * (no_of_relevant + 2)
+        if data == 'next':
+            terms += successor_terms * TERMS_PER_SUCCESSOR[data]
+        else:
+            terms += successor_terms + cyclic_successor_terms * (TERMS_PER_SUCCESSOR[data] - 1)
+            arguments += cyclic_successor_terms * (no_of_relevant + 8)
+        self.addSubformulaRow(hyperproperty, variables_before, 2 * size, terms, arguments)
+        return relevant_quantifier
+
+    def estimateBounded(self, hyperproperty, relevant_quantifier):
+        """
+        Mirrors encodeBoundedSemantics, which encodes a layer of probabilities per step
+        """
+        child = hyperproperty.children[0]
+        index_of_phi = self.list_of_subformula.index(hyperproperty)
+        lower, upper = 0, self.boundedHorizon
+        if child.data == 'until_bounded':
+            phi1, phi2 = child.children[0], child.children[3]
+            lower, upper = untilBounds(child)
+        elif child.data == 'until_unbounded':
+            phi1, phi2 = child.children
+        elif child.data == 'future':
+            phi1, phi2 = None, child.children[0]
+        else:
+            phi1, phi2 = child.children[0], None
+        rel_quant1, rel_quant2 = [], []
+        if phi1 is not None:
+            rel_quant1 = self.estimateSemantics(phi1)
+            relevant_quantifier = extendWithoutDuplicates(rel_quant1, relevant_quantifier)
+        if phi2 is not None:
+            rel_quant2 = self.estimateSemantics(phi2)
+            relevant_quantifier = extendWithoutDuplicates(rel_quant2, relevant_quantifier)
+
+        variables_before = self.totalVariables()
+        box = self.box(relevant_quantifier)
+        image = self.box(relevant_quantifier, image=True)
+        self.addVariables('prob', index_of_phi, box)
+        for layer in range(1, upper + 1):
+            self.addVariables('probStep' + str(layer), index_of_phi, box, image)
+        if phi1 is not None:
+            self.addVariables('holds', self.list_of_subformula.index(phi1), self.box(rel_quant1))
+        if phi2 is not None:
+            self.addVariables('holds', self.list_of_subformula.index(phi2), self.box(rel_quant2))
+
+        # assertions per composed state in each layer, as in encodeBoundedState
+        assertions_per_state = 0
+        for layer in range(upper + 1):
+            if child.data == 'global' or (layer == upper and layer >= lower):
+                assertions_per_state += 2
+            elif layer == upper:
+                assertions_per_state += 1
+            else:
+                assertions_per_state += (2 if layer >= lower else 1) + (1 if phi1 is not None else 0)
+        size = self.boxSize(relevant_quantifier)
+        successor_terms = self.successorTerms(relevant_quantifier) * upper
+        no_of_relevant = len(set(relevant_quantifier))
+        terms = size * assertions_per_state * TERMS_PER_BOUNDED_ASSERTION + successor_terms
+        arguments = size * assertions_per_state * ARGUMENTS_PER_BOUNDED_ASSERTION + \
+            successor_terms * (no_of_relevant + 2)
+        self.addSubformulaRow(hyperproperty, variables_before, size * assertions_per_state, terms, arguments)
+        return relevant_quantifier
+
+    def estimateProbabilityBounds(self, hyperproperty, relevant_quantifier):
+        """
+        Mirrors boundProbabilities, which asserts an interval for each composed state whose interval is not [0, 1]
+        """
+        probability_bounds = self.modelchecker.probability_bounds
+        if probability_bounds is None or self.boundedHorizon is not None:
+            return
+        intervals = probability_bounds.intervals(hyperproperty)
+        if intervals is None:
+            return
+        quantifiers, interval = intervals
+        # the interval depends on the states of the quantifiers only, not on their stutter
+        no_of_tuples = 0
+        for states in itertools.product(*[self.modelchecker.reachable_states[quant] for quant in quantifiers]):
+            lower, upper = interval(states)
+            if lower > 0 or upper < 1:
+                no_of_tuples += 1
+        others = [quant for quant in set(relevant_quantifier) if quant not in quantifiers]
+        assertions = no_of_tuples * self.stutterLength ** len(quantifiers) * self.boxSize(others)
+        self.addRow(formulaToString(hyperproperty) + " bounds", self.totalVariables(), assertions, 5 * assertions,
+                    6 * assertions)
+
+    def addSubformulaRow(self, hyperproperty, variables_before, assertions, terms, arguments):
+        self.addRow(formulaToString(hyperproperty), variables_before, assertions, terms, arguments)
+
+    def estimateRestrictions(self):
+        variables_before = self.totalVariables()
+        no_of_prob = sum(size for (kind, _), size in self.family_sizes.items() if kind == 'prob' or kind.startswith('probStep'))
+        self.addRow("restrictions", variables_before, no_of_prob, 5 * no_of_prob, 6 * no_of_prob)
+
+
+def unionSize(products):
+    """
+    Number of elements in a union of products of sets, by inclusion-exclusion over the products
+    :param products: set of tuples of frozensets, all of the same length
+    """
+    products = list(products)
+    size = 0
+    for no_of_products in range(1, len(products) + 1):
+        sign = 1 if no_of_products % 2 == 1 else -1
+        for selection in itertools.combinations(products, no_of_products):
+            size += sign * math.prod(len(frozenset.intersection(*sets)) for sets in zip(*selection))
+    return size
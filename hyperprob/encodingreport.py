@@ -0,0 +1,159 @@
+import contextlib
+import functools
+import time
+
+from z3 import z3consts, z3core
+
+from hyperprob.propertyparser import formulaToString
+from hyperprob.smtlibwriter import SmtLibWriter, noOfAssertions
+from hyperprob.utility import common
+
+
+def termStatistics(ctx, terms, degrees):
+    """
+    Count the distinct nodes of terms and their polynomial degree, the largest degree of a monomial in them.
+    Variables of sort Real have degree 1, a product the sum of the degrees of its factors, all other terms the largest
+    degree of their arguments.
+    :param ctx: z3 context of the terms
+    :param terms: list of ASTs
+    :param degrees: dict[id of AST] = degree of the nodes visited so far
+    :return: number of nodes not visited before, largest degree of the terms
+    """
+    ref = ctx.ref()
+    no_of_nodes = len(degrees)
+    stack = [(term, False) for term in terms]
+    while len(stack) > 0:
+        term, expanded = stack.pop()
+        key = z3core.Z3_get_ast_id(ref, term)
+        if key in degrees and not expanded:
+            continue
+        if z3core.Z3_get_ast_kind(ref, term) != z3consts.Z3_APP_AST:
+            degrees[key] = 0
+            continue
+        no_of_args = z3core.Z3_get_app_num_args(ref, term)
+        if no_of_args == 0:
+            real = z3core.Z3_get_sort_kind(ref, z3core.Z3_get_sort(ref, term)) == z3consts.Z3_REAL_SORT
+            degrees[key] = 1 if real and not z3core.Z3_is_numeral_ast(ref, term) else 0
+        elif not expanded:
+            stack.append((term, True))
+            stack.extend((z3core.Z3_get_app_arg(ref, term, position), False) for position in range(no_of_args))
+        else:
+            arguments = [degrees[z3core.Z3_get_ast_id(ref, z3core.Z3_get_app_arg(ref, term, position))]
+                         for position in range(no_of_args)]
+            kind = z3core.Z3_get_decl_kind(ref, z3core.Z3_get_app_decl(ref, term))
+            degrees[key] = sum(arguments) if kind == z3consts.Z3_OP_MUL else max(arguments)
+    return len(degrees) - no_of_nodes, max((degrees[z3core.Z3_get_ast_id(ref, term)] for term in terms), default=0)
+
+
+def reported(phase):
+    """
+    Decorator recording a row of the encoding report of the object for each call of a method
+    :param phase: name of the row
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.encoding_report.entry(phase):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class EncodingReport:
+    """
+    Exact size of the encoding and time spent per phase and subformula: variables created, assertions added, distinct
+    AST nodes of these assertions, their polynomial degree, and encoding time. Rows are only recorded when the report
+    is enabled. A subformula is encoded together with its operands, the counts of the operands are subtracted, so each
+    row only covers what the subformula adds itself.
+    The solver and variables are read from the encoder, a ModelChecker or SemanticsEncoder, when they are counted.
+    Assertions written to an SMT-LIB file are not kept, so their nodes and degree are not reported.
+    """
+
+    def __init__(self, encoder, enabled=False):
+        self.encoder = encoder
+        self.enabled = enabled
+        self.rows = []
+        self.frames = []  # rows being recorded, the innermost last
+
+    def variables(self):
+        return len(self.encoder.dictOfReals) + len(self.encoder.dictOfBools)
+
+    def subformula(self, index, hyperproperty):
+        """
+        Record the row of a subformula, named after the subformula and its operator, the temporal operator for
+        probabilities
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        operator = hyperproperty.data
+        if operator == 'probability':
+            operator = hyperproperty.children[0].data
+        return self.entry(formulaToString(hyperproperty), index, operator)
+
+    @contextlib.contextmanager
+    def entry(self, name, index=None, operator=None):
+        """
+        Record a row for the enclosed block
+        :param index: index of the subformula, None for the phases encoding the schedulers and quantifiers
+        """
+        if not self.enabled:
+            yield
+            return
+        frame = {'variables': self.variables(), 'assertions': noOfAssertions(self.encoder.solver),
+                 'inner_variables': 0, 'inner_time': 0.0, 'inner_assertions': [],
+                 'time': time.perf_counter()}
+        self.frames.append(frame)
+        try:
+            yield
+        finally:
+            self.frames.pop()
+            elapsed = time.perf_counter() - frame['time']
+            variables = self.variables() - frame['variables']
+            end = noOfAssertions(self.encoder.solver)
+            own = []  # ranges of the assertions added by this row, without those of its operands
+            start = frame['assertions']
+            for inner_start, inner_end in frame['inner_assertions']:
+                own.append((start, inner_start))
+                start = inner_end
+            own.append((start, end))
+            row = {'name': name, 'index': index, 'operator': operator,
+                   'variables': variables - frame['inner_variables'],
+                   'assertions': sum(stop - begin for begin, stop in own),
+                   'time': elapsed - frame['inner_time']}
+            row['nodes'], row['degree'] = self.countNodes(own)
+            self.rows.append(row)
+            if len(self.frames) > 0:
+                outer = self.frames[-1]
+                outer['inner_variables'] += variables
+                # including the time to count the nodes, which is not part of the encoding
+                outer['inner_time'] += time.perf_counter() - frame['time']
+                outer['inner_assertions'].append((frame['assertions'], end))
+
+    def countNodes(self, ranges):
+        """
+        :param ranges: list of ranges of indices of assertions in the solver
+        :return: number of distinct AST nodes and polynomial degree of these assertions, None if they are not kept
+        """
+        if isinstance(self.encoder.solver, SmtLibWriter):
+            return None, None
+        assertions = self.encoder.solver.assertions()
+        ref = assertions.ctx.ref()
+        terms = [z3core.Z3_ast_vector_get(ref, assertions.vector, position)
+                 for begin, end in ranges for position in range(begin, end)]
+        return termStatistics(assertions.ctx, terms, dict())
+
+    def printReport(self):
+        common.colourinfo("Size of the encoding:")
+        common.colourinfo("{:<50} {:<16} {:>10} {:>10} {:>12} {:>6} {:>9}".format(
+            "Phase / subformula", "Operator", "Variables", "Assertions", "AST nodes", "Degree", "Time (s)"), False)
+        for row in self.rows:
+            name = row['name'] if len(row['name']) <= 50 else row['name'][:47] + "..."
+            print("{:<50} {:<16} {:>10} {:>10} {:>12} {:>6} {:>9}".format(
+                name, row['operator'] or "", row['variables'], row['assertions'], str(row['nodes']),
+                str(row['degree']), round(row['time'], 3)))
+        nodes = [row['nodes'] for row in self.rows]
+        common.colouroutput("{:<50} {:<16} {:>10} {:>10} {:>12} {:>6} {:>9}".format(
+            "Total", "", sum(row['variables'] for row in self.rows), sum(row['assertions'] for row in self.rows),
+            str(sum(nodes)) if None not in nodes else "None",
+            str(max((row['degree'] for row in self.rows if row['degree'] is not None), default=None)),
+            round(sum(row['time'] for row in self.rows), 3)), False)
@@ -1,13 +1,59 @@
 import argparse
+import shutil
 
 
 def parseArguments():
     parser = argparse.ArgumentParser(description='Model checks an Markov Chain against a given HyperPCTL specification.')
-    parser.add_argument('-modelPath', required=True, help='path to the MDP/DTMC model file in PRISM language')
-    parser.add_argument('-hyperString', required=True, help='the specification string in HyperPCTL')
+    parser.add_argument('-modelPath', required=False, help='path to the MDP/DTMC model file in PRISM language')
+    parser.add_argument('-hyperString', required=False, help='the specification string in HyperPCTL')
+    parser.add_argument('-propertyFile', required=False, help='file with one HyperPCTL specification per line, checked together sharing their encodings')
     parser.add_argument('-stutterLength', required=False, help='Memory size for stutter scheduler')
     parser.add_argument('--checkModel', action='store_true', help='check if model file can be parsed')
     parser.add_argument('--checkProperty', action='store_true', help='check if property file can be parsed')
     parser.add_argument('--maxSchedProb', required=False, help='upper bound for the probabilities assigned by the scheduler')
+    parser.add_argument('-traceFile', required=False, help='write a trace of the phases of model checking in the Chrome trace-event format to this file')
+    parser.add_argument('--dryRun', action='store_true', help='report the size of the encoding and its projected memory usage without model checking')
+    parser.add_argument('-memoryLimit', type=float, required=False, help='memory in MB available, a dry run exits with status 2 if the projection exceeds it, a worker limits each job to it')
+    parser.add_argument('-encodingWorkers', type=int, default=1, help='number of processes encoding the semantics of the subformulas')
+    parser.add_argument('-boundedHorizon', type=int, required=False, help='bound F, U and G to this number of steps, under-approximating F and U and over-approximating G')
+    parser.add_argument('-cacheDir', required=False, help='directory of the cached witnesses, ~/.cache/hyperprob if not given')
+    parser.add_argument('--noWarmStart', action='store_true', help='neither try nor store witnesses of properties that hold')
+    parser.add_argument('--noCache', action='store_true', help='check the property again instead of reporting the cached result of the same check, and replace the cached result')
+    parser.add_argument('--lazyQuantifiers', action='store_true', help='start with the state tuples of initial states and add those of the outermost universal quantifiers when the solver violates them')
+    parser.add_argument('--probabilityBounds', action='store_true', help='assert intervals of the probabilities of F, U and G computed on the model before encoding')
+    parser.add_argument('--preCheck', action='store_true', help='try to decide the property with intervals of the probabilities before encoding it')
+    parser.add_argument('-witnessSearch', type=float, required=False, help='seconds to sample schedulers and stutter-schedulers for a witness before encoding')
+    parser.add_argument('-searchWorkers', type=int, default=1, help='number of processes sampling schedulers in the witness search')
+    parser.add_argument('-smtLibFile', required=False, help='write the encoding to this SMT-LIB2 file while encoding and solve it with the z3 executable')
+    parser.add_argument('--encodingReport', action='store_true', help='print the variables, assertions, AST nodes, polynomial degree and time of the encoding per phase and subformula')
+    parser.add_argument('--server', action='store_true', help='stay resident and model check jobs given as JSON lines on stdin or on a Unix socket')
+    parser.add_argument('-socket', required=False, help='path of the Unix socket the server listens on, stdin is used if not given')
+    parser.add_argument('-workers', type=int, default=1, help='number of jobs the server or a worker checks concurrently')
+    parser.add_argument('-cacheSize', type=int, default=8, help='number of models and properties each worker of the server keeps')
+    parser.add_argument('--coordinator', action='store_true', help='hand the jobs of -jobFile, or given as JSON lines on stdin, to workers connecting over TCP')
+    parser.add_argument('--worker', action='store_true', help='model check the jobs handed out by the coordinator at -host and -port')
+    parser.add_argument('-host', default='localhost', help='host the coordinator listens on or the worker connects to')
+    parser.add_argument('-port', type=int, default=7421, help='port the coordinator listens on or the worker connects to')
+    parser.add_argument('-jobFile', required=False, help='file with the jobs of the coordinator as JSON lines, stdin is used if not given')
+    parser.add_argument('-retries', type=int, default=2, help='number of times the coordinator hands out a job again whose worker failed or timed out')
+    parser.add_argument('-jobTimeout', type=float, required=False, help='seconds a job may take on a worker unless it sets a timeout of its own')
     args = parser.parse_args()
+    if args.server + args.coordinator + args.worker > 1:
+        parser.error("only one of --server, --coordinator and --worker can be given")
+    service = args.server or args.coordinator or args.worker
+    if not service and (args.modelPath is None or (args.hyperString is None and args.propertyFile is None)):
+        parser.error("the following arguments are required: -modelPath, -hyperString or -propertyFile")
+    if args.boundedHorizon is not None and args.boundedHorizon < 0:
+        parser.error("-boundedHorizon has to be non-negative")
+    if args.smtLibFile is not None:
+        if args.propertyFile is not None or args.lazyQuantifiers:
+            parser.error("-smtLibFile cannot be combined with -propertyFile or --lazyQuantifiers")
+        if shutil.which('z3') is None:
+            parser.error("-smtLibFile requires the z3 executable on the PATH")
+    if args.witnessSearch is not None and args.witnessSearch < 0:
+        parser.error("-witnessSearch has to be non-negative")
+    if args.retries < 0:
+        parser.error("-retries has to be non-negative")
+    if args.jobTimeout is not None and args.jobTimeout <= 0:
+        parser.error("-jobTimeout has to be positive")
     return args
@@ -1,32 +1,78 @@
+import concurrent.futures
 import copy
 import time
 import itertools
+import math
+from fractions import Fraction
 
 from lark import Tree
-from z3 import SolverFor, Bool, Real, Or, sat, And, Implies, RealVal, Sum
+from z3 import SolverFor, Bool, Real, sat, RealVal, is_true
 
 import hyperprob.semanticencoder
 from hyperprob.utility import common
+from hyperprob.utility.tracing import tracer, traced
 from hyperprob import propertyparser
 from hyperprob.semanticencoder import SemanticsEncoder
+from hyperprob.encodingestimator import EncodingEstimator
+from hyperprob.output import printWitness, valueToString
+from hyperprob.encodingreport import EncodingReport, reported
+from hyperprob.probabilitybounds import ProbabilityBounds, infeasibleActionSets
+from hyperprob.smtlibwriter import SmtLibTerms, SmtLibVariables, SmtLibWriter, addVariable, noOfAssertions
+from hyperprob.termbuilder import TermBuilder
+from hyperprob.utility.memory import getPeakMemory
+from hyperprob.utility.progress import Progress, ProgressReporter
+
 
 class ModelChecker:
-    def __init__(self, model, hyperproperty, lengthOfStutter, maxSchedProb):
+    def __init__(self, model, hyperproperty, lengthOfStutter, maxSchedProb, encodingWorkers=1, boundedHorizon=None,
+                 witnessCache=None, lazyQuantifiers=False, probabilityBounds=False, preCheck=False,
+                 witnessSearch=None, searchWorkers=1, smtLibFile=None, progress=None, encodingReport=False):
         self.model = model
         self.initial_hyperproperty = hyperproperty  # object of property class
-        self.solver = SolverFor("QF_NRA")
+        self.smtLibFile = smtLibFile  # file the encoding is written to and solved from by the z3 executable, or None
+        self.solver = SolverFor("QF_NRA") if smtLibFile is None else SmtLibWriter(smtLibFile)
+        # builds the terms of the schedulers and quantifiers, as text if the encoding is written to an SMT-LIB file
+        self.terms = TermBuilder() if smtLibFile is None else SmtLibTerms()
         self.stutterLength = lengthOfStutter  # default value 1 equals no stuttering
         self.maxSchedProb = maxSchedProb
         self.list_of_subformula = []
-        self.dictOfReals = dict()
-        self.dictOfBools = dict()
+        # variables by name, only declared in the file if the encoding is written to an SMT-LIB file
+        self.dictOfReals = dict() if smtLibFile is None else SmtLibVariables(self.solver, Real)
+        self.dictOfBools = dict() if smtLibFile is None else SmtLibVariables(self.solver, Bool)
         self.no_of_subformula = 0
         self.no_of_state_quantifier = 0
         self.no_of_stutter_quantifier = 0
         self.stutter_state_mapping = None  # value at index of stutter variable is the corresponding state variable
+        self.state_quantifiers = []  # (state index, 'A'/'V', domain label) in order of quantification
+        self.state_domains = dict()  # states each state quantifier ranges over, dict[state index] = list of states
+        self.reachable_states = dict()  # states reachable from the domain, dict[stutter quantifier] = list of states
+        self.statistics = dict()  # sizes of the encoding, time spent in the phases of model checking and verdict
+        self.index_of_phi = 0  # index of the non-quantified property in list_of_subformula
+        self.encodingWorkers = encodingWorkers  # number of processes encoding the semantics of the subformulas
+        self.boundedHorizon = boundedHorizon  # steps the unbounded temporal operators are bounded to, None if exact
+        self.witnessCache = witnessCache  # WitnessCache to warm start from and store witnesses in, None to disable
+        self.witness = None  # dict[variable name] = value as string of the witness, if the property holds
+        self.satisfying_tuples = None  # set of the state tuples satisfying the non-quantified property, if it holds
+        # (variable name, value) of the scheduler and stutter-schedulers of the candidate found by the witness search
+        self.sampled_witness = []
+        self.lazyQuantifiers = lazyQuantifiers  # add the state tuples of outermost universal quantifiers on demand
+        # dict[state tuple of the lazily encoded quantifiers] = formula, for the instances not added to the solver yet
+        self.lazy_instances = dict()
+        # ProbabilityBounds of the model asserted on the probabilities of the subformulas, None to disable
+        self.probability_bounds = ProbabilityBounds(model) if probabilityBounds else None
+        self.preCheck = preCheck  # try to decide the property with the intervals of the probabilities before encoding
+        self.witnessSearch = witnessSearch  # seconds to sample schedulers before encoding, None to disable
+        self.searchWorkers = searchWorkers  # number of processes sampling schedulers
+        # Progress of the phases encoding the state tuples and composed states, reported on stdout by default
+        self.progress = progress if progress is not None else Progress([ProgressReporter()])
+        # variables, assertions, AST nodes, degree and time per phase and subformula, recorded if encodingReport is set
+        self.encoding_report = EncodingReport(self, encodingReport)
 
-    def modelCheck(self):
-        # parse property
+    def prepareProperty(self):
+        """
+        Strip the quantifiers of the property, collect its subformulas and determine the states to consider
+        :return: the non-quantified property
+        """
         stutter_quantified_property, self.no_of_state_quantifier, state_indices = propertyparser.checkStateQuantifiers(
             copy.deepcopy(self.initial_hyperproperty.parsed_property))
         non_quantified_property, self.stutter_state_mapping = propertyparser.checkStutterQuantifiers(
@@ -35,6 +81,24 @@ class ModelChecker:
         self.no_of_state_quantifier = len(set(self.stutter_state_mapping.values()))
         non_quantified_property = non_quantified_property.children[0]
         self.addToSubformulaList(non_quantified_property)
+        self.computeStateDomains()
+        return non_quantified_property
+
+    def modelCheck(self):
+        try:
+            self.encodeAndCheck()
+        finally:
+            if self.smtLibFile is not None:
+                # the file is closed when it is solved, an unfinished encoding is removed
+                self.solver.discard()
+
+    def encodeAndCheck(self):
+        non_quantified_property = self.prepareProperty()
+        self.reportApproximation(non_quantified_property)
+        if self.preCheck and self.intervalCheck(non_quantified_property) != 'inconclusive':
+            return
+        if self.witnessSearch is not None:
+            self.searchWitness(non_quantified_property)
 
         start_time = time.perf_counter()
         # encode scheduler and stutter-schedulers
@@ -52,23 +116,253 @@ class ModelChecker:
                                            self.no_of_subformula,
                                            self.no_of_state_quantifier, self.no_of_stutter_quantifier,
                                            self.stutterLength,
-                                           self.stutter_state_mapping
+                                           self.stutter_state_mapping,
+                                           self.reachable_states,
+                                           self.encodingWorkers,
+                                           self.boundedHorizon,
+                                           self.probability_bounds,
+                                           self.progress,
+                                           self.encoding_report
                                            )
-        semanticEncoder.encodeSemantics(non_quantified_property)
+        try:
+            semanticEncoder.encodeSemantics(non_quantified_property)
+        finally:
+            semanticEncoder.shutdownWorkers()
+
+        self.restrictProbabilities()
+
+        encoding_time = time.perf_counter() - start_time
+        self.statistics['encoding_time'] = encoding_time
+        common.colourinfo("\nTime to encode in seconds: " + str(round(encoding_time, 2)), False)
+        if self.encoding_report.enabled:
+            self.encoding_report.printReport()
+            self.statistics['encoding_report'] = self.encoding_report.rows
+
+        self.printResult()
+
+    @traced()
+    def intervalCheck(self, non_quantified_property):
+        """
+        Evaluate the property over the state tuples with the intervals containing the probabilities of its subformulas
+        under all schedulers and stutter-schedulers. If the intervals decide the non-quantified property for enough
+        state tuples, the verdict holds for every scheduler and is reported without encoding the property.
+        :return: 'holds', 'does not hold' or 'inconclusive'
+        """
+        if self.boundedHorizon is not None:
+            common.colourinfo("The pre-check is skipped, it does not apply to bounded probabilities.", False)
+            self.statistics['pre_check'] = 'inconclusive'
+            return 'inconclusive'
+        common.colourinfo("Pre-checking the property with intervals of the probabilities...", False)
+        start_time = time.perf_counter()
+        # the intervals hold for all schedulers of the MDP, they cannot tell that none stays within maxSchedProb
+        infeasible = infeasibleActionSets({frozenset(actions) for actions in self.model.getDictOfActions().values()},
+                                          self.maxSchedProb)
+        if infeasible:
+            self.statistics['pre_check_time'] = time.perf_counter() - start_time
+            if self.initial_hyperproperty.parsed_property.data != 'exist_scheduler':
+                common.colourinfo("The pre-check is inconclusive, no scheduler stays within maxSchedProb, "
+                                  "encoding the property.", False)
+                self.statistics['pre_check'] = 'inconclusive'
+                return 'inconclusive'
+            self.statistics['pre_check'] = 'does not hold'
+            self.statistics['verdict'] = 'does not hold'
+            self.statistics['decided_by'] = 'pre-check'
+            common.colourerror("The property DOES NOT hold!")
+            common.colourinfo("No scheduler of the actions " + str(set(infeasible[0])) + " stays within maxSchedProb " +
+                              str(self.maxSchedProb) + ".", False)
+            return 'does not hold'
+        # the intervals are only asserted in the encoding with probabilityBounds
+        probability_bounds = self.probability_bounds if self.probability_bounds is not None \
+            else ProbabilityBounds(self.model)
+        position_in_prefix = {state_index: pos for pos, (state_index, _, _) in enumerate(self.state_quantifiers)}
+
+        def evaluate(state_tuple):
+            states = {quant: state_tuple[position_in_prefix[state_index]]
+                      for quant, state_index in self.stutter_state_mapping.items()}
+            return probability_bounds.evaluate(non_quantified_property, states)
+
+        value, deciding_tuple = self.foldQuantifiers(0, (), evaluate)
+        verdict = {True: 'holds', False: 'does not hold', None: 'inconclusive'}[value]
+        self.statistics['pre_check'] = verdict
+        self.statistics['pre_check_time'] = time.perf_counter() - start_time
+        common.colourinfo("Time to pre-check in seconds: " + str(round(self.statistics['pre_check_time'], 2)), False)
+        assignment = ", ".join("s" + str(self.state_quantifiers[pos][0]) + " = " + str(state)
+                               for pos, state in enumerate(deciding_tuple))
+        if value is None:
+            common.colourinfo("The pre-check is inconclusive" +
+                              (" for " + assignment if assignment else "") + ", encoding the property.", False)
+            return verdict
+        self.statistics['verdict'] = verdict
+        self.statistics['decided_by'] = 'pre-check'
+        if value:
+            common.colouroutput("The property HOLDS!")
+        else:
+            common.colourerror("The property DOES NOT hold!")
+        common.colourinfo("The verdict follows from the intervals of the probabilities, for every scheduler" +
+                          (", deciding state variable assignment: " + assignment if assignment else ""), False)
+        return verdict
+
+    @traced()
+    def searchWitness(self, non_quantified_property):
+        """
+        Sample schedulers and stutter-schedulers for witnessSearch seconds and evaluate the property on the chains
+        they induce, before encoding it. The probabilities are only compared up to COMPARISON_TOLERANCE, so a
+        candidate satisfying the property is kept in sampled_witness and verified exactly by the solver after encoding.
+        """
+        if self.initial_hyperproperty.parsed_property.data != 'exist_scheduler':
+            common.colourinfo("The witness search is skipped, it only applies to existential scheduler quantifiers.",
+                              False)
+            return
+        if self.smtLibFile is not None:
+            common.colourinfo("The witness search is skipped, a candidate cannot be verified on an SMT-LIB file.",
+                              False)
+            return
+        from hyperprob.witnesssearch import WitnessSearch, initialiseSearchWorker, searchRound, ROUND_DURATION
+        search = WitnessSearch(self.model, non_quantified_property, self.state_quantifiers, self.state_domains,
+                               self.stutter_state_mapping, self.stutterLength, self.maxSchedProb, self.boundedHorizon)
+        if search.infeasible_action_sets:
+            self.statistics['witness_search'] = 'infeasible'
+            common.colourinfo("The witness search is skipped, no scheduler of the actions " +
+                              str(set(search.infeasible_action_sets[0])) + " stays within maxSchedProb " +
+                              str(self.maxSchedProb) + ".", False)
+            return
+        common.colourinfo("Searching for a witness by sampling schedulers for " + str(self.witnessSearch) +
+                          " seconds...", False)
+        start_time = time.perf_counter()
+        end_time = start_time + self.witnessSearch
+        try:
+            if self.searchWorkers > 1:
+                # workers search in rounds, so that they all stop soon after one of them found a witness
+                witness, no_of_candidates = None, 0
+                with concurrent.futures.ProcessPoolExecutor(max_workers=self.searchWorkers,
+                                                            initializer=initialiseSearchWorker,
+                                                            initargs=(search,)) as executor:
+                    round_number = 0
+                    while witness is None and time.perf_counter() < end_time:
+                        duration = min(ROUND_DURATION, end_time - time.perf_counter())
+                        futures = [executor.submit(searchRound, round_number * self.searchWorkers + worker, duration)
+                                   for worker in range(self.searchWorkers)]
+                        round_number += 1
+                        for future in futures:
+                            found, candidates = future.result()
+                            no_of_candidates += candidates
+                            if witness is None:
+                                witness = found
+            else:
+                witness, no_of_candidates = search.search(0, self.witnessSearch)
+        except MemoryError:
+            # the search is only a shortcut, the encoding may still fit into memory
+            self.statistics['search_time'] = time.perf_counter() - start_time
+            self.statistics['witness_search'] = 'out of memory'
+            common.colourinfo("The witness search ran out of memory, encoding the property.", False)
+            return
+        self.statistics['search_time'] = time.perf_counter() - start_time
+        self.statistics['sampled_candidates'] = no_of_candidates
+        self.statistics['witness_search'] = 'found' if witness is not None else 'not found'
+        common.colourinfo("Sampled " + str(no_of_candidates) + " candidates in " +
+                          str(round(self.statistics['search_time'], 2)) + " seconds", False)
+        if witness is None:
+            common.colourinfo("No witness found by sampling, encoding the property.", False)
+            return
+        scheduler, stutter_scheduler, _ = witness
+        self.sampled_witness = sorted(scheduler.items()) + sorted(stutter_scheduler.items())
+        common.colourinfo("Found a candidate by sampling, encoding the property to verify it exactly.", False)
 
-        # ensure that all variables encoding probabilities range in [0, 1]
+    def foldQuantifiers(self, position, state_tuple, evaluate):
+        """
+        Fold three-valued truth values over the state quantifiers from the given position on, stopping at the first
+        value deciding a quantifier
+        :param state_tuple: states of the quantifiers before position
+        :param evaluate: function taking a tuple of states of all quantifiers to True, False or None
+        :return: truth value and the shortest prefix of a state tuple deciding it, or of one leaving it undecided
+        """
+        if position == len(self.state_quantifiers):
+            return evaluate(state_tuple), state_tuple
+        state_index, quantifier, _ = self.state_quantifiers[position]
+        deciding_value = quantifier == 'V'  # False decides a universal quantifier, True an existential one
+        undecided = None
+        for state in self.state_domains[state_index]:
+            value, deciding_tuple = self.foldQuantifiers(position + 1, state_tuple + (state,), evaluate)
+            if value == deciding_value:
+                return value, deciding_tuple
+            if value is None and undecided is None:
+                undecided = deciding_tuple
+        if undecided is not None:
+            return None, undecided
+        return not deciding_value, state_tuple
+
+    def reportApproximation(self, non_quantified_property):
+        """
+        Report the temporal operators that are replaced by their versions bounded to boundedHorizon steps,
+        and whether their probabilities are under- or over-approximated
+        """
+        directions = set()
+        if self.boundedHorizon is not None:
+            for subformula in non_quantified_property.iter_subtrees_topdown():
+                if subformula.data == 'probability' and \
+                        subformula.children[0].data in hyperprob.semanticencoder.BOUNDED_APPROXIMATION.keys():
+                    direction = hyperprob.semanticencoder.BOUNDED_APPROXIMATION[subformula.children[0].data]
+                    directions.add(direction)
+                    common.colourinfo(propertyparser.formulaToString(subformula) + " is " + direction +
+                                      "-approximated by bounding it to " + str(self.boundedHorizon) + " steps", False)
+        self.statistics['approximation'] = " and ".join(sorted(directions)) if directions else 'none'
+
+    @reported('restrictions')
+    def restrictProbabilities(self):
+        """
+        Ensure that all variables encoding probabilities range in [0, 1]
+        """
+        terms = self.terms
         restrictions = []
         for name in self.dictOfReals.keys():
             if name[0] == 'p':
-                restrictions.append(And(self.dictOfReals[name] >= RealVal(0), self.dictOfReals[name] <= RealVal(1)))
+                restrictions.append(terms.expression(terms.conjunction([terms.greaterEqual(self.realTerm(name), terms.real(0)),
+                                                                        terms.lessEqual(self.realTerm(name), terms.real(1))])))
         self.solver.add(restrictions)
         self.no_of_subformula += 1
+        terms.release()
 
-        encoding_time = time.perf_counter() - start_time
-        common.colourinfo("\nTime to encode in seconds: " + str(round(encoding_time, 2)), False)
+    def dryRun(self, memory_limit=None):
+        """
+        Report the size of the encoding and a projection of its memory usage without encoding the property
+        :param memory_limit: memory in megabytes available for model checking
+        :return: False if the projected memory usage exceeds memory_limit, True otherwise
+        """
+        non_quantified_property = self.prepareProperty()
+        self.reportApproximation(non_quantified_property)
+        estimator = EncodingEstimator(self)
+        estimator.estimate(non_quantified_property)
+        estimator.printEstimate()
+        self.statistics.update(estimator.statistics)
+        if memory_limit is not None and estimator.statistics['projected_memory'] > memory_limit:
+            common.colourerror("Projected memory usage exceeds the limit of " + str(memory_limit) + " MB.")
+            return False
+        return True
 
-        self.printResult()
+    def computeStateDomains(self):
+        """
+        Determine the states each state quantifier ranges over and, for each stutter quantifier,
+        the states reachable from the domain of its associated state quantifier.
+        Only these states need to be considered when encoding the non-quantified property.
+        """
+        self.state_quantifiers = propertyparser.getStateQuantifiers(self.initial_hyperproperty.parsed_property)
+        for state_index, _, domain in self.state_quantifiers:
+            if domain is None:
+                self.state_domains[state_index] = self.model.getListOfStates()
+            else:
+                self.state_domains[state_index] = self.model.getStatesWithLabel(domain)
+                if len(self.state_domains[state_index]) == 0:
+                    raise ValueError("No state of the model is labelled with " + domain + ".")
+                common.colourinfo("Quantifier s" + str(state_index) + " ranges over " +
+                                  str(len(self.state_domains[state_index])) + " states labelled " + domain, False)
+        for stutter_index, state_index in self.stutter_state_mapping.items():
+            if len(self.state_domains[state_index]) == len(self.model.getListOfStates()):
+                self.reachable_states[stutter_index] = self.model.getListOfStates()
+            else:
+                self.reachable_states[stutter_index] = self.model.getReachableStates(self.state_domains[state_index])
 
+    @traced()
+    @reported('scheduler')
     def encodeScheduler(self):
         """
         Introduce variables encoding the probabilistic memoryless scheduler which satisfies the following:
@@ -77,6 +371,7 @@ class ModelChecker:
         """
         common.colourinfo("Encoding scheduler...")
         set_of_actionsets = {frozenset(x) for x in self.model.getDictOfActions().values()}
+        terms = self.terms
         scheduler_restrictions = []
 
         for A in set_of_actionsets:
@@ -86,22 +381,25 @@ class ModelChecker:
                 action = list(A)[0]
                 name = "a_" + str(set(A)) + "_" + str(action)
                 self.addToVariableList(name)
-                scheduler_restrictions.append(self.dictOfReals[name] == RealVal(1)) # .as_fraction()
+                scheduler_restrictions.append(terms.equal(self.realTerm(name), terms.real(1)))
             else:
                 for action in A:
                     name = "a_" + str(set(A)) + "_" + str(action)
                     self.addToVariableList(name)
                     # probabilistic scheduler
-                    maxVal = self.maxSchedProb
+                    maxVal = Fraction(str(self.maxSchedProb))
                     minVal = 1 - maxVal
-                    scheduler_restrictions.append(self.dictOfReals[name] >= RealVal(minVal))
-                    scheduler_restrictions.append(self.dictOfReals[name] <= RealVal(maxVal))
-                    sum_over_probs.append(self.dictOfReals[name])
-                scheduler_restrictions.append(Sum(sum_over_probs) == RealVal(1))
+                    scheduler_restrictions.append(terms.greaterEqual(self.realTerm(name), terms.real(str(minVal))))
+                    scheduler_restrictions.append(terms.lessEqual(self.realTerm(name), terms.real(str(maxVal))))
+                    sum_over_probs.append(self.realTerm(name))
+                scheduler_restrictions.append(terms.equal(terms.sum(sum_over_probs), terms.real(1)))
 
-        self.solver.add(And(scheduler_restrictions))
+        self.solver.add(terms.expression(terms.conjunction(scheduler_restrictions)))
         self.no_of_subformula += 1
+        terms.release()
 
+    @traced()
+    @reported('stutter-schedulers')
     def encodeStuttering(self):
         """
         Introduce variables encoding:
@@ -113,6 +411,7 @@ class ModelChecker:
 
         # encode the stutter-schedulers
         common.colourinfo("Encoding stutter-schedulers...", False)
+        terms = self.terms
         list_over_quantifiers = []
         for quantifier in range(0, self.no_of_stutter_quantifier):
             list_over_states = []
@@ -123,14 +422,14 @@ class ModelChecker:
                     name = "t_" + str(quantifier + 1) + "_" + str(state.id) + "_" + str(action.id)
                     self.addToVariableList(name)
                     for stutter_length in range(0, self.stutterLength):
-                        list_of_equations.append(self.dictOfReals[name] == RealVal(stutter_length))
-                    list_over_actions.append(Or(list_of_equations))
+                        list_of_equations.append(terms.equal(self.realTerm(name), terms.real(stutter_length)))
+                    list_over_actions.append(terms.disjunction(list_of_equations))
                     self.no_of_subformula += 1
-                list_over_states.append(And(list_over_actions))
+                list_over_states.append(terms.conjunction(list_over_actions))
                 self.no_of_subformula += 1
-            list_over_quantifiers.append(And(list_over_states))
+            list_over_quantifiers.append(terms.conjunction(list_over_states))
             self.no_of_subformula += 1
-        self.solver.add(And(list_over_quantifiers))
+        self.solver.add(terms.expression(terms.conjunction(list_over_quantifiers)))
         self.no_of_subformula += 1
 
         # encode probability of transitioning to successor under encoded stutter-scheduler and
@@ -139,6 +438,7 @@ class ModelChecker:
         states_with_stutter = list(itertools.product(self.model.getListOfStates(), list(range(self.stutterLength))))
         list_over_quants = []
         list_over_quants_go = []
+        step_probabilities = []
         for i in range(1, self.no_of_stutter_quantifier + 1):
             list_over_states = []
             list_over_states_go = []
@@ -155,7 +455,7 @@ class ModelChecker:
                         space = s.find(' ')
                         succ_state = int(s[0:space])
                         mdp_successor_list.append((succ_state, 0))
-                        dict_of_probs[(succ_state, 0)] = RealVal(s[space + 1:])
+                        dict_of_probs[(succ_state, 0)] = terms.real(s[space + 1:])
 
                     # mdp successors
                     for succ in mdp_successor_list:
@@ -164,28 +464,37 @@ class ModelChecker:
                         tr = "Tr_" + str(i) + "_" + str(state_stutter) + "_" + str(action) + "_" + str(succ)
                         self.addToVariableList(tr)
 
-                        restriction = Or(self.dictOfReals[tr] == RealVal(0), self.dictOfReals[tr] == dict_of_probs[succ])
-                        stutter = Implies(state_stutter[1] >= self.dictOfReals[stu_name],
-                                          self.dictOfReals[tr] == dict_of_probs[succ])
-                        cont = Implies(state_stutter[1] < self.dictOfReals[stu_name],
-                                       self.dictOfReals[tr] == RealVal(0))
-                        list_over_succs.append(And(restriction, stutter, cont))
+                        restriction = terms.disjunction([terms.equal(terms.real(0), self.realTerm(tr)),
+                                                         terms.equal(dict_of_probs[succ], self.realTerm(tr))])
+                        stutter = terms.implies(terms.lessEqual(self.realTerm(stu_name), terms.real(state_stutter[1])),
+                                                terms.equal(dict_of_probs[succ], self.realTerm(tr)))
+                        cont = terms.implies(terms.greater(self.realTerm(stu_name), terms.real(state_stutter[1])),
+                                             terms.equal(terms.real(0), self.realTerm(tr)))
+                        list_over_succs.append(terms.conjunction([restriction, stutter, cont]))
                         self.no_of_subformula += 1
 
                         # go
                         go = "go_" + str(i) + "_" + str(state_stutter) + "_" + str(action) + "_" + str(succ)
                         self.addToVariableList(go)
-                        pseudo_bool = Or(self.dictOfReals[go] == 0, self.dictOfReals[go] == 1)
-                        stutter_go = And(state_stutter[1] < self.dictOfReals[stu_name],
-                                      succ[1] == state_stutter[1] + 1)
-                        cont_go = And(state_stutter[1] >= self.dictOfReals[stu_name],
-                                   succ[1] == 0)
-
-                        list_over_succs_go.append(And(pseudo_bool,
-                                                      And(Implies(self.dictOfReals[go] == 1, Or(stutter_go, cont_go)),
-                                                          Implies(Or(cont_go, stutter_go), self.dictOfReals[go] == 1))))
+                        pseudo_bool = terms.disjunction([terms.equal(self.realTerm(go), terms.real(0)),
+                                                         terms.equal(self.realTerm(go), terms.real(1))])
+                        stutter_go = terms.conjunction([
+                            terms.greater(self.realTerm(stu_name), terms.real(state_stutter[1])),
+                            terms.boolean(succ[1] == state_stutter[1] + 1)])
+                        cont_go = terms.conjunction([
+                            terms.lessEqual(self.realTerm(stu_name), terms.real(state_stutter[1])),
+                            terms.boolean(succ[1] == 0)])
+
+                        go_is_one = terms.equal(self.realTerm(go), terms.real(1))
+                        list_over_succs_go.append(terms.conjunction([
+                            pseudo_bool,
+                            terms.conjunction([terms.implies(go_is_one, terms.disjunction([stutter_go, cont_go])),
+                                               terms.implies(terms.disjunction([cont_go, stutter_go]), go_is_one)])]))
                         self.no_of_subformula += 2
 
+                        step_probabilities.append(self.encodeStepProbability(i, state_stutter, action, succ))
+                        self.no_of_subformula += 1
+
                     # stutter successor
                     if state_stutter[1] < self.stutterLength - 1:
                         stu_name = "t_" + str(i) + "_" + str(state_stutter[0]) + "_" + str(action)
@@ -195,65 +504,87 @@ class ModelChecker:
                         tr = "Tr_" + str(i) + "_" + str(state_stutter) + "_" + str(action) + "_" + str(succ)
                         self.addToVariableList(tr)
 
-                        restriction = Or(self.dictOfReals[tr] == RealVal(0), self.dictOfReals[tr] == RealVal(1))
-                        stutter = Implies(state_stutter[1] >= self.dictOfReals[stu_name],
-                                          self.dictOfReals[tr] == RealVal(0))
-                        cont = Implies(state_stutter[1] < self.dictOfReals[stu_name],
-                                       self.dictOfReals[tr] == RealVal(1))
-                        list_over_succs.append(And(restriction, stutter, cont))
+                        restriction = terms.disjunction([terms.equal(terms.real(0), self.realTerm(tr)),
+                                                         terms.equal(terms.real(1), self.realTerm(tr))])
+                        stutter = terms.implies(terms.lessEqual(self.realTerm(stu_name), terms.real(state_stutter[1])),
+                                                terms.equal(terms.real(0), self.realTerm(tr)))
+                        cont = terms.implies(terms.greater(self.realTerm(stu_name), terms.real(state_stutter[1])),
+                                             terms.equal(terms.real(1), self.realTerm(tr)))
+                        list_over_succs.append(terms.conjunction([restriction, stutter, cont]))
                         self.no_of_subformula += 1
 
                         # go
                         go = "go_" + str(i) + "_" + str(state_stutter) + "_" + str(action) + "_" + str(succ)
                         self.addToVariableList(go)
-                        pseudo_bool = Or(self.dictOfReals[go] == 0, self.dictOfReals[go] == 1)
-                        stutter_go = And(state_stutter[1] < self.dictOfReals[stu_name],
-                                         succ[1] == state_stutter[1] + 1)
-                        cont_go = And(state_stutter[1] >= self.dictOfReals[stu_name],
-                                      succ[1] == 0)
-
-                        list_over_succs_go.append(And(pseudo_bool,
-                                                      And(Implies(self.dictOfReals[go] == 1, Or(stutter_go, cont_go)),
-                                                          Implies(Or(cont_go, stutter_go), self.dictOfReals[go] == 1))))
+                        pseudo_bool = terms.disjunction([terms.equal(self.realTerm(go), terms.real(0)),
+                                                         terms.equal(self.realTerm(go), terms.real(1))])
+                        stutter_go = terms.conjunction([
+                            terms.greater(self.realTerm(stu_name), terms.real(state_stutter[1])),
+                            terms.boolean(succ[1] == state_stutter[1] + 1)])
+                        cont_go = terms.conjunction([
+                            terms.lessEqual(self.realTerm(stu_name), terms.real(state_stutter[1])),
+                            terms.boolean(succ[1] == 0)])
+
+                        go_is_one = terms.equal(self.realTerm(go), terms.real(1))
+                        list_over_succs_go.append(terms.conjunction([
+                            pseudo_bool,
+                            terms.conjunction([terms.implies(go_is_one, terms.disjunction([stutter_go, cont_go])),
+                                               terms.implies(terms.disjunction([cont_go, stutter_go]), go_is_one)])]))
                         self.no_of_subformula += 2
 
-                    list_over_actions.append(And(list_over_succs))
+                        step_probabilities.append(self.encodeStepProbability(i, state_stutter, action, succ))
+                        self.no_of_subformula += 1
+
+                    list_over_actions.append(terms.conjunction(list_over_succs))
                     self.no_of_subformula += 1
-                    list_over_actions_go.append(And(list_over_succs_go))
+                    list_over_actions_go.append(terms.conjunction(list_over_succs_go))
                     self.no_of_subformula += 1
-                list_over_states.append(And(list_over_actions))
+                list_over_states.append(terms.conjunction(list_over_actions))
                 self.no_of_subformula += 1
-                list_over_states_go.append(And(list_over_actions_go))
+                list_over_states_go.append(terms.conjunction(list_over_actions_go))
                 self.no_of_subformula += 1
-            list_over_quants.append(And(list_over_states))
+            list_over_quants.append(terms.conjunction(list_over_states))
             self.no_of_subformula += 1
-            list_over_quants_go.append(And(list_over_states_go))
+            list_over_quants_go.append(terms.conjunction(list_over_states_go))
             self.no_of_subformula += 1
-        self.solver.add(And(list_over_quants))
+        self.solver.add(terms.expression(terms.conjunction(list_over_quants)))
+        self.no_of_subformula += 1
+        self.solver.add(terms.expression(terms.conjunction(list_over_quants_go)))
         self.no_of_subformula += 1
-        self.solver.add(And(list_over_quants_go))
+        self.solver.add(terms.expression(terms.conjunction(step_probabilities)))
         self.no_of_subformula += 1
+        terms.release()
 
+    def encodeStepProbability(self, quantifier, state_stutter, action, succ):
+        """
+        Introduce variable stepProb_i_(s,j)_x_(s',j') for the probability that stutter quantifier i moves from (s,j)
+        to (s',j') under action x: the product of the probabilities of choosing x, of moving on under the
+        stutter-scheduler and of the transition. The encoders of the temporal operators share these variables
+        instead of building the product for every composed state.
+        :return: equation defining the variable, built by self.terms
+        """
+        suffix = str(quantifier) + "_" + str(state_stutter) + "_" + str(action) + "_" + str(succ)
+        name = "stepProb_" + suffix
+        self.addToVariableList(name)
+        A = set(self.model.dict_of_acts[state_stutter[0]])
+        return self.terms.equal(self.realTerm(name),
+                                self.terms.product([self.realTerm("go_" + suffix),
+                                                    self.realTerm("a_" + str(A) + "_" + str(action)),
+                                                    self.realTerm("Tr_" + suffix)]))
+
+    @traced()
+    @reported('quantifiers')
     def truth(self):
         """
         Encode the state quantifiers by translating "forall" to conjunction and "exists" to disjunction
         """
-        # cycle through property and collect forall, exist
-        list_of_state_AV = []  # will have the OR, AND according to the quantifier in that index in the formula
+        # cycle through property to find the non-quantified formula
         # TODO: work to remove assumption of stutter schedulers named in order
         common.colourinfo("Prepare encoding quantifiers...", False)
         changed_hyperproperty = self.initial_hyperproperty.parsed_property
         while len(changed_hyperproperty.children) > 0:
-            if changed_hyperproperty.data in ['exist_scheduler', 'forall_scheduler']:
-                changed_hyperproperty = changed_hyperproperty.children[1]
-            elif changed_hyperproperty.data == 'exist_state':
-                if int(changed_hyperproperty.children[0].value[1:]) in self.stutter_state_mapping.values():
-                    list_of_state_AV.append('V')
-                changed_hyperproperty = changed_hyperproperty.children[1]
-            elif changed_hyperproperty.data == 'forall_state':
-                if int(changed_hyperproperty.children[0].value[1:]) in self.stutter_state_mapping.values():
-                    list_of_state_AV.append('A')
-                changed_hyperproperty = changed_hyperproperty.children[1]
+            if changed_hyperproperty.data in ['exist_scheduler', 'forall_scheduler', 'exist_state', 'forall_state']:
+                changed_hyperproperty = changed_hyperproperty.children[-1]
             elif changed_hyperproperty.data == 'exist_stutter':
                 changed_hyperproperty = changed_hyperproperty.children[2]
             elif changed_hyperproperty.data in ['quantifiedformulastutter', 'quantifiedformulastate']:
@@ -261,51 +592,131 @@ class ModelChecker:
             else:
                 break
 
-        index_of_phi = self.list_of_subformula.index(changed_hyperproperty)
+        self.index_of_phi = self.list_of_subformula.index(changed_hyperproperty)
 
-        # create list of state tuples of the induced DTMC
-        list_of_states_with_initial_stutter = list(itertools.product(self.model.getListOfStates(), [0]))
-        list_of_state_tuples = list(
-            itertools.product(list_of_states_with_initial_stutter, repeat=self.no_of_state_quantifier))
-        if self.no_of_stutter_quantifier != self.no_of_state_quantifier:
-            combined_list_of_states_with_initial_stutter = [
-                tuple([x[self.stutter_state_mapping[q] - 1] for q in range(1, self.no_of_stutter_quantifier + 1)])
-                for x in list_of_state_tuples]
-        else:
-            combined_list_of_states_with_initial_stutter = list_of_state_tuples
+        # state tuples of the induced DTMC are enumerated in the order of the state quantifiers,
+        # the last quantifier varying fastest
+        list_of_state_AV = [quantifier for _, quantifier, _ in self.state_quantifiers]
+        position_in_prefix = {state_index: pos for pos, (state_index, _, _) in enumerate(self.state_quantifiers)}
+        list_of_domains_with_initial_stutter = [[str((state, 0)) for state in self.state_domains[state_index]]
+                                                for state_index, _, _ in self.state_quantifiers]
+        # position in the state tuple of each stutter quantifier, stutter quantifiers beyond those of this property
+        # only occur when it is checked together with other properties
+        positions = [position_in_prefix[self.stutter_state_mapping[q]] if q in self.stutter_state_mapping else None
+                     for q in range(1, self.no_of_stutter_quantifier + 1)]
 
-        # create list of holds_(s1,0)_..._0 for all state combinations
-        list_of_holds = []
-        for i in range(len(combined_list_of_states_with_initial_stutter)):
+        # in the lazy mode, the outermost universal quantifiers are not folded: the formula of each of their state tuples
+        # is kept as an instance, only some of which are added to the solver before checking
+        no_of_lazy_quantifiers = 0
+        if self.lazyQuantifiers:
+            while no_of_lazy_quantifiers < len(list_of_state_AV) and list_of_state_AV[no_of_lazy_quantifiers] == 'A':
+                no_of_lazy_quantifiers += 1
+            if no_of_lazy_quantifiers == 0:
+                common.colourinfo("The outermost state quantifier is not universal, encoding all state tuples.", False)
+        self.lazy_instances = dict()
+
+        # encode the state quantifiers as a fold over the state tuples: layers[i] collects the formulas for the values
+        # of quantifier i + 1 under the current values of the outer quantifiers, once all values are collected they are
+        # combined to a conjunction or disjunction and passed to the next outer layer
+        common.colourinfo("Encoding state quantifiers...", False)
+        terms = self.terms
+        memory_before = getPeakMemory()
+        domain_sizes = [len(domain) for domain in list_of_domains_with_initial_stutter]
+        layers = [[] for _ in range(self.no_of_state_quantifier)]
+        self.progress.begin('truth', math.prod(domain_sizes))
+        for state_tuple in itertools.product(*list_of_domains_with_initial_stutter):
+            # holds_(s1,0)_..._index of phi for the current state tuple
             name = "holds_"
-            for j in range(self.no_of_stutter_quantifier):
-                name += str(combined_list_of_states_with_initial_stutter[i][j]) + "_"
-            name += str(index_of_phi)
+            for pos in positions:
+                name += (state_tuple[pos] if pos is not None else str((0, 0))) + "_"
+            name += str(self.index_of_phi)
             self.addToVariableList(name)
-            list_of_holds.append(self.dictOfBools[name])
+            formula = self.boolTerm(name)
+            quant = self.no_of_state_quantifier
+            while quant > no_of_lazy_quantifiers:
+                layers[quant - 1].append(formula)
+                if len(layers[quant - 1]) < domain_sizes[quant - 1]:
+                    break
+                if list_of_state_AV[quant - 1] == 'A':
+                    formula = terms.conjunction(layers[quant - 1])
+                elif list_of_state_AV[quant - 1] == 'V':
+                    formula = terms.disjunction(layers[quant - 1])
+                self.no_of_subformula += 1
+                layers[quant - 1] = []
+                quant -= 1
+            if quant == 0:
+                self.solver.add(terms.expression(formula))
+            elif quant == no_of_lazy_quantifiers:
+                self.lazy_instances[state_tuple[:no_of_lazy_quantifiers]] = terms.expression(formula)
+            self.progress.advance(1, 1 if quant == 0 else 0)
+        self.progress.end()
+        terms.release()
+        if len(self.lazy_instances) > 0:
+            self.addInitialInstances()
+        self.statistics['quantifier_peak_memory'] = getPeakMemory()
+        common.colourinfo("Peak memory after encoding the state quantifiers in MB: " +
+                          str(round(self.statistics['quantifier_peak_memory'], 2)) + " (increased by " +
+                          str(round(self.statistics['quantifier_peak_memory'] - memory_before, 2)) + ")", False)
 
-        # iteratively encode state quantifiers
-        common.colourinfo("Encoding state quantifiers...", False)
-        state_encoding_i = []
-        state_encoding_ipo = list_of_holds
-        for quant in range(self.no_of_state_quantifier, 0, -1):
-            n = len(self.model.getListOfStates())
-            len_i = int(len(state_encoding_ipo) / n)
-            if list_of_state_AV[quant - 1] == 'A':
-                state_encoding_i = [And(state_encoding_ipo[(j * n):((j + 1) * n)]) for j in range(len_i)]
-            elif list_of_state_AV[quant - 1] == 'V':
-                state_encoding_i = [Or(state_encoding_ipo[(j * n):((j + 1) * n)]) for j in range(len_i)]
-            self.no_of_subformula += len_i
-            state_encoding_ipo.clear()
-            state_encoding_ipo = copy.deepcopy(state_encoding_i)
-            state_encoding_i.clear()
-        self.solver.add(state_encoding_ipo[0])
+    def addInitialInstances(self):
+        """
+        Add the instances of the lazily encoded universal quantifiers whose states are all initial to the solver,
+        or the first instance if there is no such instance
+        """
+        initial_states = {str((state, 0)) for state in self.model.getStatesWithLabel('init')}
+        initial_instances = [state_tuple for state_tuple in self.lazy_instances
+                             if all(state in initial_states for state in state_tuple)]
+        if len(initial_instances) == 0:
+            initial_instances = [next(iter(self.lazy_instances))]
+        for state_tuple in initial_instances:
+            self.solver.add(self.lazy_instances.pop(state_tuple))
+        self.statistics['lazy_instances'] = len(initial_instances)
+        self.statistics['refinements'] = 0
+        common.colourinfo("Lazily encoding the universal state quantifiers, starting with " +
+                          str(len(initial_instances)) + " of " + str(len(initial_instances) + len(self.lazy_instances)) +
+                          " state tuples", False)
+
+    def refineInstances(self, solver, truth):
+        """
+        Add the instances of the lazily encoded universal quantifiers violated by the model found by the solver,
+        until none is violated. The semantics of the subformulas are encoded for all states, so the model determines
+        whether each instance holds under the scheduler and stutter-schedulers found.
+        :return: result of the last check
+        """
+        while truth == sat and len(self.lazy_instances) > 0:
+            z3model = solver.model()
+            violated = [state_tuple for state_tuple, formula in self.lazy_instances.items()
+                        if not is_true(z3model.eval(formula, model_completion=True))]
+            if len(violated) == 0:
+                break
+            for state_tuple in violated:
+                solver.add(self.lazy_instances.pop(state_tuple))
+            self.statistics['lazy_instances'] += len(violated)
+            self.statistics['refinements'] += 1
+            common.colourinfo("Refinement " + str(self.statistics['refinements']) + ": adding " + str(len(violated)) +
+                              " violated state tuples, " + str(len(self.lazy_instances)) + " remain", False)
+            with tracer.span("solver check", {'refinement': self.statistics['refinements']}):
+                truth = solver.check()
+        return truth
+
+    def traceCounters(self):
+        return {'variables': len(self.dictOfReals) + len(self.dictOfBools),
+                'assertions': noOfAssertions(self.solver)}
 
     def addToVariableList(self, name):
         if name[0] == 'h' and not name.startswith('holdsToInt'):  # holds_
-            self.dictOfBools[name] = Bool(name)
-        elif name[0] in ['p', 'd', 'a', 't', 'g', 'T'] or name.startswith('holdsToInt'):  # prob_, d_, a_, t_, go_, Tr_
-            self.dictOfReals[name] = Real(name)
+            addVariable(self.dictOfBools, name, Bool)
+        elif name[0] in ['p', 'd', 'a', 't', 'g', 'T'] or name.startswith(('holdsToInt', 'stepProb')):  # prob_, d_, a_, t_, go_, Tr_, stepProb_
+            addVariable(self.dictOfReals, name, Real)
+
+    def realTerm(self, name):
+        """
+        :return: variable of the name for the terms built by self.terms
+        """
+        return self.terms.variable(self.dictOfReals, name)
+
+    def boolTerm(self, name):
+        return self.terms.variable(self.dictOfBools, name)
 
     def addToSubformulaList(self, formula_phi):
         """
@@ -314,7 +725,7 @@ class ModelChecker:
         :param formula_phi: subformula to be added to list
         """
         if formula_phi.data in ['exist_scheduler', 'forall_scheduler', 'exist_state', 'forall_state']:
-            formula_phi = formula_phi.children[1]
+            formula_phi = formula_phi.children[-1]
             self.addToSubformulaList(formula_phi)
         elif formula_phi.data in ['and', 'or', 'implies', 'equivalent',
                                   'less_probability', 'equal_probability', 'greater_probability',
@@ -368,14 +779,37 @@ class ModelChecker:
             - smt_time: time the SMT solver took to check the formula
         """
         common.colourinfo("\nChecking SMT-formula...", False)
-        common.colourinfo(
-            "Number of variables: " +
-            str(len(self.dictOfReals.keys()) + len(self.dictOfBools.keys())),
-            False)
+        self.statistics['no_of_variables'] = len(self.dictOfReals.keys()) + len(self.dictOfBools.keys())
+        self.statistics['no_of_subformula'] = self.no_of_subformula
+        common.colourinfo("Number of variables: " + str(self.statistics['no_of_variables']), False)
         common.colourinfo("Number of formulas to check: " + str(self.no_of_subformula), False)
         starting_time = time.perf_counter()
-        truth = self.solver.check()
+        solver = self.solver
+        # the z3 executable solves the SMT-LIB file in one go, so no cached witness can be tried on it
+        witness = self.loadWitness() if self.smtLibFile is None else []
+        truth = None
+        if len(self.sampled_witness) > 0:
+            truth = self.checkSampledWitness(solver)
+        if truth != sat and len(witness) > 0:
+            truth = self.checkWitness(solver, witness)
+        if self.smtLibFile is not None:
+            common.colourinfo("Solving " + self.smtLibFile + " with the z3 executable...", False)
+            with tracer.span("solver check"):
+                truth = solver.check()
+        elif truth != sat:
+            with tracer.span("solver check"):
+                truth = solver.check()
+                if truth.r == 0 and solver.num_scopes() > 0:
+                    # after push, z3 uses its incremental solver, which is incomplete for non-linear real arithmetic;
+                    # check again with the non-incremental solver used for a single property
+                    common.colourinfo("Incremental solver returned unknown, checking again from scratch...", False)
+                    solver = SolverFor("QF_NRA")
+                    solver.add(self.solver.assertions())
+                    self.hintWitness(solver, witness)
+                    truth = solver.check()
+        truth = self.refineInstances(solver, truth)
         smt_time = time.perf_counter() - starting_time
+        self.statistics['smt_time'] = smt_time
         common.colourinfo("Finished checking!", False)
         common.colourinfo("Time required by z3 in seconds: " + str(round(smt_time, 2)), False)
 
@@ -385,12 +819,16 @@ class ModelChecker:
         stuttersched_assignments = []
         other = []
         if truth == sat:
-            z3model = self.solver.model()
+            if self.smtLibFile is not None:
+                assignments = solver.model()
+            else:
+                z3model = solver.model()
+                assignments = [(li.name(), z3model[li]) for li in z3model]
             list_of_corr_stutter_qs = [[k for k, v in self.stutter_state_mapping.items() if v == q + 1] for q in range(self.no_of_state_quantifier)]
 
-            for li in z3model:
-                if li.name()[0] == 'h' and z3model[li] and li.name().split("_")[-1] == '0':
-                    state_tuples_list = li.name().split("_")[1:-1]
+            for name, value in assignments:
+                if name.startswith('holds_') and name.split("_")[-1] == str(self.index_of_phi) and value:
+                    state_tuples_list = name.split("_")[1:-1]
                     states_list = [elt.split(", ")[0][1:] for elt in state_tuples_list]
                     stutter_set = {elt.split(", ")[1][:-1] for elt in state_tuples_list}
                     states_by_state_qs = [[states_list[i-1] for i in x] for x in list_of_corr_stutter_qs]
@@ -398,15 +836,89 @@ class ModelChecker:
                     if stutter_set == {'0'} and {len(set(x)) for x in states_by_state_qs} == {1}:
                         state_list = [x[0] for x in states_by_state_qs]
                         set_of_holds.add(tuple(state_list))
-                elif li.name()[0] == 'a':
-                    scheduler_assignments.append((li.name(), z3model[li]))
-                elif li.name()[0] == 't':
-                    stuttersched_assignments.append((li.name(), z3model[li]))
+                elif name[0] == 'a':
+                    scheduler_assignments.append((name, value))
+                elif name[0] == 't':
+                    stuttersched_assignments.append((name, value))
 
             other.sort()
             for x in other:
                 print(x)
-        return truth, scheduler_assignments, set_of_holds, stuttersched_assignments, self.solver.statistics()
+        return truth, scheduler_assignments, set_of_holds, stuttersched_assignments, solver.statistics()
+
+    def witnessParameters(self):
+        return {'stutterLength': self.stutterLength, 'maxSchedProb': self.maxSchedProb,
+                'boundedHorizon': self.boundedHorizon}
+
+    def loadWitness(self):
+        """
+        Look up the witness of a previous run of the property on the model
+        :return: list of the variables of the scheduler and the stutter-schedulers in the witness that also occur
+                 in this encoding, and their values
+        """
+        self.statistics['warm_start'] = 'none'
+        if self.witnessCache is None:
+            return []
+        witness = self.witnessCache.load(self.model.model_path,
+                                         propertyparser.formulaToString(self.initial_hyperproperty.parsed_property))
+        if witness is None:
+            return []
+        if witness['parameters'] == self.witnessParameters():
+            common.colourinfo("Trying the cached witness...", False)
+        else:
+            common.colourinfo("Trying the cached witness found with " + str(witness['parameters']) + "...", False)
+        return [(self.dictOfReals[name], RealVal(value)) for name, value in witness['assignments'].items()
+                if name in self.dictOfReals]
+
+    def checkWitness(self, solver, witness):
+        """
+        Check the SMT formula with the scheduler and the stutter-schedulers fixed to the cached witness.
+        If the witness does not work, e.g. because the model has changed, its values are used as hints for the solver.
+        :return: sat if the witness works, None otherwise
+        """
+        with tracer.span("witness check"):
+            truth = solver.check([variable == value for variable, value in witness])
+        if truth == sat:
+            common.colourinfo("The cached witness still works.", False)
+            self.statistics['warm_start'] = 'witness'
+            return truth
+        common.colourinfo("The cached witness does not work, searching from its values...", False)
+        self.statistics['warm_start'] = 'hints'
+        self.hintWitness(solver, witness)
+        return None
+
+    def checkSampledWitness(self, solver):
+        """
+        Check the SMT formula with the scheduler and the stutter-schedulers fixed to the candidate of the witness
+        search, which compared probabilities in floating-point arithmetic. If the solver refutes the candidate, its
+        values are used as hints.
+        :return: sat if the candidate is a witness, None otherwise
+        """
+        candidate = [(self.dictOfReals[name], RealVal(str(value))) for name, value in self.sampled_witness
+                     if name in self.dictOfReals]
+        with tracer.span("witness check"):
+            truth = solver.check([variable == value for variable, value in candidate])
+        if truth == sat:
+            common.colourinfo("The solver confirms the candidate found by sampling.", False)
+            self.statistics['witness_search'] = 'verified'
+            return truth
+        common.colourinfo("The solver refutes the candidate found by sampling, searching from its values...", False)
+        self.statistics['witness_search'] = 'refuted'
+        self.hintWitness(solver, candidate)
+        return None
+
+    def hintWitness(self, solver, witness):
+        # initial values are only supported by recent versions of z3
+        if hasattr(solver, 'set_initial_value'):
+            for variable, value in witness:
+                solver.set_initial_value(variable, value)
+
+    def storeWitness(self, scheduler_assignments, stuttersched_assignments):
+        self.witness = {name: valueToString(value) for name, value in scheduler_assignments + stuttersched_assignments}
+        if self.witnessCache is not None:
+            self.witnessCache.store(self.model.model_path,
+                                    propertyparser.formulaToString(self.initial_hyperproperty.parsed_property),
+                                    self.witnessParameters(), scheduler_assignments + stuttersched_assignments)
 
     def printResult(self):
         """
@@ -417,30 +929,150 @@ class ModelChecker:
         scheduler_assignments.sort()
         stuttersched_assignments.sort()
 
+        self.statistics['verdict'] = {1: 'holds', -1: 'does not hold'}.get(smt_result.r, 'unknown')
+        self.statistics['decided_by'] = 'solver'
         if smt_result.r == 1:
-            # todo adjust to more fine-grained output depending on different quantifier combinations?
-            common.colouroutput("The property HOLDS!")
-            print("\nThe values of variables of the witness are:")
-            print("Choose scheduler probabilities as follows:")
-            for act_prob in scheduler_assignments:
-                common.colouroutput(
-                    "At a state with enabled actions " + act_prob[0].split("_")[1] +
-                    " choose action " + act_prob[0].split("_")[2] +
-                    " with probability " + str(act_prob[1]),
-                    False)
-            print("\nChoose stutterschedulers as follows:")
-            for stutter_step in stuttersched_assignments:
-                common.colouroutput(
-                    "For quantifier t" + stutter_step[0].split("_")[1] +
-                    " : For state " + stutter_step[0].split("_")[2] +
-                    " and action " + stutter_step[0].split("_")[3] +
-                    " choose stuttering duration " + str(stutter_step[1]),
-                    False)
-            print("\nThe following state variable assignments (s1, ..., sn) satisfy the property:")
-            print(holds)
+            self.storeWitness(scheduler_assignments, stuttersched_assignments)
+            self.satisfying_tuples = holds
+            printWitness(scheduler_assignments, stuttersched_assignments, holds)
         elif smt_result.r == -1:
             common.colourerror("The property DOES NOT hold!")
         else:
             common.colourerror("Solver returns unknown")
+        if self.statistics.get('approximation', 'none') != 'none':
+            common.colourinfo("The verdict is for the probabilities bounded to " + str(self.boundedHorizon) +
+                              " steps (" + self.statistics['approximation'] + "-approximation)", False)
+        self.statistics['z3_statistics'] = str(statistics)
         common.colourinfo("\nz3 statistics:", False)
         common.colourinfo(str(statistics), False)
+
+
+class MultiPropertyChecker:
+    """
+    Checks several properties against the same model with the same stutterLength and maxSchedProb.
+    The scheduler, the stutter-schedulers and the semantics of all subformulas are encoded once into a shared solver,
+    subformulas occurring in several properties only once. The quantifiers of each property are then encoded and
+    checked between push and pop.
+    """
+
+    def __init__(self, model, list_of_properties, lengthOfStutter, maxSchedProb, encodingWorkers=1,
+                 boundedHorizon=None, witnessCache=None, lazyQuantifiers=False, probabilityBounds=False,
+                 preCheck=False, witnessSearch=None, searchWorkers=1, progress=None, encodingReport=False):
+        self.model = model
+        self.stutterLength = lengthOfStutter
+        self.preCheck = preCheck
+        self.witnessSearch = witnessSearch
+        self.encodingWorkers = encodingWorkers
+        self.boundedHorizon = boundedHorizon
+        self.progress = progress if progress is not None else Progress([ProgressReporter()])
+        self.encodingReport = encodingReport
+        self.modelcheckers = [ModelChecker(model, hyperproperty, lengthOfStutter, maxSchedProb,
+                                           boundedHorizon=boundedHorizon, witnessCache=witnessCache,
+                                           lazyQuantifiers=lazyQuantifiers,
+                                           probabilityBounds=probabilityBounds,
+                                           witnessSearch=witnessSearch, searchWorkers=searchWorkers,
+                                           progress=self.progress, encodingReport=encodingReport)
+                              for hyperproperty in list_of_properties]
+        # all model checkers encode into the solver and variables of the first one
+        base = self.modelcheckers[0]
+        for modelchecker in self.modelcheckers[1:]:
+            modelchecker.solver = base.solver
+            modelchecker.dictOfReals = base.dictOfReals
+            modelchecker.dictOfBools = base.dictOfBools
+            modelchecker.list_of_subformula = base.list_of_subformula
+        self.statistics = dict()
+
+    def modelCheck(self):
+        list_of_non_quantified_properties = [modelchecker.prepareProperty() for modelchecker in self.modelcheckers]
+
+        # properties decided by the pre-check are neither encoded nor checked, candidates of the witness search are
+        # verified when their property is checked
+        verdicts = [None] * len(self.modelcheckers)
+        if self.preCheck or self.witnessSearch is not None:
+            for number, (modelchecker, non_quantified_property) in enumerate(zip(self.modelcheckers,
+                                                                                 list_of_non_quantified_properties)):
+                common.colourinfo("\nPre-checking property " + str(number + 1) + "/" + str(len(self.modelcheckers)) +
+                                  ": " + modelchecker.initial_hyperproperty.property_string)
+                verdict = 'inconclusive'
+                if self.preCheck:
+                    verdict = modelchecker.intervalCheck(non_quantified_property)
+                if verdict == 'inconclusive' and self.witnessSearch is not None:
+                    modelchecker.searchWitness(non_quantified_property)
+                if verdict != 'inconclusive':
+                    verdicts[number] = verdict
+        undecided = [number for number in range(len(self.modelcheckers)) if verdicts[number] is None]
+        if len(undecided) > 0:
+            self.checkUndecided(undecided, list_of_non_quantified_properties, verdicts)
+
+        common.colourinfo("\nSummary:")
+        for modelchecker, verdict in zip(self.modelcheckers, verdicts):
+            colour = common.colouroutput if verdict == 'holds' else common.colourerror
+            colour(verdict + ": " + modelchecker.initial_hyperproperty.property_string, False)
+        return verdicts
+
+    def checkUndecided(self, undecided, list_of_non_quantified_properties, verdicts):
+        """
+        Encode the semantics of the given properties once and check the properties one after another
+        :param undecided: numbers of the properties to check
+        :param verdicts: list of the verdicts of all properties, the verdicts of the checked properties are set
+        """
+        # encode for the largest number of stutter quantifiers, properties with fewer quantifiers leave the others
+        # unconstrained, and for each stutter quantifier for the union of the states the properties consider
+        modelcheckers = [self.modelcheckers[number] for number in undecided]
+        encoding_checker = max(modelcheckers, key=lambda modelchecker: modelchecker.no_of_stutter_quantifier)
+        no_of_stutter_quantifier = encoding_checker.no_of_stutter_quantifier
+        reachable_states = dict()
+        for quant in range(1, no_of_stutter_quantifier + 1):
+            reachable_states[quant] = sorted(set().union(*[modelchecker.reachable_states.get(quant, [])
+                                                          for modelchecker in modelcheckers]))
+
+        start_time = time.perf_counter()
+        encoding_checker.encodeScheduler()
+        encoding_checker.encodeStuttering()
+        common.colourinfo("\nEncoding non-quantified formulas...", False)
+        semanticEncoder = SemanticsEncoder(self.model, encoding_checker.solver,
+                                           encoding_checker.list_of_subformula,
+                                           encoding_checker.dictOfReals, encoding_checker.dictOfBools,
+                                           encoding_checker.no_of_subformula,
+                                           encoding_checker.no_of_state_quantifier, no_of_stutter_quantifier,
+                                           self.stutterLength,
+                                           encoding_checker.stutter_state_mapping,
+                                           reachable_states,
+                                           self.encodingWorkers,
+                                           self.boundedHorizon,
+                                           encoding_checker.probability_bounds,
+                                           encoding_checker.progress,
+                                           encoding_checker.encoding_report
+                                           )
+        try:
+            for number in undecided:
+                semanticEncoder.encodeSemantics(list_of_non_quantified_properties[number])
+        finally:
+            semanticEncoder.shutdownWorkers()
+        encoding_checker.restrictProbabilities()
+        shared_encoding_time = time.perf_counter() - start_time
+        self.statistics['encoding_time'] = shared_encoding_time
+        common.colourinfo("\nTime to encode the shared part in seconds: " + str(round(shared_encoding_time, 2)), False)
+        if self.encodingReport:
+            encoding_checker.encoding_report.printReport()
+            self.statistics['encoding_report'] = list(encoding_checker.encoding_report.rows)
+
+        for number in undecided:
+            modelchecker = self.modelcheckers[number]
+            common.colourinfo("\nChecking property " + str(number + 1) + "/" + str(len(self.modelcheckers)) + ": " +
+                              modelchecker.initial_hyperproperty.property_string)
+            modelchecker.reportApproximation(list_of_non_quantified_properties[number])
+            modelchecker.no_of_stutter_quantifier = no_of_stutter_quantifier
+            modelchecker.solver.push()
+            start_time = time.perf_counter()
+            modelchecker.truth()
+            modelchecker.statistics['encoding_time'] = time.perf_counter() - start_time
+            if self.encodingReport:
+                quantifiers = modelchecker.encoding_report.rows[-1]
+                common.colourinfo("Quantifiers: " + str(quantifiers['variables']) + " variables, " +
+                                  str(quantifiers['assertions']) + " assertions, " + str(quantifiers['nodes']) +
+                                  " AST nodes", False)
+                modelchecker.statistics['encoding_report'] = [quantifiers]
+            modelchecker.printResult()
+            modelchecker.solver.pop()
+            verdicts[number] = modelchecker.statistics['verdict']
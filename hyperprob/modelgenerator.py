@@ -0,0 +1,98 @@
+TEMPLATES = ['future', 'until', 'next', 'global']
+
+
+def generateModel(size, branching=1, action_sets=1):
+    """
+    Generate a PRISM MDP in the style of the CE and TL benchmarks.
+    A thread counts x from 0 to size and flips the observable bit l on its way.
+    At every step it chooses between a public action and actions whose progress depends on the secret h.
+    The model has 4 * (size + 1) states and two initial states, one for each value of h.
+    :param size: number of steps until the thread terminates
+    :param branching: number of probabilistic successors of each command
+    :param action_sets: number of different sets of enabled actions,
+                        states with x mod action_sets = r enable r + 2 actions
+    :return: PRISM program as string
+    """
+    if size < 1 or branching < 1 or action_sets < 1:
+        raise ValueError("Size, branching and number of action sets have to be positive.")
+    lines = ["mdp", "",
+             "const int N = " + str(size) + ";", "",
+             "module generated", "",
+             "    h : [0..1]; // secret input",
+             "    x : [0..N]; // progress of the thread",
+             "    l : [0..1]; // observable output", ""]
+    for region in range(action_sets):
+        guard = "(x<N)&(mod(x," + str(action_sets) + ")=" + str(region) + ")"
+        lines.append("    [act0] " + guard + " -> " + generateUpdates(branching, "") + ";")
+        for action in range(1, region + 2):
+            lines.append("    [act" + str(action) + "] " + guard + " -> " +
+                         generateUpdates(branching, "+" + str(action) + "*h") + ";")
+    lines += ["    [done] (x=N) -> true;", "",
+              "endmodule", "",
+              "init (x=0)&(l=0) endinit", "",
+              'label "i" = (x=0)&(l=0);',
+              'label "h0" = (x=0)&(l=0)&(h=0);',
+              'label "h1" = (x=0)&(l=0)&(h=1);',
+              'label "term" = (x=N);',
+              'label "goal" = (x=N)&(l=1);', ""]
+    return "\n".join(lines)
+
+
+def generateUpdates(branching, secret_offset):
+    """
+    Updates of a command moving x forward by 1 up to branching steps with uniform probability.
+    The first update flips the observable bit.
+    """
+    updates = []
+    for step in range(1, branching + 1):
+        update = "(x'=min(x+" + str(step) + secret_offset + ",N))"
+        if step == 1:
+            update += "&(l'=1-l)"
+        updates.append("1/" + str(branching) + ":" + update)
+    return " + ".join(updates)
+
+
+def generateProperty(quantifiers=2, template='future'):
+    """
+    Generate an A-HyperPCTL property for models created by generateModel.
+    For a single quantifier the probability is compared against a constant,
+    otherwise the first stutter quantifier is compared against each of the others.
+    :param quantifiers: number of state and stutter quantifiers
+    :param template: one of 'future', 'until', 'next' and 'global'
+    :return: property as string
+    """
+    if quantifiers < 1:
+        raise ValueError("At least one quantifier is required.")
+    if template not in TEMPLATES:
+        raise ValueError("Unknown template " + template + ", choose one of " + ", ".join(TEMPLATES) + ".")
+    prefix = "ES sh . "
+    prefix += "".join("A s" + str(i) + " . " for i in range(1, quantifiers + 1))
+    prefix += "".join("ET t" + str(i) + " (s" + str(i) + ") . " for i in range(1, quantifiers + 1))
+    antecedent = conjunction(["i(t" + str(i) + ")" for i in range(1, quantifiers + 1)])
+    if quantifiers == 1:
+        consequent = "(" + probabilityTerm(template, 1) + " >= 0.5)"
+    else:
+        consequent = conjunction(["(" + probabilityTerm(template, 1) + " = " + probabilityTerm(template, i) + ")"
+                                  for i in range(2, quantifiers + 1)])
+    return prefix + "(" + antecedent + " -> " + consequent + ")"
+
+
+def probabilityTerm(template, quantifier):
+    t = "(t" + str(quantifier) + ")"
+    if template == 'future':
+        return "P(F goal" + t + ")"
+    elif template == 'until':
+        return "P(~(term" + t + ") U goal" + t + ")"
+    elif template == 'next':
+        return "P(X goal" + t + ")"
+    return "P(G ~(goal" + t + "))"
+
+
+def conjunction(list_of_formulas):
+    """
+    Nest binary conjunctions, as the grammar only allows two operands per bracket
+    """
+    formula = list_of_formulas[0]
+    for other in list_of_formulas[1:]:
+        formula = "(" + formula + " & " + other + ")"
+    return formula
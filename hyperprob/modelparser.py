@@ -1,7 +1,9 @@
 import os
+import time
 import stormpy
 from z3 import RealVal
 from hyperprob.utility import common
+from hyperprob.utility.tracing import tracer
 
 import itertools
 
@@ -59,13 +61,29 @@ class Model:
         self.has_rewards = False
         self.model_path = model_path
         self.parsed_model = None
+        self.statistics = dict()  # sizes of the model and time spent in the phases of parsing
+
+    def __getstate__(self):
+        # the model built by stormpy cannot be pickled, worker processes only use the dictionaries of the model
+        state = self.__dict__.copy()
+        state['parsed_model'] = None
+        return state
 
     def parseModel(self, extra_processing):
         try:
             if os.path.exists(self.model_path):
-                initial_prism_program = stormpy.parse_prism_program(self.model_path)
-                initial_model = stormpy.build_model(initial_prism_program)
-                self.parsed_model = rebuildExactValueModel(initial_model)
+                starting_time = time.perf_counter()
+                with tracer.span("parse_prism_program", {'model': self.model_path}):
+                    initial_prism_program = stormpy.parse_prism_program(self.model_path)
+                self.statistics['parse_time'] = time.perf_counter() - starting_time
+                starting_time = time.perf_counter()
+                with tracer.span("build_model"):
+                    initial_model = stormpy.build_model(initial_prism_program)
+                self.statistics['build_time'] = time.perf_counter() - starting_time
+                starting_time = time.perf_counter()
+                with tracer.span("rebuildExactValueModel"):
+                    self.parsed_model = rebuildExactValueModel(initial_model)
+                self.statistics['rebuild_time'] = time.perf_counter() - starting_time
                 common.colourinfo("Total number of states: " + str(len(self.parsed_model.states)))
                 if len(list(self.parsed_model.reward_models.keys())) != 0:
                     self.has_rewards = True
@@ -90,6 +108,9 @@ class Model:
                             self.dict_of_acts_tran[str(state.id) + ' ' + str(action.id)] = list_of_tran
                         self.dict_of_acts[state.id] = list_of_act
 
+                self.statistics['states'] = len(self.parsed_model.states)
+                self.statistics['actions'] = number_of_action
+                self.statistics['transitions'] = number_of_transition
                 common.colourinfo("Total number of actions: " + str(number_of_action), False)
                 common.colourinfo("Total number of transitions: " + str(number_of_transition), False)
             else:
@@ -111,5 +132,34 @@ class Model:
     def getNumberOfActions(self):
         return len(set(itertools.chain.from_iterable(self.dict_of_acts.values())))
 
+    def getStatesWithLabel(self, label):
+        """
+        Collect all states carrying the given label. The label "init" marks the initial states.
+        :param label: name of a label of the model
+        :return: list of states with the label
+        """
+        labeling = self.parsed_model.labeling
+        if label not in labeling.get_labels():
+            raise ValueError("The label " + label + " does not exist in the model.")
+        return [state for state in self.list_of_states if label in labeling.get_labels_of_state(state)]
+
+    def getReachableStates(self, list_of_initial_states):
+        """
+        Collect all states reachable from the given states under any action
+        :param list_of_initial_states: states to start the search from
+        :return: sorted list of reachable states
+        """
+        reachable = set(list_of_initial_states)
+        stack = list(reachable)
+        while stack:
+            state = stack.pop()
+            for action in self.dict_of_acts[state]:
+                for tran in self.dict_of_acts_tran[str(state) + ' ' + str(action)]:
+                    succ_state = int(tran[0:tran.find(' ')])
+                    if succ_state not in reachable:
+                        reachable.add(succ_state)
+                        stack.append(succ_state)
+        return sorted(reachable)
+
     def hasRewards(self):
         return self.has_rewards
@@ -0,0 +1,40 @@
+from hyperprob.utility import common
+
+
+def valueToString(value):
+    """
+    Write a value of a z3 model exactly if it is rational, and as a decimal approximation otherwise
+    """
+    from z3 import is_algebraic_value, is_rational_value
+    if is_rational_value(value):
+        return str(value.as_fraction())
+    if is_algebraic_value(value):
+        return value.as_decimal(20).rstrip('?')
+    return str(value).rstrip('?')
+
+
+def printWitness(scheduler_assignments, stuttersched_assignments, holds):
+    """
+    Print that the property holds together with its witness
+    :param holds: set of state tuples that satisfy the non-quantified property
+    """
+    # todo adjust to more fine-grained output depending on different quantifier combinations?
+    common.colouroutput("The property HOLDS!")
+    print("\nThe values of variables of the witness are:")
+    print("Choose scheduler probabilities as follows:")
+    for act_prob in scheduler_assignments:
+        common.colouroutput(
+            "At a state with enabled actions " + act_prob[0].split("_")[1] +
+            " choose action " + act_prob[0].split("_")[2] +
+            " with probability " + str(act_prob[1]),
+            False)
+    print("\nChoose stutterschedulers as follows:")
+    for stutter_step in stuttersched_assignments:
+        common.colouroutput(
+            "For quantifier t" + stutter_step[0].split("_")[1] +
+            " : For state " + stutter_step[0].split("_")[2] +
+            " and action " + stutter_step[0].split("_")[3] +
+            " choose stuttering duration " + str(stutter_step[1]),
+            False)
+    print("\nThe following state variable assignments (s1, ..., sn) satisfy the property:")
+    print(holds)
@@ -0,0 +1,224 @@
+import math
+from fractions import Fraction
+
+# connectives of subformulas evaluated to sets of states, taking the sets of the operands and the set of all states
+STATE_CONNECTIVES = {'and': lambda x, y, states: x & y,
+                     'or': lambda x, y, states: x | y,
+                     'implies': lambda x, y, states: (states - x) | y,
+                     'biconditional': lambda x, y, states: states - (x ^ y)}
+# arithmetic on intervals of probabilities
+INTERVAL_ARITHMETIC = {'add_probability': lambda a, b: (a[0] + b[0], a[1] + b[1]),
+                       'subtract_probability': lambda a, b: (a[0] - b[1], a[1] - b[0]),
+                       'multiply_probability': lambda a, b: (min(x * y for x in a for y in b),
+                                                             max(x * y for x in a for y in b))}
+# comparisons of intervals of probabilities, True or False if they hold for all values in the intervals, else None
+INTERVAL_COMPARISONS = {'less_probability': lambda a, b: True if a[1] < b[0] else False if a[0] >= b[1] else None,
+                        'less_and_equal_probability':
+                            lambda a, b: True if a[1] <= b[0] else False if a[0] > b[1] else None,
+                        'greater_probability': lambda a, b: True if a[0] > b[1] else False if a[1] <= b[0] else None,
+                        'greater_and_equal_probability':
+                            lambda a, b: True if a[0] >= b[1] else False if a[1] < b[0] else None,
+                        'equal_probability':
+                            lambda a, b: True if a[0] == a[1] == b[0] == b[1] else
+                            False if a[1] < b[0] or b[1] < a[0] else None}
+# three-valued connectives, None standing for unknown
+THREE_VALUED_CONNECTIVES = {'and': lambda x, y: False if False in [x, y] else None if None in [x, y] else True,
+                            'or': lambda x, y: True if True in [x, y] else None if None in [x, y] else False,
+                            'implies': lambda x, y: True if x is False or y is True else
+                            None if None in [x, y] else False,
+                            'biconditional': lambda x, y: None if None in [x, y] else x == y}
+# bounds are rounded outwards to this grid, after widening them by the error of floating-point arithmetic
+GRID = 10 ** 6
+ROUNDING_ERROR = 1e-9
+
+
+def infeasibleActionSets(action_sets, maxSchedProb):
+    """
+    Each of the n actions of a set gets a probability of at least 1 - maxSchedProb, which is impossible if
+    n * (1 - maxSchedProb) exceeds 1; a single action is always chosen with probability 1
+    :param action_sets: sets of the actions enabled at the states
+    :return: list of the action sets for which no scheduler stays within maxSchedProb
+    """
+    min_value = 1 - Fraction(str(maxSchedProb))
+    return [action_set for action_set in action_sets if len(action_set) > 1 and len(action_set) * min_value > 1]
+
+
+class ProbabilityBounds:
+    """
+    Intervals containing the probabilities of F, U and G subformulas under every scheduler and stutter-scheduler,
+    and of sums, differences and products of such probabilities.
+    Only subformulas over a single stutter quantifier whose operands depend on the state alone are bounded. Stuttering
+    repeats states, so the intervals computed on the MDP also hold in the composed states with stuttering.
+    """
+
+    def __init__(self, model, max_iterations=1000, precision=1e-12):
+        self.model = model
+        self.max_iterations = max_iterations
+        self.precision = precision
+        self.states = model.getListOfStates()
+        # dict[(state, action)] = list of (successor, probability)
+        self.transitions = dict()
+        for state in self.states:
+            for action in model.dict_of_acts[state]:
+                self.transitions[(state, action)] = [
+                    (int(tran[0:tran.find(' ')]), float(Fraction(tran[tran.find(' ') + 1:])))
+                    for tran in model.dict_of_acts_tran[str(state) + ' ' + str(action)]]
+        self.predecessors = {state: set() for state in self.states}  # states with a transition into the state
+        for (state, action), successors in self.transitions.items():
+            for succ, probability in successors:
+                if probability > 0:
+                    self.predecessors[succ].add(state)
+        self.reachability_bounds = dict()  # dict[(allowed states, target states)] = dict[state] = interval
+        self.formula_intervals = dict()  # dict[id of formula] = result of intervals, for evaluate
+
+    def stateFormula(self, formula):
+        """
+        :return: stutter quantifier of the formula, None if it has none, and the set of states satisfying it;
+                 None if the formula depends on more than the state of a single stutter quantifier
+        """
+        if formula.data == 'true':
+            return None, frozenset(self.states)
+        elif formula.data == 'atomic_proposition':
+            ap_name = formula.children[0].children[0].value
+            labeling = self.model.parsed_model.labeling
+            return int(formula.children[1].children[0].value[1:]), \
+                frozenset(state for state in self.states if ap_name in labeling.get_labels_of_state(state))
+        elif formula.data == 'not':
+            operand = self.stateFormula(formula.children[0])
+            if operand is None:
+                return None
+            return operand[0], frozenset(self.states) - operand[1]
+        elif formula.data in STATE_CONNECTIVES.keys():
+            operands = [self.stateFormula(child) for child in formula.children]
+            if None in operands or None not in [operands[0][0], operands[1][0]] and operands[0][0] != operands[1][0]:
+                return None
+            quantifier = operands[0][0] if operands[0][0] is not None else operands[1][0]
+            return quantifier, STATE_CONNECTIVES[formula.data](operands[0][1], operands[1][1], frozenset(self.states))
+        return None
+
+    def intervals(self, formula):
+        """
+        :return: list of stutter quantifiers the intervals depend on and a function taking the tuple of their states
+                 and returning the interval of the probability; None if the probability is not bounded
+        """
+        if formula.data == 'constant_probability':
+            constant = Fraction(formula.children[0].value)
+            return [], lambda states: (constant, constant)
+        elif formula.data in INTERVAL_ARITHMETIC.keys():
+            operands = [self.intervals(child) for child in formula.children]
+            if None in operands:
+                return None
+            quantifiers = sorted(set(operands[0][0]) | set(operands[1][0]))
+            positions = [[quantifiers.index(quant) for quant in operand[0]] for operand in operands]
+
+            def combined(states):
+                interval1, interval2 = [operand[1](tuple(states[pos] for pos in position))
+                                        for operand, position in zip(operands, positions)]
+                return INTERVAL_ARITHMETIC[formula.data](interval1, interval2)
+            return quantifiers, combined
+        elif formula.data == 'probability':
+            child = formula.children[0]
+            if child.data == 'future':
+                operands = [(None, frozenset(self.states)), self.stateFormula(child.children[0])]
+            elif child.data == 'until_unbounded':
+                operands = [self.stateFormula(child.children[0]), self.stateFormula(child.children[1])]
+            elif child.data == 'global':
+                # P(G phi) = 1 - P(true U ~phi)
+                operand = self.stateFormula(child.children[0])
+                operands = [(None, frozenset(self.states)),
+                            (operand[0], frozenset(self.states) - operand[1]) if operand is not None else None]
+            else:
+                return None
+            if None in operands:
+                return None
+            quantifiers = {operand[0] for operand in operands} - {None}
+            if len(quantifiers) != 1:
+                return None
+            bounds = self.reachability(operands[0][1], operands[1][1])
+            if child.data == 'global':
+                return list(quantifiers), lambda states: (1 - bounds[states[0]][1], 1 - bounds[states[0]][0])
+            return list(quantifiers), lambda states: bounds[states[0]]
+        return None
+
+    def evaluate(self, formula, states):
+        """
+        Evaluate a non-quantified formula in a tuple of states with three values, comparing the intervals of the
+        probabilities. A truth value is returned only if it holds for all schedulers and stutter-schedulers.
+        :param states: dict[stutter quantifier] = state
+        :return: True, False or None if the intervals do not decide the formula
+        """
+        if formula.data == 'true':
+            return True
+        elif formula.data == 'atomic_proposition':
+            ap_name = formula.children[0].children[0].value
+            state = states[int(formula.children[1].children[0].value[1:])]
+            return ap_name in self.model.parsed_model.labeling.get_labels_of_state(state)
+        elif formula.data == 'not':
+            value = self.evaluate(formula.children[0], states)
+            return None if value is None else not value
+        elif formula.data in THREE_VALUED_CONNECTIVES.keys():
+            return THREE_VALUED_CONNECTIVES[formula.data](self.evaluate(formula.children[0], states),
+                                                          self.evaluate(formula.children[1], states))
+        elif formula.data in INTERVAL_COMPARISONS.keys():
+            bounds = []
+            for child in formula.children:
+                if id(child) not in self.formula_intervals:
+                    self.formula_intervals[id(child)] = self.intervals(child)
+                if self.formula_intervals[id(child)] is None:
+                    return None
+                quantifiers, interval = self.formula_intervals[id(child)]
+                bounds.append(interval(tuple(states[quant] for quant in quantifiers)))
+            return INTERVAL_COMPARISONS[formula.data](bounds[0], bounds[1])
+        return None
+
+    def reachability(self, allowed, target):
+        """
+        Bound the probability of (allowed U target) under all schedulers. The lower bound is the minimal probability
+        of reaching the target within k steps, the upper bound is one minus the minimal probability of reaching,
+        within k steps, a state from which the target cannot be reached. Both are sound for every k.
+        :return: dict[state] = (lower bound, upper bound) as fractions
+        """
+        key = (allowed, target)
+        if key in self.reachability_bounds:
+            return self.reachability_bounds[key]
+        # states from which the target can be reached through allowed states under some scheduler
+        can_reach = set(target)
+        stack = list(target)
+        while stack:
+            for pred in self.predecessors[stack.pop()]:
+                if pred not in can_reach and pred in allowed:
+                    can_reach.add(pred)
+                    stack.append(pred)
+        never = frozenset(self.states) - can_reach
+
+        reach_target = self.minimalReachability(target, never)
+        reach_never = self.minimalReachability(never, target)
+        bounds = dict()
+        for state in self.states:
+            if state in target:
+                bounds[state] = (Fraction(1), Fraction(1))
+            elif state in never:
+                bounds[state] = (Fraction(0), Fraction(0))
+            else:
+                bounds[state] = (Fraction(max(0, math.floor((reach_target[state] - ROUNDING_ERROR) * GRID)), GRID),
+                                 Fraction(min(GRID, math.ceil((1 - reach_never[state] + ROUNDING_ERROR) * GRID)),
+                                          GRID))
+        self.reachability_bounds[key] = bounds
+        return bounds
+
+    def minimalReachability(self, goal, avoid):
+        """
+        Value iteration from below for the minimal probability of reaching goal without visiting avoid
+        """
+        values = {state: 1.0 if state in goal else 0.0 for state in self.states}
+        undecided = [state for state in self.states if state not in goal and state not in avoid]
+        for _ in range(self.max_iterations):
+            difference = 0.0
+            for state in undecided:
+                value = min(sum(probability * values[succ] for succ, probability in self.transitions[(state, action)])
+                            for action in self.model.dict_of_acts[state])
+                difference = max(difference, value - values[state])
+                values[state] = value
+            if difference < self.precision:
+                break
+        return values
@@ -1,6 +1,108 @@
 from lark import Lark, Token, Tree
+from lark.exceptions import LarkError
 from hyperprob.utility import common
+from hyperprob.utility.tracing import tracer
 import re
+from decimal import Decimal
+
+
+# the priorities resolve the two ambiguities of the grammar in the same way as the Earley parser:
+# a formula without stutter quantifiers is a quantifiedformulastutter and a constant in a comparison is a probability
+turtle_grammar = """
+start:    "AS" NAME "." quantifiedformulastate -> forall_scheduler
+    | "ES" NAME "." quantifiedformulastate -> exist_scheduler
+
+quantifiedformulastate:  "A" NAME "." quantifiedformulastate -> forall_state  
+    | "E" NAME "." quantifiedformulastate -> exist_state
+    | "A" NAME "[" NAME "]" "." quantifiedformulastate -> forall_state
+    | "E" NAME "[" NAME "]" "." quantifiedformulastate -> exist_state
+    | quantifiedformulastutter
+    | formula
+
+quantifiedformulastutter.2:  "AT" NAME "(" with ")" "." quantifiedformulastutter -> forall_stutter  
+    | "ET" NAME "(" with ")" "." quantifiedformulastutter -> exist_stutter
+    | formula
+
+formula: proposition "(" with ")"  -> atomic_proposition
+    | "(" formula "&" formula ")"-> and
+    | "(" formula "|" formula ")"-> or
+    | "(" formula "->" formula ")"-> implies
+    | "(" formula "<->" formula ")"-> biconditional
+    | "~(" formula ")" -> not
+    | "true" -> true
+    | "(" p "<" p ")" -> less_probability
+    | "(" p "=" p ")" -> equal_probability
+    | "(" p ">" p ")" -> greater_probability
+    | "(" p ">=" p ")" -> greater_and_equal_probability
+    | "(" p "<=" p ")" -> less_and_equal_probability
+    | "(" r "<" r ")" -> less_reward
+    | "(" r "=" r ")" -> equal_reward
+    | "(" r ">" r ")" -> greater_reward
+    | "(" r ">=" r ")" -> greater_and_equal_reward
+    | "(" r "<=" r ")" -> less_and_equal_reward
+
+p.2: "P" phi  -> probability
+    | p "+" p -> add_probability
+    | p "-" p -> subtract_probability
+    | p "." p -> multiply_probability
+    | NUM -> constant_probability
+
+r: "R" NAME phi  -> reward
+    | r "+" r -> add_reward
+    | r "-" r -> subtract_reward
+    | r "." r -> multiply_reward
+    | NUM -> constant_reward
+
+phi:  "(X" formula ")" -> next
+    | "(" formula "U" formula ")"-> until_unbounded
+    | "(" formula "U["NUM "," NUM"]" formula ")"-> until_bounded
+    | "(F" formula ")" -> future
+    | "(G" formula ")" -> global
+
+proposition: NAME 
+with: NAME
+
+%import common.CNAME -> NAME
+%import common.NUMBER ->NUM
+%import common.WS_INLINE
+%ignore WS_INLINE
+"""
+
+ARITHMETIC_OPERATORS = ['add_probability', 'subtract_probability', 'multiply_probability',
+                        'add_reward', 'subtract_reward', 'multiply_reward']
+
+compiled_parsers = dict()  # dict[parser algorithm] = Lark parser, compiled once per process
+
+
+def getParser(algorithm='lalr'):
+    """
+    Compile the grammar on first use. The LALR parser is also cached on disk by lark.
+    :param algorithm: 'lalr' or 'earley'
+    """
+    if algorithm not in compiled_parsers:
+        compiled_parsers[algorithm] = Lark(turtle_grammar, parser=algorithm, cache=(algorithm == 'lalr'))
+    return compiled_parsers[algorithm]
+
+
+def hasArithmeticChain(tree):
+    return any(node.data in ARITHMETIC_OPERATORS and
+               any(isinstance(child, Tree) and child.data in ARITHMETIC_OPERATORS for child in node.children)
+               for node in tree.iter_subtrees())
+
+
+def parse(property_string):
+    """
+    Parse a property with the LALR parser, falling back to the Earley parser where their results may differ:
+    the LALR lexer reads "(F", "(G" and "(X" as operators even where a proposition starting with F, G or X follows
+    a bracket, and an unbracketed chain of arithmetic operators is ambiguous and resolved differently.
+    """
+    try:
+        parsed_property = getParser('lalr').parse(property_string)
+    except LarkError:
+        return getParser('earley').parse(property_string)
+    if hasArithmeticChain(parsed_property):
+        return getParser('earley').parse(property_string)
+    return parsed_property
 
 
 class Property:
@@ -10,71 +112,17 @@ class Property:
         self.parsed_property = None
 
     def parseGrammar(self):
-        turtle_grammar = """
-                        start:    "AS" NAME "." quantifiedformulastate -> forall_scheduler
-                            | "ES" NAME "." quantifiedformulastate -> exist_scheduler
-                            
-                        quantifiedformulastate:  "A" NAME "." quantifiedformulastate -> forall_state  
-                            | "E" NAME "." quantifiedformulastate -> exist_state
-                            | quantifiedformulastutter
-                            | formula
-                            
-                        quantifiedformulastutter:  "AT" NAME "(" with ")" "." quantifiedformulastutter -> forall_stutter  
-                            | "ET" NAME "(" with ")" "." quantifiedformulastutter -> exist_stutter
-                            | formula
-                        
-                        formula: proposition "(" with ")"  -> atomic_proposition
-                            | "(" formula "&" formula ")"-> and
-                            | "(" formula "|" formula ")"-> or
-                            | "(" formula "->" formula ")"-> implies
-                            | "(" formula "<->" formula ")"-> biconditional
-                            | "~(" formula ")" -> not
-                            | "true" -> true
-                            | "(" p "<" p ")" -> less_probability
-                            | "(" p "=" p ")" -> equal_probability
-                            | "(" p ">" p ")" -> greater_probability
-                            | "(" p ">=" p ")" -> greater_and_equal_probability
-                            | "(" p "<=" p ")" -> less_and_equal_probability
-                            | "(" r "<" r ")" -> less_reward
-                            | "(" r "=" r ")" -> equal_reward
-                            | "(" r ">" r ")" -> greater_reward
-                            | "(" r ">=" r ")" -> greater_and_equal_reward
-                            | "(" r "<=" r ")" -> less_and_equal_reward
-
-                        p: "P" phi  -> probability
-                            | p "+" p -> add_probability
-                            | p "-" p -> subtract_probability
-                            | p "." p -> multiply_probability
-                            | NUM -> constant_probability
-
-                        r: "R" NAME phi  -> reward
-                            | r "+" r -> add_reward
-                            | r "-" r -> subtract_reward
-                            | r "." r -> multiply_reward
-                            | NUM -> constant_reward
-
-                        phi:  "(X" formula ")" -> next
-                            | "(" formula "U" formula ")"-> until_unbounded
-                            | "(" formula "U["NUM "," NUM"]" formula ")"-> until_bounded
-                            | "(F" formula ")" -> future
-                            | "(G" formula ")" -> global
-
-                        proposition: NAME 
-                        with: NAME
-
-                        %import common.CNAME -> NAME
-                        %import common.NUMBER ->NUM
-                        %import common.WS_INLINE
-                        %ignore WS_INLINE
-                    """
-        self.parsed_grammar = Lark(turtle_grammar)
+        self.parsed_grammar = getParser()
 
         # "ES sh . A s1 . A s2 . AT t1 (s1). ET t2. ET t3. ((start0(s1) & start1(s2)) -> (P (X end(s1)) = P (X end(s2))))"
 
     def parseProperty(self, print_property):
         try:
-            self.parseGrammar()
-            self.parsed_property = self.parsed_grammar.parse(self.property_string)
+            with tracer.span("parseProperty"):
+                self.parseGrammar()
+                parsed_property = parse(self.property_string)
+                checkBounds(parsed_property)
+                self.parsed_property = parsed_property
             if print_property:
                 self.printProperty()
         except Exception as err:
@@ -98,7 +146,7 @@ def checkStateQuantifiers(hyperproperty):
         elif formula_duplicate.data in ['exist_state', 'forall_state']:
             no_of_quantifier += 1
             variable_indices.add(int(formula_duplicate.children[0].value[1:]))
-            formula_duplicate = formula_duplicate.children[1]
+            formula_duplicate = formula_duplicate.children[-1]
         else:
             break
     if set(range(1,len(variable_indices)+1)) != variable_indices:
@@ -119,7 +167,7 @@ def checkStutterQuantifiers(hyperproperty, state_indices):
     variable_indices = []
     while len(formula_duplicate.children) > 0 and type(formula_duplicate.children[0]) == Token:
         if formula_duplicate.data in ['exist_scheduler', 'exist_state', 'forall_state']: # , 'forall_scheduler'
-            formula_duplicate = formula_duplicate.children[1]
+            formula_duplicate = formula_duplicate.children[-1]
         elif formula_duplicate.data in ['exist_stutter']: # , 'forall_stutter'
             no_of_quantifier += 1
             quant_stutter_state_quantifier[int(formula_duplicate.children[0].value[1:])] = int(
@@ -152,3 +200,158 @@ def checkStutterQuantifiers(hyperproperty, state_indices):
         raise ValueError("The variables used in the formula do not match the quantified variables.")
 
     return formula_duplicate, quant_stutter_state_quantifier
+
+
+def getStateQuantifiers(hyperproperty):
+    """
+    Collects the state quantifiers in order of quantification together with their domains
+    :param hyperproperty: AHyperPCTL formula
+    :return: list of tuples (state index, 'A' or 'V', label restricting the domain or None)
+    """
+    formula_duplicate = hyperproperty
+    state_quantifiers = []
+    while len(formula_duplicate.children) > 0:
+        if formula_duplicate.data in ['exist_scheduler', 'forall_scheduler']:
+            formula_duplicate = formula_duplicate.children[1]
+        elif formula_duplicate.data in ['exist_state', 'forall_state']:
+            domain = None
+            if len(formula_duplicate.children) == 3:
+                domain = formula_duplicate.children[1].value
+            quantifier = 'A' if formula_duplicate.data == 'forall_state' else 'V'
+            state_quantifiers.append((int(formula_duplicate.children[0].value[1:]), quantifier, domain))
+            formula_duplicate = formula_duplicate.children[-1]
+        elif formula_duplicate.data == 'quantifiedformulastate':
+            formula_duplicate = formula_duplicate.children[0]
+        else:
+            break
+    return state_quantifiers
+
+
+def untilBounds(formula):
+    """
+    :param formula: parse tree of a bounded until
+    :return: lower and upper bound of the until as integers
+    """
+    lower, upper = formula.children[1].value, formula.children[2].value
+    if re.fullmatch("[0-9]+", lower) is None or re.fullmatch("[0-9]+", upper) is None:
+        raise ValueError("The bounds of U[" + lower + ", " + upper + "] have to be non-negative integers.")
+    if int(lower) > int(upper):
+        raise ValueError("The lower bound of U[" + lower + ", " + upper + "] is greater than its upper bound.")
+    return int(lower), int(upper)
+
+
+def checkBounds(hyperproperty):
+    """
+    Check the bounds of all bounded untils in a property, the grammar accepts any number
+    """
+    for formula in hyperproperty.iter_subtrees():
+        if formula.data == 'until_bounded':
+            untilBounds(formula)
+
+
+def canonicalProperty(hyperproperty):
+    """
+    Writes a parsed property in a canonical form, so that properties differing only in whitespace, the names of
+    their variables or the notation of their constants are written the same: the scheduler is named sh, the state
+    and stutter variables s1, ..., sn and t1, ..., tm in order of quantification, and constants in decimal notation
+    without trailing zeros.
+    :param hyperproperty: parse tree of the property
+    :return: property as string
+    """
+    renaming = dict()  # dict[name of a variable] = canonical name
+    no_of_state = 0
+    no_of_stutter = 0
+    for node in hyperproperty.iter_subtrees_topdown():
+        if node.data in ['exist_scheduler', 'forall_scheduler']:
+            renaming[node.children[0].value] = 'sh'
+        elif node.data in ['exist_state', 'forall_state']:
+            no_of_state += 1
+            renaming[node.children[0].value] = 's' + str(no_of_state)
+        elif node.data in ['exist_stutter', 'forall_stutter']:
+            no_of_stutter += 1
+            renaming[node.children[0].value] = 't' + str(no_of_stutter)
+
+    def rename(formula):
+        children = []
+        for position, child in enumerate(formula.children):
+            if isinstance(child, Tree):
+                children.append(rename(child))
+            elif (position == 0 and formula.data in ['with', 'exist_scheduler', 'forall_scheduler', 'exist_state',
+                                                     'forall_state', 'exist_stutter', 'forall_stutter']):
+                children.append(child.update(value=renaming.get(child.value, child.value)))
+            elif formula.data in ['constant_probability', 'constant_reward']:
+                children.append(child.update(value=format(Decimal(child.value).normalize(), 'f')))
+            else:
+                children.append(child)
+        return Tree(formula.data, children)
+
+    return formulaToString(rename(hyperproperty))
+
+
+def stateVariableOrder(hyperproperty):
+    """
+    :param hyperproperty: parse tree of the property
+    :return: list of the indices of the state variables in order of quantification, e.g. [2, 1] for A s2 . E s1 ...;
+             the canonical form of the property names the variable at position k of this list s(k+1)
+    """
+    return [int(node.children[0].value[1:]) for node in hyperproperty.iter_subtrees_topdown()
+            if node.data in ['exist_state', 'forall_state']]
+
+
+def formulaToString(formula):
+    """
+    Writes a parsed (sub)formula in the syntax of the grammar
+    :param formula: parse tree of the formula
+    :return: formula as string
+    """
+    binary_operators = {'and': '&', 'or': '|', 'implies': '->', 'biconditional': '<->',
+                        'less_probability': '<', 'equal_probability': '=', 'greater_probability': '>',
+                        'greater_and_equal_probability': '>=', 'less_and_equal_probability': '<=',
+                        'less_reward': '<', 'equal_reward': '=', 'greater_reward': '>',
+                        'greater_and_equal_reward': '>=', 'less_and_equal_reward': '<='}
+    arithmetic_operators = {'add_probability': '+', 'subtract_probability': '-', 'multiply_probability': '.',
+                            'add_reward': '+', 'subtract_reward': '-', 'multiply_reward': '.'}
+    children = formula.children
+    if formula.data in ['exist_scheduler', 'forall_scheduler']:
+        quantifier = 'ES ' if formula.data == 'exist_scheduler' else 'AS '
+        return quantifier + children[0].value + " . " + formulaToString(children[1])
+    elif formula.data in ['exist_state', 'forall_state']:
+        quantifier = 'E ' if formula.data == 'exist_state' else 'A '
+        domain = "[" + children[1].value + "]" if len(children) == 3 else ""
+        return quantifier + children[0].value + domain + " . " + formulaToString(children[-1])
+    elif formula.data in ['exist_stutter', 'forall_stutter']:
+        quantifier = 'ET ' if formula.data == 'exist_stutter' else 'AT '
+        return quantifier + children[0].value + " (" + children[1].children[0].value + ") . " + \
+            formulaToString(children[2])
+    elif formula.data in ['quantifiedformulastate', 'quantifiedformulastutter']:
+        return formulaToString(children[0])
+    elif formula.data == 'atomic_proposition':
+        return children[0].children[0].value + "(" + children[1].children[0].value + ")"
+    elif formula.data in binary_operators:
+        return "(" + formulaToString(children[0]) + " " + binary_operators[formula.data] + " " + \
+            formulaToString(children[1]) + ")"
+    elif formula.data in arithmetic_operators:
+        return formulaToString(children[0]) + " " + arithmetic_operators[formula.data] + " " + \
+            formulaToString(children[1])
+    elif formula.data == 'not':
+        return "~(" + formulaToString(children[0]) + ")"
+    elif formula.data == 'true':
+        return "true"
+    elif formula.data in ['constant_probability', 'constant_reward']:
+        return children[0].value
+    elif formula.data == 'probability':
+        return "P" + formulaToString(children[0])
+    elif formula.data == 'reward':
+        return "R " + children[0].value + " " + formulaToString(children[1])
+    elif formula.data == 'next':
+        return "(X " + formulaToString(children[0]) + ")"
+    elif formula.data == 'until_unbounded':
+        return "(" + formulaToString(children[0]) + " U " + formulaToString(children[1]) + ")"
+    elif formula.data == 'until_bounded':
+        return "(" + formulaToString(children[0]) + " U[" + children[1].value + ", " + children[2].value + "] " + \
+            formulaToString(children[3]) + ")"
+    elif formula.data == 'future':
+        return "(F " + formulaToString(children[0]) + ")"
+    elif formula.data == 'global':
+        return "(G " + formulaToString(children[0]) + ")"
+    raise ValueError("Unexpected operator " + str(formula.data))
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import time
+
+from hyperprob import __version__
+from hyperprob.output import printWitness
+from hyperprob.propertyparser import canonicalProperty, stateVariableOrder
+from hyperprob.utility import common
+from hyperprob.witnesscache import DEFAULT_CACHE_DIRECTORY
+
+
+def hashFile(path):
+    """
+    :return: SHA-256 of the content of the file
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as model_file:
+        for block in iter(lambda: model_file.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def toCanonicalTuple(state_tuple, order):
+    """
+    :param state_tuple: states of s1, ..., sn of a property
+    :param order: indices of the state variables of the property in order of quantification, see stateVariableOrder
+    :return: states of the variables in order of quantification, i.e. of s1, ..., sn of the canonical property
+    """
+    return tuple(state_tuple[index - 1] for index in order)
+
+
+def fromCanonicalTuple(canonical_tuple, order):
+    """
+    Inverse of toCanonicalTuple
+    """
+    state_tuple = [None] * len(order)
+    for position, index in enumerate(order):
+        state_tuple[index - 1] = canonical_tuple[position]
+    return tuple(state_tuple)
+
+
+class ResultCache:
+    """
+    Stores the verdicts of model checking together with the witness, the timings and the z3 statistics, one file per
+    check. A check is identified by the content of the model file, the canonical form of the property, the parameters
+    that can change the verdict and the version of A-HyperProb, so a result is reused for the same model and property
+    however they are named or written, but never after the model has been edited. As the state variables are
+    renamed in order of quantification, the satisfying state tuples are stored in this order as well and put back into
+    the order of s1, ..., sn of the property they are loaded for.
+    Unlike a cached witness, which is only tried, a cached result is reported without model checking.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY):
+        self.directory = os.path.join(directory, 'results')
+
+    def key(self, model_path, hyperproperty, parameters):
+        """
+        :param hyperproperty: parse tree of the property
+        :param parameters: dict of the parameters of model checking, e.g. stutterLength and maxSchedProb
+        """
+        return {'model': hashFile(model_path), 'property': canonicalProperty(hyperproperty),
+                'parameters': parameters, 'version': __version__}
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest() +
+                            ".json")
+
+    def load(self, model_path, hyperproperty, parameters):
+        """
+        :return: dict with the verdict, witness and statistics of the check, None if it has not been cached or the
+                 file cannot be read
+        """
+        try:
+            key = self.key(model_path, hyperproperty, parameters)
+            with open(self.path(key)) as result_file:
+                result = json.load(result_file)
+        except (OSError, ValueError):
+            return None
+        if result.get('key') != key:
+            return None
+        if result.get('satisfying_tuples') is not None:
+            order = stateVariableOrder(hyperproperty)
+            result['satisfying_tuples'] = sorted(fromCanonicalTuple(canonical_tuple, order)
+                                                 for canonical_tuple in result['satisfying_tuples'])
+        return result
+
+    def store(self, model_path, hyperproperty, parameters, statistics, witness, satisfying_tuples):
+        """
+        Store the result of a check, if its verdict was decided exactly, by the solver or the interval pre-check
+        :param statistics: statistics of the ModelChecker, with the verdict, timings and z3 statistics
+        :param witness: dict of the variable names and values of the witness, None if the property does not hold
+        :param satisfying_tuples: set of the state tuples satisfying the non-quantified property, None if the property
+                                  does not hold
+        """
+        if statistics.get('verdict') not in ['holds', 'does not hold'] or \
+                statistics.get('decided_by') not in ['solver', 'pre-check']:
+            return
+        try:
+            key = self.key(model_path, hyperproperty, parameters)
+            order = stateVariableOrder(hyperproperty)
+            canonical_tuples = sorted(toCanonicalTuple(state_tuple, order) for state_tuple in satisfying_tuples) \
+                if satisfying_tuples is not None else None
+            result = {'key': key, 'checked': time.strftime("%Y-%m-%d %H:%M:%S"), 'verdict': statistics['verdict'],
+                      'witness': witness, 'satisfying_tuples': canonical_tuples,
+                      'statistics': statistics}
+            os.makedirs(self.directory, exist_ok=True)
+            # write to a temporary file first, so that concurrent runs never read half a result
+            temporary_path = self.path(key) + "." + str(os.getpid())
+            with open(temporary_path, 'w') as result_file:
+                json.dump(result, result_file, indent=1, default=str)
+            os.replace(temporary_path, self.path(key))
+        except (OSError, ValueError):
+            pass  # a result that cannot be stored is checked again on the next run
+
+
+def printCachedResult(result):
+    """
+    Print a cached result in the way the model checker prints its result
+    """
+    statistics = result['statistics']
+    common.colourinfo("Result cached on " + result['checked'] + " by A-HyperProb " + result['key']['version'] +
+                      ", use --noCache to check again", False)
+    if result['verdict'] == 'holds' and result['witness'] is None:
+        # decided by the pre-check, for every scheduler
+        common.colouroutput("The property HOLDS!")
+    elif result['verdict'] == 'holds':
+        witness = sorted(result['witness'].items())
+        holds = {tuple(state_tuple) for state_tuple in result.get('satisfying_tuples') or []}
+        printWitness([(name, value) for name, value in witness if name.startswith('a_')],
+                     [(name, value) for name, value in witness if name.startswith('t_')], holds)
+    else:
+        common.colourerror("The property DOES NOT hold!")
+    if statistics.get('approximation', 'none') != 'none':
+        common.colourinfo("The verdict is for the probabilities bounded to " +
+                          str(result['key']['parameters'].get('boundedHorizon')) + " steps (" +
+                          statistics['approximation'] + "-approximation)", False)
+    for name, description in [('encoding_time', "Time to encode"), ('smt_time', "Time required by z3"),
+                              ('search_time', "Time to sample schedulers")]:
+        if name in statistics:
+            common.colourinfo(description + " in seconds: " + str(round(statistics[name], 2)), False)
+    if 'z3_statistics' in statistics:
+        common.colourinfo("\nz3 statistics:", False)
+        common.colourinfo(statistics['z3_statistics'], False)
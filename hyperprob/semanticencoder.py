@@ -1,7 +1,40 @@
+import concurrent.futures
 import copy
 import itertools
+import operator
+
+from z3 import And, Bool, Real, Not, Or, Xor, RealVal, Solver, parse_smt2_string
+
+from hyperprob.encodingreport import EncodingReport
+from hyperprob.propertyparser import formulaToString, untilBounds
+from hyperprob.smtlibwriter import SmtLibTerms, SmtLibWriter, addVariable, noOfAssertions
+from hyperprob.termbuilder import TermBuilder
+from hyperprob.utility.graphs import stronglyConnectedComponents
+from hyperprob.utility.progress import Progress
+from hyperprob.utility.tracing import traced
+
+# operators relating a subformula in a composed state to its two operands in the same composed state
+CONNECTIVES = ['and', 'or', 'implies', 'biconditional']
+# comparisons of probabilities, the relation that holds and the one that holds otherwise
+COMPARISONS = {'less_probability': (operator.lt, operator.ge),
+               'less_and_equal_probability': (operator.le, operator.gt),
+               'equal_probability': (operator.eq, operator.ne),
+               'greater_and_equal_probability': (operator.ge, operator.lt),
+               'greater_probability': (operator.gt, operator.le)}
+ARITHMETIC = {'add_probability': operator.add,
+              'subtract_probability': operator.sub,
+              'multiply_probability': operator.mul}
+BINARY_OPERATORS = CONNECTIVES + list(COMPARISONS.keys()) + list(ARITHMETIC.keys())
+
+# temporal operators replaced by their bounded versions in the bounded horizon mode,
+# and whether the bounded probability is below ('under') or above ('over') the exact one
+BOUNDED_APPROXIMATION = {'until_unbounded': 'under', 'future': 'under', 'global': 'over'}
+
+# smallest number of composed states sent to a worker process at once
+MIN_STATES_PER_SHARD = 16
+
+worker_encoder = None  # encoder of a worker process encoding shards of composed states
 
-from z3 import And, Bool, Real, Not, Or, Xor, RealVal, Implies, Product, Sum
 
 def extendWithoutDuplicates(list1, list2):
     result = []
@@ -12,12 +45,104 @@ def extendWithoutDuplicates(list1, list2):
     return result
 
 
+def successorTable(model, lengthOfStutter):
+    """
+    Successors of each state with stuttering under each action, including the stutter step
+    :return: dict[str((state, stutter))][action] = list of (str((successor, stutter)), probability as string)
+    """
+    table = dict()
+    for state in model.getListOfStates():
+        for stutter in range(lengthOfStutter):
+            successors_by_action = dict()
+            for action in model.dict_of_acts[state]:
+                list_of_all_succ = []
+                for s in model.dict_of_acts_tran[str(state) + " " + str(action)]:
+                    space = s.find(' ')
+                    list_of_all_succ.append((str((int(s[0:space]), 0)), s[space + 1:]))
+                if stutter < lengthOfStutter - 1:
+                    list_of_all_succ.append((str((state, stutter + 1)), str(1)))
+                successors_by_action[action] = list_of_all_succ
+            table[str((state, stutter))] = successors_by_action
+    return table
+
+
+def stutterComponents(successor_table):
+    """
+    Strongly connected components of the graph of states with stuttering, with the edges of genSucc for all actions.
+    A composed state lies on a cycle iff each of its states does, since the cycles of the states can be repeated
+    until they have the same length.
+    :param successor_table: see successorTable
+    :return: dict[str((state, stutter))] = number of its component, set of str((state, stutter)) lying on a cycle
+    """
+    def successors(node):
+        return [succ for list_of_all_succ in successor_table[node].values() for succ, _ in list_of_all_succ]
+
+    return stronglyConnectedComponents(list(successor_table.keys()), successors)
+
+
+def guarded(terms, conditions, assertion):
+    """
+    :param terms: TermBuilder or SmtLibTerms building the terms
+    :param conditions: list of conditions, the assertion holds unconditionally if it is empty
+    """
+    if len(conditions) == 0:
+        return assertion
+    return terms.implies(terms.conjunction(conditions) if len(conditions) > 1 else conditions[0], assertion)
+
+
+def describeSubformula(hyperproperty, *args):
+    return "(" + str(hyperproperty.data) + ")", {'subformula': formulaToString(hyperproperty)}
+
+
+class VariableDict(dict):
+    """
+    Variables of a worker process. A worker does not know the variables of the scheduler and the stutter-schedulers,
+    so variables are created when they are first used.
+    """
+
+    def __init__(self, sort):
+        super().__init__()
+        self.sort = sort
+
+    def __missing__(self, name):
+        variable = self.sort(name)
+        self[name] = variable
+        return variable
+
+
+def initialiseEncodingWorker(model, no_of_stutter_quantifier, lengthOfStutter):
+    global worker_encoder
+    worker_encoder = SemanticsEncoder(model, None, [], VariableDict(Real), VariableDict(Bool), 0, 0,
+                                      no_of_stutter_quantifier, lengthOfStutter, None, dict())
+
+
+def encodeShard(method_name, shard, arguments):
+    """
+    Encode a shard of composed states in a worker process, in the Z3 context of the worker.
+    Variable names only depend on the composed states, so they agree with those of the main process.
+    :param method_name: method of the encoder returning the assertions for a single composed state
+    :param shard: list of composed states
+    :param arguments: further arguments of the method
+    :return: names of the variables used, number of subformulas encoded, assertions in SMT-LIB format
+    """
+    worker_encoder.dictOfReals.clear()
+    worker_encoder.dictOfBools.clear()
+    worker_encoder.no_of_subformula = 0
+    encode_state = getattr(worker_encoder, method_name)
+    solver = Solver()
+    for r_state in shard:
+        solver.add(encode_state(r_state, *arguments))
+    names = list(worker_encoder.dictOfReals.keys()) + list(worker_encoder.dictOfBools.keys())
+    return names, worker_encoder.no_of_subformula, solver.sexpr()
+
+
 class SemanticsEncoder:
 
     def __init__(self, model,
                  solver, list_of_subformula, dictOfReals, dictOfBools,
                  no_of_subformula, no_of_state_quantifier, no_of_stutter_quantifier, lengthOfStutter,
-                 stutter_state_mapping):
+                 stutter_state_mapping, reachable_states=None, workers=1, bounded_horizon=None,
+                 probability_bounds=None, progress=None, encoding_report=None):
         self.model = model
         self.solver = solver
         self.list_of_subformula = list_of_subformula
@@ -28,14 +153,45 @@ class SemanticsEncoder:
         self.no_of_stutter_quantifier = no_of_stutter_quantifier
         self.stutterLength = lengthOfStutter  # default value 1 (no stutter)
         self.stutter_state_mapping = stutter_state_mapping
-
+        # states to consider for each stutter quantifier, dict[stutter quantifier] = list of states
+        if reachable_states is None:
+            reachable_states = {quant: model.getListOfStates() for quant in range(1, no_of_stutter_quantifier + 1)}
+        self.reachable_states = reachable_states
+        # subformulas encoded so far and their relevant quantifiers, dict[index of subformula] = list of quantifiers
+        self.encoded_subformulas = dict()
+        self.workers = workers  # number of processes encoding the composed states
+        self.executor = None
+        # number of steps the unbounded temporal operators are bounded to, None to encode them exactly
+        self.bounded_horizon = bounded_horizon
+        self.successor_table = None  # see successorTable, computed when first needed
+        self.components = None  # strongly connected components of the states with stuttering, see stutterComponents
+        self.composed_states = dict()  # dict[frozenset of relevant quantifiers] = list of composed states
+        self.probability_bounds = probability_bounds  # ProbabilityBounds asserted on the probabilities, None if not
+        # builds the terms of the temporal operators, as text if the encoding is written to an SMT-LIB file
+        self.terms = SmtLibTerms() if isinstance(solver, SmtLibWriter) else TermBuilder()
+        self.progress = progress if progress is not None else Progress()  # Progress of the temporal encoders
+        # EncodingReport recording a row per subformula, if enabled
+        self.encoding_report = encoding_report if encoding_report is not None else EncodingReport(self)
+
+    @traced(describeSubformula)
     def encodeSemantics(self, hyperproperty, prev_relevant_quantifier=[]):
         """
-        Main method for semantic encoding
+        Main method for semantic encoding. Each subformula is only encoded once,
+        also if it occurs several times or in several properties encoded by this encoder.
         :param hyperproperty: non-quantified A-HyperProb property
         :param prev_relevant_quantifier: previously relevant quantifiers
         :return: relevant_quantifier: list of quantifiers relevant for the the hyperproperty
         """
+        if len(prev_relevant_quantifier) > 0:
+            return self.encodeSubformula(hyperproperty, prev_relevant_quantifier)
+        index_of_phi = self.list_of_subformula.index(hyperproperty)
+        if index_of_phi not in self.encoded_subformulas:
+            with self.encoding_report.subformula(index_of_phi, hyperproperty):
+                self.encoded_subformulas[index_of_phi] = self.encodeSubformula(hyperproperty)
+        relevant_quantifier = self.encoded_subformulas[index_of_phi]
+        return list(relevant_quantifier) if relevant_quantifier is not None else None
+
+    def encodeSubformula(self, hyperproperty, prev_relevant_quantifier=[]):
         relevant_quantifier = []
         if len(prev_relevant_quantifier) > 0:
             relevant_quantifier.extend(prev_relevant_quantifier)
@@ -86,89 +242,7 @@ class SemanticsEncoder:
             and_for_no.clear()
             return relevant_quantifier
 
-        elif hyperproperty.data == 'and':
-            rel_quant1 = self.encodeSemantics(hyperproperty.children[0])
-            rel_quant2 = self.encodeSemantics(hyperproperty.children[1])
-            relevant_quantifier = extendWithoutDuplicates(rel_quant1, rel_quant2)
-            index_of_phi = self.list_of_subformula.index(hyperproperty)
-            index_of_phi1 = self.list_of_subformula.index(hyperproperty.children[0])
-            index_of_phi2 = self.list_of_subformula.index(hyperproperty.children[1])
-            combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
-            for r_state in combined_state_list:
-                name1 = 'holds'
-                for tup in r_state:
-                    name1 += "_" + str(tup)
-                name1 += '_' + str(index_of_phi)
-                self.addToVariableList(name1)
-                name2 = 'holds'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant1:
-                        name2 += "_" + str(r_state[ind])
-                    else:
-                        name2 += "_" + str((0, 0))
-                name2 += '_' + str(index_of_phi1)
-                self.addToVariableList(name2)
-                name3 = 'holds'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant2:
-                        name3 += "_" + str(r_state[ind])
-                    else:
-                        name3 += "_" + str((0, 0))
-                name3 += '_' + str(index_of_phi2)
-                self.addToVariableList(name3)
-                first_and = And(self.dictOfBools[name1],
-                                self.dictOfBools[name2],
-                                self.dictOfBools[name3])
-                self.no_of_subformula += 1
-                second_and = And(Not(self.dictOfBools[name1]),
-                                 Or(Not(self.dictOfBools[name2]),
-                                    Not(self.dictOfBools[name3])))
-                self.no_of_subformula += 1
-                self.solver.add(Or(first_and, second_and))
-                self.no_of_subformula += 1
-            return relevant_quantifier
-        elif hyperproperty.data == 'or':
-            rel_quant1 = self.encodeSemantics(hyperproperty.children[0])
-            rel_quant2 = self.encodeSemantics(hyperproperty.children[1])
-            relevant_quantifier = extendWithoutDuplicates(rel_quant1, rel_quant2)
-            index_of_phi = self.list_of_subformula.index(hyperproperty)
-            index_of_phi1 = self.list_of_subformula.index(hyperproperty.children[0])
-            index_of_phi2 = self.list_of_subformula.index(hyperproperty.children[1])
-            combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
-            for r_state in combined_state_list:
-                name1 = 'holds'
-                for tup in r_state:
-                    name1 += "_" + str(tup)
-                name1 += '_' + str(index_of_phi)
-                self.addToVariableList(name1)
-                name2 = 'holds'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant1:
-                        name2 += "_" + str(r_state[ind])
-                    else:
-                        name2 += "_" + str((0, 0))
-                name2 += '_' + str(index_of_phi1)
-                self.addToVariableList(name2)
-                name3 = 'holds'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant2:
-                        name3 += "_" + str(r_state[ind])
-                    else:
-                        name3 += "_" + str((0, 0))
-                name3 += '_' + str(index_of_phi2)
-                self.addToVariableList(name3)
-                first_and = And(self.dictOfBools[name1],
-                                Or(self.dictOfBools[name2],
-                                   self.dictOfBools[name3]))
-                self.no_of_subformula += 1
-                second_and = And(Not(self.dictOfBools[name1]),
-                                 And(Not(self.dictOfBools[name2]),
-                                     Not(self.dictOfBools[name3])))
-                self.no_of_subformula += 1
-                self.solver.add(Or(first_and, second_and))
-                self.no_of_subformula += 1
-            return relevant_quantifier
-        elif hyperproperty.data == 'implies':
+        elif hyperproperty.data in BINARY_OPERATORS:
             rel_quant1 = self.encodeSemantics(hyperproperty.children[0])
             rel_quant2 = self.encodeSemantics(hyperproperty.children[1])
             relevant_quantifier = extendWithoutDuplicates(rel_quant1, rel_quant2)
@@ -176,111 +250,27 @@ class SemanticsEncoder:
             index_of_phi1 = self.list_of_subformula.index(hyperproperty.children[0])
             index_of_phi2 = self.list_of_subformula.index(hyperproperty.children[1])
             combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
-            for r_state in combined_state_list:
-                name1 = 'holds'
-                for tup in r_state:
-                    name1 += "_" + str(tup)
-                name1 += '_' + str(index_of_phi)
-                self.addToVariableList(name1)
-                name2 = 'holds'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant1:
-                        name2 += "_" + str(r_state[ind])
-                    else:
-                        name2 += "_" + str((0, 0))
-                name2 += '_' + str(index_of_phi1)
-                self.addToVariableList(name2)
-                name3 = 'holds'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant2:
-                        name3 += "_" + str(r_state[ind])
-                    else:
-                        name3 += "_" + str((0, 0))
-                name3 += '_' + str(index_of_phi2)
-                self.addToVariableList(name3)
-                first_and = And(self.dictOfBools[name1],
-                                Or(Not(self.dictOfBools[name2]),
-                                   self.dictOfBools[name3]))
-                self.no_of_subformula += 1
-                second_and = And(Not(self.dictOfBools[name1]),
-                                 And(self.dictOfBools[name2],
-                                     Not(self.dictOfBools[name3])))
-                self.no_of_subformula += 1
-                self.solver.add(Or(first_and, second_and))
-                self.no_of_subformula += 1
-            return relevant_quantifier
-        elif hyperproperty.data == 'biconditional':
-            rel_quant1 = self.encodeSemantics(hyperproperty.children[0])
-            rel_quant2 = self.encodeSemantics(hyperproperty.children[1])
-            relevant_quantifier = extendWithoutDuplicates(rel_quant1, rel_quant2)
-            index_of_phi = self.list_of_subformula.index(hyperproperty)
-            index_of_phi1 = self.list_of_subformula.index(hyperproperty.children[0])
-            index_of_phi2 = self.list_of_subformula.index(hyperproperty.children[1])
-            combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
-            for r_state in combined_state_list:
-                name1 = 'holds'
-                for tup in r_state:
-                    name1 += "_" + str(tup)
-                name1 += '_' + str(index_of_phi)
-                self.addToVariableList(name1)
-                name2 = 'holds'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant1:
-                        name2 += "_" + str(r_state[ind])
-                    else:
-                        name2 += "_" + str((0, 0))
-                name2 += '_' + str(index_of_phi1)
-                self.addToVariableList(name2)
-                name3 = 'holds'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant2:
-                        name3 += "_" + str(r_state[ind])
-                    else:
-                        name3 += "_" + str((0, 0))
-                name3 += '_' + str(index_of_phi2)
-                self.addToVariableList(name3)
-                first_and = And(self.dictOfBools[name1],
-                                Or(
-                                    And(self.dictOfBools[name2],
-                                        self.dictOfBools[name3]),
-                                    And(Not(self.dictOfBools[name2]),
-                                        Not(self.dictOfBools[name3]))))
-                self.no_of_subformula += 1
-                second_and = And(Not(self.dictOfBools[name1]),
-                                 Or(
-                                     And(Not(self.dictOfBools[name2]),
-                                         self.dictOfBools[name3]),
-                                     And(self.dictOfBools[name2],
-                                         Not(self.dictOfBools[name3]))))
-                self.no_of_subformula += 1
-                self.solver.add(Or(first_and, second_and))
-                self.no_of_subformula += 1
+            self.encodeStates('encodeBinaryState', combined_state_list,
+                              (hyperproperty.data, rel_quant1, rel_quant2, index_of_phi, index_of_phi1, index_of_phi2))
+            if hyperproperty.data in ARITHMETIC.keys():
+                self.boundProbabilities(hyperproperty, relevant_quantifier)
             return relevant_quantifier
         elif hyperproperty.data == 'not':
             relevant_quantifier = extendWithoutDuplicates(relevant_quantifier,
                                                           self.encodeSemantics(hyperproperty.children[0]))
             index_of_phi = self.list_of_subformula.index(hyperproperty)
             index_of_phi1 = self.list_of_subformula.index(hyperproperty.children[0])
-
             combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
-            for r_state in combined_state_list:
-                name1 = 'holds'
-                for tup in r_state:
-                    name1 += "_" + str(tup)
-                name1 += '_' + str(index_of_phi)
-                self.addToVariableList(name1)
-                name2 = 'holds'
-                for ind in r_state:
-                    name2 += "_" + str(ind)
-                name2 += '_' + str(index_of_phi1)
-                self.addToVariableList(name2)
-                self.solver.add(Xor(self.dictOfBools[name1],
-                                    self.dictOfBools[name2]))
-                self.no_of_subformula += 1
+            self.encodeStates('encodeNotState', combined_state_list, (index_of_phi, index_of_phi1))
             return relevant_quantifier
         elif hyperproperty.data == 'probability':
             child = hyperproperty.children[0]
-            if child.data == 'next':
+            if child.data == 'until_bounded' or (self.bounded_horizon is not None and
+                                                 child.data in BOUNDED_APPROXIMATION.keys()):
+                relevant_quantifier = extendWithoutDuplicates(relevant_quantifier,
+                                                              self.encodeBoundedSemantics(hyperproperty,
+                                                                                          relevant_quantifier))
+            elif child.data == 'next':
                 relevant_quantifier = extendWithoutDuplicates(relevant_quantifier,
                                                               self.encodeNextSemantics(hyperproperty,
                                                                                        relevant_quantifier))
@@ -288,10 +278,6 @@ class SemanticsEncoder:
                 relevant_quantifier = extendWithoutDuplicates(relevant_quantifier,
                                                               self.encodeUnboundedUntilSemantics(hyperproperty,
                                                                                                  relevant_quantifier))
-            elif child.data == 'until_bounded':
-                relevant_quantifier = extendWithoutDuplicates(relevant_quantifier,
-                                                              self.encodeBoundedUntilSemantics(hyperproperty,
-                                                                                               relevant_quantifier)[0])
             elif child.data == 'future':
                 relevant_quantifier = extendWithoutDuplicates(relevant_quantifier,
                                                               self.encodeFutureSemantics(hyperproperty,
@@ -300,201 +286,9 @@ class SemanticsEncoder:
                 relevant_quantifier = extendWithoutDuplicates(relevant_quantifier,
                                                               self.encodeGlobalSemantics(hyperproperty,
                                                                                          relevant_quantifier))
+            self.boundProbabilities(hyperproperty, relevant_quantifier)
             return relevant_quantifier
 
-        elif hyperproperty.data == 'less_probability':
-            rel_quant1 = self.encodeSemantics(hyperproperty.children[0])
-            rel_quant2 = self.encodeSemantics(hyperproperty.children[1])
-            relevant_quantifier = extendWithoutDuplicates(rel_quant1, rel_quant2)
-            index_of_phi = self.list_of_subformula.index(hyperproperty)
-            index_of_phi1 = self.list_of_subformula.index(hyperproperty.children[0])
-            index_of_phi2 = self.list_of_subformula.index(hyperproperty.children[1])
-            combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
-            for r_state in combined_state_list:
-                name1 = 'holds'
-                for tup in r_state:
-                    name1 += "_" + str(tup)
-                name1 += '_' + str(index_of_phi)
-                self.addToVariableList(name1)
-                name2 = 'prob'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant1:
-                        name2 += "_" + str(r_state[ind])
-                    else:
-                        name2 += "_" + str((0, 0))
-                name2 += '_' + str(index_of_phi1)
-                self.addToVariableList(name2)
-                name3 = 'prob'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant2:
-                        name3 += "_" + str(r_state[ind])
-                    else:
-                        name3 += "_" + str((0, 0))
-                name3 += '_' + str(index_of_phi2)
-                self.addToVariableList(name3)
-                and_eq = And(self.dictOfBools[name1],
-                             self.dictOfReals[name2] < self.dictOfReals[name3])
-                self.no_of_subformula += 1
-                and_not_eq = And(Not(self.dictOfBools[name1]),
-                                 self.dictOfReals[name2] >= self.dictOfReals[name3])
-                self.no_of_subformula += 1
-                self.solver.add(Or(and_eq, and_not_eq))
-                self.no_of_subformula += 1
-            return relevant_quantifier
-        elif hyperproperty.data == 'equal_probability':
-            rel_quant1 = self.encodeSemantics(hyperproperty.children[0])
-            rel_quant2 = self.encodeSemantics(hyperproperty.children[1])
-            relevant_quantifier = extendWithoutDuplicates(rel_quant1, rel_quant2)
-            index_of_phi = self.list_of_subformula.index(hyperproperty)
-            index_of_phi1 = self.list_of_subformula.index(hyperproperty.children[0])
-            index_of_phi2 = self.list_of_subformula.index(hyperproperty.children[1])
-            combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
-            for r_state in combined_state_list:
-                name1 = 'holds'
-                for tup in r_state:
-                    name1 += "_" + str(tup)
-                name1 += '_' + str(index_of_phi)
-                self.addToVariableList(name1)
-                name2 = 'prob'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant1:
-                        name2 += "_" + str(r_state[ind])
-                    else:
-                        name2 += "_" + str((0, 0))
-                name2 += '_' + str(index_of_phi1)
-                name3 = 'prob'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant2:
-                        name3 += "_" + str(r_state[ind])
-                    else:
-                        name3 += "_" + str((0, 0))
-                name3 += '_' + str(index_of_phi2)
-                and_eq = And(self.dictOfBools[name1],
-                             self.dictOfReals[name2] == self.dictOfReals[name3])
-                self.no_of_subformula += 1
-                and_not_eq = And(Not(self.dictOfBools[name1]),
-                                 self.dictOfReals[name2] != self.dictOfReals[name3])
-                self.no_of_subformula += 1
-                self.solver.add(Or(and_eq, and_not_eq))
-                self.no_of_subformula += 1
-            return relevant_quantifier
-        elif hyperproperty.data == 'greater_probability':
-            rel_quant1 = self.encodeSemantics(hyperproperty.children[0])
-            rel_quant2 = self.encodeSemantics(hyperproperty.children[1])
-            relevant_quantifier = extendWithoutDuplicates(rel_quant1, rel_quant2)
-            index_of_phi = self.list_of_subformula.index(hyperproperty)
-            index_of_phi1 = self.list_of_subformula.index(hyperproperty.children[0])
-            index_of_phi2 = self.list_of_subformula.index(hyperproperty.children[1])
-            combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
-            for r_state in combined_state_list:
-                name1 = 'holds'
-                for tup in r_state:
-                    name1 += "_" + str(tup)
-                name1 += '_' + str(index_of_phi)
-                self.addToVariableList(name1)
-                name2 = 'prob'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant1:
-                        name2 += "_" + str(r_state[ind])
-                    else:
-                        name2 += "_" + str((0, 0))
-                name2 += '_' + str(index_of_phi1)
-                self.addToVariableList(name2)
-                name3 = 'prob'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant2:
-                        name3 += "_" + str(r_state[ind])
-                    else:
-                        name3 += "_" + str((0, 0))
-                name3 += '_' + str(index_of_phi2)
-                self.addToVariableList(name3)
-                and_eq = And(self.dictOfBools[name1],
-                             self.dictOfReals[name2] > self.dictOfReals[name3])
-                self.no_of_subformula += 1
-                and_not_eq = And(Not(self.dictOfBools[name1]),
-                                 self.dictOfReals[name2] <= self.dictOfReals[name3])
-                self.no_of_subformula += 1
-                self.solver.add(Or(and_eq, and_not_eq))
-                self.no_of_subformula += 1
-            return relevant_quantifier
-        elif hyperproperty.data == 'greater_and_equal_probability':
-            rel_quant1 = self.encodeSemantics(hyperproperty.children[0])
-            rel_quant2 = self.encodeSemantics(hyperproperty.children[1])
-            relevant_quantifier = extendWithoutDuplicates(rel_quant1, rel_quant2)
-            index_of_phi = self.list_of_subformula.index(hyperproperty)
-            index_of_phi1 = self.list_of_subformula.index(hyperproperty.children[0])
-            index_of_phi2 = self.list_of_subformula.index(hyperproperty.children[1])
-            combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
-            for r_state in combined_state_list:
-                name1 = 'holds'
-                for tup in r_state:
-                    name1 += "_" + str(tup)
-                name1 += '_' + str(index_of_phi)
-                self.addToVariableList(name1)
-                name2 = 'prob'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant1:
-                        name2 += "_" + str(r_state[ind])
-                    else:
-                        name2 += "_" + str((0, 0))
-                name2 += '_' + str(index_of_phi1)
-                self.addToVariableList(name2)
-                name3 = 'prob'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant2:
-                        name3 += "_" + str(r_state[ind])
-                    else:
-                        name3 += "_" + str((0, 0))
-                name3 += '_' + str(index_of_phi2)
-                self.addToVariableList(name3)
-                and_eq = And(self.dictOfBools[name1],
-                             self.dictOfReals[name2] >= self.dictOfReals[name3])
-                self.no_of_subformula += 1
-                and_not_eq = And(Not(self.dictOfBools[name1]),
-                                 self.dictOfReals[name2] < self.dictOfReals[name3])
-                self.no_of_subformula += 1
-                self.solver.add(Or(and_eq, and_not_eq))
-                self.no_of_subformula += 1
-            return relevant_quantifier
-        elif hyperproperty.data == 'less_and_equal_probability':
-            rel_quant1 = self.encodeSemantics(hyperproperty.children[0])
-            rel_quant2 = self.encodeSemantics(hyperproperty.children[1])
-            relevant_quantifier = extendWithoutDuplicates(rel_quant1, rel_quant2)
-            index_of_phi = self.list_of_subformula.index(hyperproperty)
-            index_of_phi1 = self.list_of_subformula.index(hyperproperty.children[0])
-            index_of_phi2 = self.list_of_subformula.index(hyperproperty.children[1])
-            combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
-            for r_state in combined_state_list:
-                name1 = 'holds'
-                for tup in r_state:
-                    name1 += "_" + str(tup)
-                name1 += '_' + str(index_of_phi)
-                self.addToVariableList(name1)
-                name2 = 'prob'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant1:
-                        name2 += "_" + str(r_state[ind])
-                    else:
-                        name2 += "_" + str((0, 0))
-                name2 += '_' + str(index_of_phi1)
-                self.addToVariableList(name2)
-                name3 = 'prob'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant2:
-                        name3 += "_" + str(r_state[ind])
-                    else:
-                        name3 += "_" + str((0, 0))
-                name3 += '_' + str(index_of_phi2)
-                self.addToVariableList(name3)
-                and_eq = And(self.dictOfBools[name1],
-                             self.dictOfReals[name2] <= self.dictOfReals[name3])
-                self.no_of_subformula += 1
-                and_not_eq = And(Not(self.dictOfBools[name1]),
-                                 self.dictOfReals[name2] > self.dictOfReals[name3])
-                self.no_of_subformula += 1
-                self.solver.add(Or(and_eq, and_not_eq))
-                self.no_of_subformula += 1
-            return relevant_quantifier
         elif hyperproperty.data == 'constant_probability':
             constant = RealVal(hyperproperty.children[0].value) #.as_fraction().limit_denominator(10000)
             index_of_phi = self.list_of_subformula.index(hyperproperty)
@@ -508,75 +302,68 @@ class SemanticsEncoder:
             self.no_of_subformula += 1
             return relevant_quantifier
 
-        elif hyperproperty.data in ['add_probability', 'subtract_probability', 'multiply_probability']:
-            rel_quant1 = self.encodeSemantics(hyperproperty.children[0])
-            rel_quant2 = self.encodeSemantics(hyperproperty.children[1])
-            relevant_quantifier = extendWithoutDuplicates(rel_quant1, rel_quant2)
-            index_of_phi = self.list_of_subformula.index(hyperproperty)
-            index_left = self.list_of_subformula.index(hyperproperty.children[0])
-            index_right = self.list_of_subformula.index(hyperproperty.children[1])
-            combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
-            for r_state in combined_state_list:
-                name1 = 'prob'
-                for tup in r_state:
-                    name1 += "_" + str(tup)
-                name1 += '_' + str(index_of_phi)
-                self.addToVariableList(name1)
-                name2 = 'prob'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant1:
-                        name2 += "_" + str(r_state[ind])
-                    else:
-                        name2 += "_" + str((0, 0))
-                name2 += '_' + str(index_left)
-                self.addToVariableList(name2)
-                name3 = 'prob'
-                for ind in range(0, len(r_state)):
-                    if (ind + 1) in rel_quant2:
-                        name3 += "_" + str(r_state[ind])
-                    else:
-                        name3 += "_" + str((0, 0))
-                name3 += '_' + str(index_right)
-                self.addToVariableList(name3)
-                if hyperproperty.data == 'add_probability':
-                    self.solver.add(self.dictOfReals[name1] == (
-                            self.dictOfReals[name2] + self.dictOfReals[name3]))
-                    self.no_of_subformula += 2
-                elif hyperproperty.data == 'subtract_probability':
-                    self.solver.add(self.dictOfReals[name1] == (
-                            self.dictOfReals[name2] - self.dictOfReals[name3]))
-                    self.no_of_subformula += 2
-                elif hyperproperty.data == 'multiply_probability':
-                    self.solver.add(self.dictOfReals[name1] == (
-                            self.dictOfReals[name2] * self.dictOfReals[name3]))
-                    self.no_of_subformula += 2
-                else:
-                    print("Unexpected operator. Exiting")
-                    return -1
-            return relevant_quantifier
 
         else:
             self.encodeSemantics(hyperproperty.children[0])
 
+    def boundProbabilities(self, hyperproperty, relevant_quantifier):
+        """
+        Assert the intervals of probability_bounds on the probabilities of the subformula in all composed states.
+        The probabilities are approximated in the bounded horizon mode, so no intervals are asserted there.
+        """
+        if self.probability_bounds is None or self.bounded_horizon is not None:
+            return
+        intervals = self.probability_bounds.intervals(hyperproperty)
+        if intervals is None:
+            return
+        quantifiers, interval = intervals
+        index_of_phi = self.list_of_subformula.index(hyperproperty)
+        lemmas = []
+        for r_state in self.generateComposedStatesWithStutter(relevant_quantifier):
+            lower, upper = interval(tuple(r_state[quant - 1][0] for quant in quantifiers))
+            if lower <= 0 and upper >= 1:
+                continue
+            prob_phi = self.dictOfReals[self.composedName('prob', r_state, index_of_phi)]
+            lemmas.append(And(prob_phi >= RealVal(lower), prob_phi <= RealVal(upper)))
+        self.solver.add(lemmas)
+        self.no_of_subformula += len(lemmas)
+
+    def traceCounters(self):
+        return {'variables': len(self.dictOfReals) + len(self.dictOfBools),
+                'assertions': noOfAssertions(self.solver)}
+
     def addToVariableList(self, name):
         if name[0] == 'h' and not name.startswith('holdsToInt'):  # and name not in self.dictOfBools.keys():
-            self.dictOfBools[name] = Bool(name)
-        elif (name[0] in ['p', 'd', 'r', 'a', 't'] or name.startswith('holdsToInt')):  # and name not in self.dictOfReals.keys():
-            self.dictOfReals[name] = Real(name)
+            addVariable(self.dictOfBools, name, Bool)
+        elif (name[0] in ['p', 'd', 'r', 'a', 't'] or name.startswith(('holdsToInt', 'stepProb'))):  # and name not in self.dictOfReals.keys():
+            addVariable(self.dictOfReals, name, Real)
+
+    def realTerm(self, name):
+        """
+        :return: variable of the name for the terms built by self.terms
+        """
+        return self.terms.variable(self.dictOfReals, name)
+
+    def boolTerm(self, name):
+        return self.terms.variable(self.dictOfBools, name)
 
     def generateComposedStatesWithStutter(self, list_of_relevant_quantifier):
         """
-        Generates combination of states with stuttering based on relevant quantifiers
+        Generates combination of states with stuttering based on relevant quantifiers.
+        The list is shared by all subformulas with the same relevant quantifiers and must not be modified.
         :param list_of_relevant_quantifier: ranges from value 1- (no. of quantifiers)
         :return: list of composed states.
         """
-        states_with_stuttering = list(
-            itertools.product(self.model.getListOfStates(), list(range(self.stutterLength))))
+        key = frozenset(list_of_relevant_quantifier)
+        if key not in self.composed_states:
+            self.composed_states[key] = self.composeStatesWithStutter(key)
+        return self.composed_states[key]
 
+    def composeStatesWithStutter(self, list_of_relevant_quantifier):
         stored_list = []
         for quant in range(1, self.no_of_stutter_quantifier + 1):
             if quant in list_of_relevant_quantifier:
-                stored_list.append(states_with_stuttering)
+                stored_list.append(list(itertools.product(self.reachable_states[quant], range(self.stutterLength))))
             else:
                 stored_list.append([(0, 0)])
         return list(itertools.product(*stored_list))
@@ -590,7 +377,7 @@ class SemanticsEncoder:
         stored_list = []
         for quant in range(1, self.no_of_stutter_quantifier + 1):
             if quant in list_of_relevant_quantifier:
-                stored_list.append(self.model.getListOfStates())
+                stored_list.append(self.reachable_states[quant])
             else:
                 stored_list.append([0])
         return list(itertools.product(*stored_list))
@@ -603,21 +390,183 @@ class SemanticsEncoder:
         :param relevant_quantifier: list of relevant stutter quantifiers
         :return: list with entries ["successor state", "probability of reaching that state"]
         """
+        successor_table = self.getSuccessorTable()
         dicts = []
         for l in range(len(relevant_quantifier)):
-            succ = self.model.dict_of_acts_tran[str(r_state[relevant_quantifier[l] - 1][0]) + " " + str(ca[l])]
-            list_of_all_succ = []
-            for s in succ:
-                space = s.find(' ')
-                succ_state = (int(s[0:space]), 0)
-                list_of_all_succ.append((str(succ_state), s[space + 1:]))
-            if r_state[relevant_quantifier[l]-1][1] < self.stutterLength - 1:
-                list_of_all_succ.append((str((r_state[relevant_quantifier[l] - 1][0],
-                                          r_state[relevant_quantifier[l] - 1][1] + 1)),
-                                         str(1)))
-            dicts.append(list_of_all_succ)
+            dicts.append(successor_table[str(r_state[relevant_quantifier[l] - 1])][ca[l]])
         return list(itertools.product(*dicts))
 
+    def getSuccessorTable(self):
+        if self.successor_table is None:
+            self.successor_table = successorTable(self.model, self.stutterLength)
+        return self.successor_table
+
+
+    def composedName(self, prefix, r_state, index_of_phi, relevant_quantifier=None):
+        """
+        Name of the variable of a subformula in a composed state
+        :param relevant_quantifier: quantifiers relevant for the subformula, the others are named with (0, 0);
+                                    None if all quantifiers are relevant
+        """
+        name = prefix
+        for ind in range(0, len(r_state)):
+            if relevant_quantifier is None or (ind + 1) in relevant_quantifier:
+                name += "_" + str(r_state[ind])
+            else:
+                name += "_" + str((0, 0))
+        return name + "_" + str(index_of_phi)
+
+    def onCycle(self, r_state, relevant_quantifier):
+        """
+        Whether the composed state lies on a cycle. Otherwise its probabilities are determined by those of its
+        successors, and the temporal operators need no loop condition.
+        """
+        if self.components is None:
+            self.components = stutterComponents(self.getSuccessorTable())
+        return all(str(r_state[quant - 1]) in self.components[1] for quant in relevant_quantifier)
+
+    def leavesComponent(self, r_state, cs, relevant_quantifier):
+        """
+        Whether the successor cs cannot reach r_state again. Its probabilities are determined before those of the
+        component of r_state, so the loop condition treats it like a state satisfying the target.
+        """
+        return any(self.components[0][str(r_state[relevant_quantifier[l] - 1])] != self.components[0][cs[l][0]]
+                   for l in range(len(relevant_quantifier)))
+
+    def encodeStates(self, method_name, combined_state_list, arguments, show_progress=False):
+        """
+        Add the assertions of all composed states to the solver.
+        With several workers, the composed states are sharded across worker processes, which encode them
+        in their own Z3 contexts; the assertions are merged into the solver in the order of the composed states.
+        :param method_name: method returning the assertions for a single composed state
+        :param combined_state_list: list of composed states
+        :param arguments: further arguments of the method
+        :param show_progress: report the composed states encoded to self.progress, as a phase named after the method
+        """
+        if show_progress:
+            self.progress.begin(method_name, len(combined_state_list))
+        if self.workers > 1 and len(combined_state_list) >= 2 * MIN_STATES_PER_SHARD:
+            size_of_shard = max(MIN_STATES_PER_SHARD, -(-len(combined_state_list) // (4 * self.workers)))
+            shards = [combined_state_list[start:start + size_of_shard]
+                      for start in range(0, len(combined_state_list), size_of_shard)]
+            results = self.getExecutor().map(encodeShard, itertools.repeat(method_name), shards,
+                                             itertools.repeat(arguments))
+            for shard, (names, no_of_subformula, assertions) in zip(shards, results):
+                if show_progress:
+                    self.progress.advance(len(shard), assertions.count("(assert "))
+                for name in names:
+                    if name not in self.dictOfReals and name not in self.dictOfBools:
+                        self.addToVariableList(name)
+                self.no_of_subformula += no_of_subformula
+                if isinstance(self.solver, SmtLibWriter):
+                    # written to the SMT-LIB file as they are, without building the terms in this process
+                    self.solver.addSmtLib(assertions)
+                else:
+                    self.solver.add(parse_smt2_string(assertions))
+        else:
+            encode_state = getattr(self, method_name)
+            for r_state in combined_state_list:
+                assertions = encode_state(r_state, *arguments)
+                self.solver.add(assertions)
+                if show_progress:
+                    self.progress.advance(1, len(assertions))
+        if show_progress:
+            self.progress.end()
+
+    def getExecutor(self):
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers,
+                                                                   initializer=initialiseEncodingWorker,
+                                                                   initargs=(self.model, self.no_of_stutter_quantifier,
+                                                                             self.stutterLength))
+        return self.executor
+
+    def shutdownWorkers(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def encodeBinaryState(self, r_state, operation, rel_quant1, rel_quant2, index_of_phi, index_of_phi1,
+                          index_of_phi2):
+        """
+        Encode a Boolean connective, a comparison or an arithmetic operation of probabilities in a composed state
+        :param operation: name of the operator, one of BINARY_OPERATORS
+        :return: list of assertions
+        """
+        if operation in CONNECTIVES:
+            name1 = self.composedName('holds', r_state, index_of_phi)
+            name2 = self.composedName('holds', r_state, index_of_phi1, rel_quant1)
+            name3 = self.composedName('holds', r_state, index_of_phi2, rel_quant2)
+        elif operation in COMPARISONS:
+            name1 = self.composedName('holds', r_state, index_of_phi)
+            name2 = self.composedName('prob', r_state, index_of_phi1, rel_quant1)
+            name3 = self.composedName('prob', r_state, index_of_phi2, rel_quant2)
+        else:
+            name1 = self.composedName('prob', r_state, index_of_phi)
+            name2 = self.composedName('prob', r_state, index_of_phi1, rel_quant1)
+            name3 = self.composedName('prob', r_state, index_of_phi2, rel_quant2)
+        self.addToVariableList(name1)
+        self.addToVariableList(name2)
+        self.addToVariableList(name3)
+
+        if operation in ARITHMETIC:
+            self.no_of_subformula += 2
+            return [self.dictOfReals[name1] == ARITHMETIC[operation](self.dictOfReals[name2], self.dictOfReals[name3])]
+
+        if operation == 'and':
+            first_and = And(self.dictOfBools[name1],
+                            self.dictOfBools[name2],
+                            self.dictOfBools[name3])
+            second_and = And(Not(self.dictOfBools[name1]),
+                             Or(Not(self.dictOfBools[name2]),
+                                Not(self.dictOfBools[name3])))
+        elif operation == 'or':
+            first_and = And(self.dictOfBools[name1],
+                            Or(self.dictOfBools[name2],
+                               self.dictOfBools[name3]))
+            second_and = And(Not(self.dictOfBools[name1]),
+                             And(Not(self.dictOfBools[name2]),
+                                 Not(self.dictOfBools[name3])))
+        elif operation == 'implies':
+            first_and = And(self.dictOfBools[name1],
+                            Or(Not(self.dictOfBools[name2]),
+                               self.dictOfBools[name3]))
+            second_and = And(Not(self.dictOfBools[name1]),
+                             And(self.dictOfBools[name2],
+                                 Not(self.dictOfBools[name3])))
+        elif operation == 'biconditional':
+            first_and = And(self.dictOfBools[name1],
+                            Or(
+                                And(self.dictOfBools[name2],
+                                    self.dictOfBools[name3]),
+                                And(Not(self.dictOfBools[name2]),
+                                    Not(self.dictOfBools[name3]))))
+            second_and = And(Not(self.dictOfBools[name1]),
+                             Or(
+                                 And(Not(self.dictOfBools[name2]),
+                                     self.dictOfBools[name3]),
+                                 And(self.dictOfBools[name2],
+                                     Not(self.dictOfBools[name3]))))
+        else:
+            relation, negated_relation = COMPARISONS[operation]
+            first_and = And(self.dictOfBools[name1],
+                            relation(self.dictOfReals[name2], self.dictOfReals[name3]))
+            second_and = And(Not(self.dictOfBools[name1]),
+                             negated_relation(self.dictOfReals[name2], self.dictOfReals[name3]))
+        self.no_of_subformula += 3
+        return [Or(first_and, second_and)]
+
+    def encodeNotState(self, r_state, index_of_phi, index_of_phi1):
+        name1 = self.composedName('holds', r_state, index_of_phi)
+        self.addToVariableList(name1)
+        name2 = self.composedName('holds', r_state, index_of_phi1)
+        self.addToVariableList(name2)
+        self.no_of_subformula += 1
+        return [Xor(self.dictOfBools[name1],
+                    self.dictOfBools[name2])]
+
+
+    @traced(describeSubformula)
     def encodeNextSemantics(self, hyperproperty, prev_relevant_quantifier=[]):
         """
         encode Semantics of Next formulas
@@ -631,79 +580,82 @@ class SemanticsEncoder:
         index_of_phi = self.list_of_subformula.index(hyperproperty)
         relevant_quantifier = self.encodeSemantics(phi1, prev_relevant_quantifier)
         combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
+        self.encodeStates('encodeNextState', combined_state_list,
+                          (relevant_quantifier, index_of_phi, index_of_phi1), True)
+        return relevant_quantifier
 
-        for r_state in combined_state_list:
-            print(".", end="")
-            # encode relationship between holds and holdsToInt
-            holds1 = 'holds'
-            str_r_state = ""
-            for tup in r_state:
-                str_r_state += "_" + str(tup)
-            holds1 += str_r_state + "_" + str(index_of_phi1)
-            self.addToVariableList(holds1)
-            holdsToInt1 = 'holdsToInt' + str_r_state + "_" + str(index_of_phi1)
-            self.addToVariableList(holdsToInt1)
-            prob_phi = 'prob' + str_r_state + "_" + str(index_of_phi)
-            self.addToVariableList(prob_phi)
-
-            first_and = Or(
-                And(self.dictOfReals[holdsToInt1] == RealVal(1),
-                    self.dictOfBools[holds1]),
-                And(self.dictOfReals[holdsToInt1] == RealVal(0),
-                    Not(self.dictOfBools[holds1])))
-            self.solver.add(first_and)
-            self.no_of_subformula += 3
-
-            # create list of all possible actions for r_state
-            dicts_act = []
-            for l in range(len(relevant_quantifier)):
-                dicts_act.append(self.model.dict_of_acts[r_state[relevant_quantifier[l] - 1][0]])
-            combined_acts = list(itertools.product(*dicts_act))
-
-            # encode probability calculation
-            sum_of_probs_list = []
-            for ca in combined_acts:
-                # create list of successors of r_state with probabilities under currently considered stuttering and actions
-                combined_succ = self.genSucc(r_state, ca, relevant_quantifier)
+    def encodeNextState(self, r_state, relevant_quantifier, index_of_phi, index_of_phi1):
+        """
+        Encode the probability of P(X phi1) in a composed state
+        :return: list of assertions
+        """
+        assertions = []
+        # encode relationship between holds and holdsToInt
+        holds1 = 'holds'
+        str_r_state = ""
+        for tup in r_state:
+            str_r_state += "_" + str(tup)
+        holds1 += str_r_state + "_" + str(index_of_phi1)
+        self.addToVariableList(holds1)
+        holdsToInt1 = 'holdsToInt' + str_r_state + "_" + str(index_of_phi1)
+        self.addToVariableList(holdsToInt1)
+        prob_phi = 'prob' + str_r_state + "_" + str(index_of_phi)
+        self.addToVariableList(prob_phi)
+
+        terms = self.terms
+        first_and = terms.disjunction([
+            terms.conjunction([terms.equal(self.realTerm(holdsToInt1), terms.real(1)), self.boolTerm(holds1)]),
+            terms.conjunction([terms.equal(self.realTerm(holdsToInt1), terms.real(0)),
+                               terms.negation(self.boolTerm(holds1))])])
+        assertions.append(terms.expression(first_and))
+        self.no_of_subformula += 3
+
+        # create list of all possible actions for r_state
+        dicts_act = []
+        for l in range(len(relevant_quantifier)):
+            dicts_act.append(self.model.dict_of_acts[r_state[relevant_quantifier[l] - 1][0]])
+        combined_acts = list(itertools.product(*dicts_act))
 
-                # calculate probability based on probabilities that phi1 holds in the successor states
-                for cs in combined_succ:
-                    holdsToInt_succ = 'holdsToInt'
-                    product_list = []
+        # encode probability calculation
+        sum_of_probs_list = []
+        for ca in combined_acts:
+            # create list of successors of r_state with probabilities under currently considered stuttering and actions
+            combined_succ = self.genSucc(r_state, ca, relevant_quantifier)
 
-                    for l in range(1, self.no_of_stutter_quantifier + 1):
-                        if l in relevant_quantifier:
-                            l_index = relevant_quantifier.index(l)
-                            succ_state = cs[l_index][0]
-                            A = set(self.model.dict_of_acts[r_state[l - 1][0]])
+            # calculate probability based on probabilities that phi1 holds in the successor states
+            for cs in combined_succ:
+                holdsToInt_succ = 'holdsToInt'
+                product_list = []
 
-                            holdsToInt_succ += '_' + succ_state
+                for l in range(1, self.no_of_stutter_quantifier + 1):
+                    if l in relevant_quantifier:
+                        l_index = relevant_quantifier.index(l)
+                        succ_state = cs[l_index][0]
 
-                            product_list.append(
-                                self.dictOfReals['go_' + str(l) + '_' + str(r_state[l - 1]) + '_' + str(
-                                    ca[l_index]) + '_' + cs[l_index][0]])
-                            product_list.append(self.dictOfReals["a_" + str(A) + "_" + str(ca[l_index])])
-                            product_list.append(self.dictOfReals[
-                                                    'Tr_' + str(l) + '_' + str(r_state[l - 1]) + '_' + str(
-                                                        ca[l_index]) + '_' + cs[l_index][0]])
+                        holdsToInt_succ += '_' + succ_state
 
-                        else:
-                            holdsToInt_succ += '_' + str((0, 0))
+                        step_prob = self.realTerm('stepProb_' + str(l) + '_' + str(r_state[l - 1]) + '_' +
+                                                     str(ca[l_index]) + '_' + cs[l_index][0])
+                        product_list.append(step_prob)
 
-                    holdsToInt_succ += '_' + str(index_of_phi1)
-                    self.addToVariableList(holdsToInt_succ)
+                    else:
+                        holdsToInt_succ += '_' + str((0, 0))
 
-                    product_list.append(self.dictOfReals[holdsToInt_succ])
-                    sum_of_probs_list.append(Product(product_list))
-                    self.no_of_subformula += 1
+                holdsToInt_succ += '_' + str(index_of_phi1)
+                self.addToVariableList(holdsToInt_succ)
 
-            probability_encoding = self.dictOfReals[prob_phi] == Sum(sum_of_probs_list)
-            self.no_of_subformula += 1
-            self.solver.add(probability_encoding)
-            self.no_of_subformula += 1
+                product_list.append(self.realTerm(holdsToInt_succ))
+                sum_of_probs_list.append(terms.product(product_list))
+                self.no_of_subformula += 1
 
-        return relevant_quantifier
+        probability_encoding = terms.equal(self.realTerm(prob_phi), terms.sum(sum_of_probs_list))
+        self.no_of_subformula += 1
+        assertions.append(terms.expression(probability_encoding))
+        self.no_of_subformula += 1
+        terms.release()
+        return assertions
 
+    @traced(describeSubformula)
     def encodeUnboundedUntilSemantics(self, hyperproperty, relevant_quantifier=[]):
         """
         encode Semantics of Unbounded Until formulas
@@ -722,126 +674,138 @@ class SemanticsEncoder:
         rel_quant2 = self.encodeSemantics(phi2)
         relevant_quantifier = extendWithoutDuplicates(rel_quant2, relevant_quantifier)
         combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
+        self.encodeStates('encodeUnboundedUntilState', combined_state_list,
+                          (relevant_quantifier, rel_quant1, rel_quant2, index_of_phi, index_of_phi1,
+                           index_of_phi2), True)
+        return relevant_quantifier
 
-        for r_state in combined_state_list:
-            print(".", end="")
-            # encode cases where we know probability is 0 or 1 and require probs variables to be in [0,1]
-            holds1 = 'holds'
-            for ind in range(0, len(r_state)):
-                if (ind + 1) in rel_quant1:
-                    holds1 += "_" + str(r_state[ind])
-                else:
-                    holds1 += "_" + str((0, 0))
-            holds1 += "_" + str(index_of_phi1)
-            self.addToVariableList(holds1)
-            holds2 = 'holds'
-            for ind in range(0, len(r_state)):
-                if (ind + 1) in rel_quant2:
-                    holds2 += "_" + str(r_state[ind])
-                else:
-                    holds2 += "_" + str((0, 0))
-            holds2 += "_" + str(index_of_phi2)
-            self.addToVariableList(holds2)
-            prob_phi = 'prob'
-            for tup in r_state:
-                prob_phi += "_" + str(tup)
-            prob_phi += '_' + str(index_of_phi)
-            self.addToVariableList(prob_phi)
-
-            first_implies = And(Implies(self.dictOfBools[holds2],
-                                        (self.dictOfReals[prob_phi] == RealVal(1))),
-                                Implies(And(Not(self.dictOfBools[holds1]),
-                                            Not(self.dictOfBools[holds2])),
-                                        (self.dictOfReals[prob_phi] == RealVal(0))))
-            self.solver.add(first_implies)
-            self.no_of_subformula += 4
-
-            # create list of all possible actions for r_state
-            dicts_act = []
-            for l in range(len(relevant_quantifier)):
-                dicts_act.append(self.model.dict_of_acts[r_state[relevant_quantifier[l] - 1][0]])
-            combined_acts = list(itertools.product(*dicts_act))
-
-            implies_precedent = And(self.dictOfBools[holds1], Not(self.dictOfBools[holds2]))
-
-            # encode probability calculation
-            sum_of_probs_list = []
-            loop_condition = []
-
-            for ca in combined_acts:
-                # create list of successors of r_state with probabilities under currently considered stuttering and actions
-                combined_succ = self.genSucc(r_state, ca, relevant_quantifier)
-
-                # create equation system for probabilities and a loop condition to ensure correctness
-                for cs in combined_succ:
-                    prob_succ = 'prob'
-                    holds_succ = 'holds'
-                    d_current = 'd'
-                    d_succ = 'd'
-
-                    product_list = []
-                    sched_prob_list = []
+    def encodeUnboundedUntilState(self, r_state, relevant_quantifier, rel_quant1, rel_quant2, index_of_phi,
+                                  index_of_phi1, index_of_phi2):
+        """
+        Encode the probability of P(phi1 U phi2) in a composed state
+        :return: list of assertions
+        """
+        assertions = []
+        # encode cases where we know probability is 0 or 1 and require probs variables to be in [0,1]
+        holds1 = 'holds'
+        for ind in range(0, len(r_state)):
+            if (ind + 1) in rel_quant1:
+                holds1 += "_" + str(r_state[ind])
+            else:
+                holds1 += "_" + str((0, 0))
+        holds1 += "_" + str(index_of_phi1)
+        self.addToVariableList(holds1)
+        holds2 = 'holds'
+        for ind in range(0, len(r_state)):
+            if (ind + 1) in rel_quant2:
+                holds2 += "_" + str(r_state[ind])
+            else:
+                holds2 += "_" + str((0, 0))
+        holds2 += "_" + str(index_of_phi2)
+        self.addToVariableList(holds2)
+        prob_phi = 'prob'
+        for tup in r_state:
+            prob_phi += "_" + str(tup)
+        prob_phi += '_' + str(index_of_phi)
+        self.addToVariableList(prob_phi)
+
+        terms = self.terms
+        first_implies = terms.conjunction([
+            terms.implies(self.boolTerm(holds2), terms.equal(self.realTerm(prob_phi), terms.real(1))),
+            terms.implies(terms.conjunction([terms.negation(self.boolTerm(holds1)),
+                                             terms.negation(self.boolTerm(holds2))]),
+                          terms.equal(self.realTerm(prob_phi), terms.real(0)))])
+        assertions.append(terms.expression(first_implies))
+        self.no_of_subformula += 4
+
+        # create list of all possible actions for r_state
+        dicts_act = []
+        for l in range(len(relevant_quantifier)):
+            dicts_act.append(self.model.dict_of_acts[r_state[relevant_quantifier[l] - 1][0]])
+        combined_acts = list(itertools.product(*dicts_act))
+
+        implies_precedent = terms.conjunction([self.boolTerm(holds1), terms.negation(self.boolTerm(holds2))])
+        on_cycle = self.onCycle(r_state, relevant_quantifier)
+
+        # encode probability calculation
+        sum_of_probs_list = []
+        loop_condition = []
+
+        for ca in combined_acts:
+            # create list of successors of r_state with probabilities under currently considered stuttering and actions
+            combined_succ = self.genSucc(r_state, ca, relevant_quantifier)
+
+            # create equation system for probabilities and a loop condition to ensure correctness
+            for cs in combined_succ:
+                prob_succ = 'prob'
+                holds_succ = 'holds'
+                d_current = 'd'
+                d_succ = 'd'
+
+                product_list = []
+                sched_prob_list = []
+
+                for l in range(1, self.no_of_stutter_quantifier + 1):
+                    if l in relevant_quantifier:
+                        l_index = relevant_quantifier.index(l)
+                        succ_state = cs[l_index][0]
+
+                        prob_succ += '_' + succ_state
+                        holds_succ += '_' + succ_state
+                        d_succ += '_' + succ_state
+
+                        step_prob = self.realTerm('stepProb_' + str(l) + '_' + str(r_state[l - 1]) + '_' +
+                                                     str(ca[l_index]) + '_' + cs[l_index][0])
+                        product_list.append(step_prob)
+                        sched_prob_list.append(step_prob)
+                    else:
+                        prob_succ += '_' + str((0, 0))
+                        holds_succ += '_' + str((0, 0))
+                        d_succ += '_' + str((0, 0))
+                    d_current += '_' + str(r_state[l - 1])
 
-                    for l in range(1, self.no_of_stutter_quantifier + 1):
-                        if l in relevant_quantifier:
-                            l_index = relevant_quantifier.index(l)
-                            succ_state = cs[l_index][0]
-                            A = set(self.model.dict_of_acts[r_state[l - 1][0]])
-
-                            prob_succ += '_' + succ_state
-                            holds_succ += '_' + succ_state
-                            d_succ += '_' + succ_state
-
-                            product_list.append(self.dictOfReals['go_' + str(l) + '_' + str(r_state[l - 1]) + '_' + str(
-                                ca[l_index]) + '_' + cs[l_index][0]])
-                            product_list.append(self.dictOfReals["a_" + str(A) + "_" + str(ca[l_index])])
-                            product_list.append(self.dictOfReals[
-                                                    'Tr_' + str(l) + '_' + str(r_state[l - 1]) + '_' + str(
-                                                        ca[l_index]) + '_' + cs[l_index][0]])
-
-                            sched_prob_list.append(self.dictOfReals["a_" + str(A) + "_" + str(ca[l_index])])
-                            sched_prob_list.append(self.dictOfReals[
-                                                       'go_' + str(l) + '_' + str(r_state[l - 1]) + '_' + str(
-                                                           ca[l_index]) + '_' + cs[l_index][0]])
-                        else:
-                            prob_succ += '_' + str((0, 0))
-                            holds_succ += '_' + str((0, 0))
-                            d_succ += '_' + str((0, 0))
-                        d_current += '_' + str(r_state[l - 1])
+                prob_succ += '_' + str(index_of_phi)
+                self.addToVariableList(prob_succ)
 
-                    prob_succ += '_' + str(index_of_phi)
-                    self.addToVariableList(prob_succ)
+                product_list.append(self.realTerm(prob_succ))
+                sum_of_probs_list.append(terms.product(product_list))
+                self.no_of_subformula += 1
 
-                    product_list.append(self.dictOfReals[prob_succ])
-                    sum_of_probs_list.append(Product(product_list))
+                # loop condition, only needed on cycles
+                if not on_cycle:
+                    continue
+                if self.leavesComponent(r_state, cs, relevant_quantifier):
+                    loop_condition.append(terms.less(terms.real(0), terms.product(sched_prob_list)))
                     self.no_of_subformula += 1
-
-                    # loop condition
-                    holds_succ += '_' + str(index_of_phi2)
-                    self.addToVariableList(holds_succ)
-                    d_current += '_' + str(index_of_phi2)
-                    self.addToVariableList(d_current)
-                    d_succ += '_' + str(index_of_phi2)
-                    self.addToVariableList(d_succ)
-                    loop_condition.append(And(Product(sched_prob_list) > RealVal(0),  #
-                                              Or(self.dictOfBools[holds_succ],
-                                                 self.dictOfReals[d_current] > self.dictOfReals[d_succ])
-                                              ))
-                    self.no_of_subformula += 3
-
-            # implies_antecedent_and1 = self.dictOfReals[prob_phi] == sum_of_probs
-            implies_antecedent_and1 = self.dictOfReals[prob_phi] == Sum(sum_of_probs_list)
-            self.no_of_subformula += 1
-            implies_antecedent_and2 = Implies(self.dictOfReals[prob_phi] > RealVal(0),
-                                              Or(loop_condition))
+                    continue
+                holds_succ += '_' + str(index_of_phi2)
+                self.addToVariableList(holds_succ)
+                d_current += '_' + str(index_of_phi2)
+                self.addToVariableList(d_current)
+                d_succ += '_' + str(index_of_phi2)
+                self.addToVariableList(d_succ)
+                loop_condition.append(terms.conjunction([
+                    terms.less(terms.real(0), terms.product(sched_prob_list)),
+                    terms.disjunction([self.boolTerm(holds_succ),
+                                       terms.greater(self.realTerm(d_current), self.realTerm(d_succ))])]))
+                self.no_of_subformula += 3
+
+        # implies_antecedent_and1 = self.realTerm(prob_phi) == sum_of_probs
+        implies_antecedent_and1 = terms.equal(self.realTerm(prob_phi), terms.sum(sum_of_probs_list))
+        self.no_of_subformula += 1
+        implies_antecedent = implies_antecedent_and1
+        if on_cycle:
+            implies_antecedent_and2 = terms.implies(terms.less(terms.real(0), self.realTerm(prob_phi)),
+                                                    terms.disjunction(loop_condition))
             self.no_of_subformula += 2
-            implies_antecedent = And(implies_antecedent_and1, implies_antecedent_and2)
-            self.no_of_subformula += 1
-            self.solver.add(Implies(implies_precedent, implies_antecedent))
+            implies_antecedent = terms.conjunction([implies_antecedent_and1, implies_antecedent_and2])
             self.no_of_subformula += 1
+        assertions.append(terms.expression(terms.implies(implies_precedent, implies_antecedent)))
+        self.no_of_subformula += 1
+        terms.release()
+        return assertions
 
-        return relevant_quantifier
-
+    @traced(describeSubformula)
     def encodeFutureSemantics(self, hyperproperty, relevant_quantifier=[]):
         """
         encode Semantics of Future formulas
@@ -856,109 +820,118 @@ class SemanticsEncoder:
         rel_quant = self.encodeSemantics(phi1)
         relevant_quantifier = extendWithoutDuplicates(relevant_quantifier, rel_quant)
         combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
+        self.encodeStates('encodeFutureState', combined_state_list,
+                          (relevant_quantifier, index_of_phi, index_of_phi1), True)
+        return relevant_quantifier
 
-        for r_state in combined_state_list:
-            print(".", end="")
-            # encode cases where we know probability is 1 and require probs variables to be in [0,1]
-            holds1 = 'holds'
-            str_r_state = ""
-            for ind in r_state:
-                str_r_state += "_" + str(ind)
-            holds1 += str_r_state + "_" + str(index_of_phi1)
-            self.addToVariableList(holds1)
-            prob_phi = 'prob'
-            prob_phi += str_r_state + '_' + str(index_of_phi)
-            self.addToVariableList(prob_phi)
-
-            first_implies = And(Implies(self.dictOfBools[holds1],
-                                        (self.dictOfReals[prob_phi] == RealVal(1)))) # .as_fraction()
-            self.solver.add(first_implies)
-            self.no_of_subformula += 3
-
-            # create list of all possible actions for r_state
-            dicts_act = []
-            for l in range(len(relevant_quantifier)):
-                dicts_act.append(self.model.dict_of_acts[r_state[relevant_quantifier[l] - 1][0]])
-            combined_acts = list(itertools.product(*dicts_act))
-
-            implies_precedent = Not(self.dictOfBools[holds1])
-
-            # sum_of_probs = RealVal(0).as_fraction() #
-            sum_of_probs_list = []
-            loop_condition = []
-
-            for ca in combined_acts:
-                # create list of successors of r_state with probabilities under currently considered stuttering and actions
-                combined_succ = self.genSucc(r_state, ca, relevant_quantifier)
-
-                # create equation system for probabilities and a loop condition to ensure correctness
-                for cs in combined_succ:
-                    prob_succ = 'prob'
-                    holds_succ = 'holds'
-                    d_current = 'd'
-                    d_succ = 'd'
-
-                    product_list = []
-                    sched_prob_list = []
+    def encodeFutureState(self, r_state, relevant_quantifier, index_of_phi, index_of_phi1):
+        """
+        Encode the probability of P(F phi1) in a composed state
+        :return: list of assertions
+        """
+        assertions = []
+        # encode cases where we know probability is 1 and require probs variables to be in [0,1]
+        holds1 = 'holds'
+        str_r_state = ""
+        for ind in r_state:
+            str_r_state += "_" + str(ind)
+        holds1 += str_r_state + "_" + str(index_of_phi1)
+        self.addToVariableList(holds1)
+        prob_phi = 'prob'
+        prob_phi += str_r_state + '_' + str(index_of_phi)
+        self.addToVariableList(prob_phi)
+
+        terms = self.terms
+        first_implies = terms.implies(self.boolTerm(holds1), terms.equal(self.realTerm(prob_phi), terms.real(1)))
+        assertions.append(terms.expression(first_implies))
+        self.no_of_subformula += 3
+
+        # create list of all possible actions for r_state
+        dicts_act = []
+        for l in range(len(relevant_quantifier)):
+            dicts_act.append(self.model.dict_of_acts[r_state[relevant_quantifier[l] - 1][0]])
+        combined_acts = list(itertools.product(*dicts_act))
+
+        implies_precedent = terms.negation(self.boolTerm(holds1))
+        on_cycle = self.onCycle(r_state, relevant_quantifier)
+
+        sum_of_probs_list = []
+        loop_condition = []
+
+        for ca in combined_acts:
+            # create list of successors of r_state with probabilities under currently considered stuttering and actions
+            combined_succ = self.genSucc(r_state, ca, relevant_quantifier)
+
+            # create equation system for probabilities and a loop condition to ensure correctness
+            for cs in combined_succ:
+                prob_succ = 'prob'
+                holds_succ = 'holds'
+                d_current = 'd'
+                d_succ = 'd'
+
+                product_list = []
+                sched_prob_list = []
+
+                for l in range(1, self.no_of_stutter_quantifier + 1):
+                    if l in relevant_quantifier:
+                        l_index = relevant_quantifier.index(l)
+                        succ_state = cs[l_index][0]
+
+                        prob_succ += '_' + succ_state
+                        holds_succ += '_' + succ_state
+                        d_succ += '_' + succ_state
+
+                        step_prob = self.realTerm('stepProb_' + str(l) + '_' + str(r_state[l - 1]) + '_' +
+                                                     str(ca[l_index]) + '_' + cs[l_index][0])
+                        product_list.append(step_prob)
+                        sched_prob_list.append(step_prob)
+                    else:
+                        prob_succ += '_' + str((0, 0))
+                        holds_succ += '_' + str((0, 0))
+                        d_succ += '_' + str((0, 0))
+                    d_current += '_' + str(r_state[l - 1])
 
-                    for l in range(1, self.no_of_stutter_quantifier + 1):
-                        if l in relevant_quantifier:
-                            l_index = relevant_quantifier.index(l)
-                            succ_state = cs[l_index][0]
-                            A = set(self.model.dict_of_acts[r_state[l - 1][0]])
-
-                            prob_succ += '_' + succ_state
-                            holds_succ += '_' + succ_state
-                            d_succ += '_' + succ_state
-
-                            product_list.append(self.dictOfReals['go_' + str(l) + '_' + str(r_state[l - 1]) + '_' + str(
-                                                        ca[l_index]) + '_' + cs[l_index][0]])
-                            product_list.append(self.dictOfReals["a_" + str(A) + "_" + str(ca[l_index])])
-                            product_list.append(self.dictOfReals[
-                                                    'Tr_' + str(l) + '_' + str(r_state[l - 1]) + '_' + str(
-                                                        ca[l_index]) + '_' + cs[l_index][0]])
-
-                            sched_prob_list.append(self.dictOfReals["a_" + str(A) + "_" + str(ca[l_index])])
-                            sched_prob_list.append(self.dictOfReals[
-                                                       'go_' + str(l) + '_' + str(r_state[l - 1]) + '_' + str(
-                                                           ca[l_index]) + '_' + cs[l_index][0]])
-                        else:
-                            prob_succ += '_' + str((0, 0))
-                            holds_succ += '_' + str((0, 0))
-                            d_succ += '_' + str((0, 0))
-                        d_current += '_' + str(r_state[l - 1])
+                prob_succ += '_' + str(index_of_phi)
+                self.addToVariableList(prob_succ)
 
-                    prob_succ += '_' + str(index_of_phi)
-                    self.addToVariableList(prob_succ)
+                product_list.append(self.realTerm(prob_succ))
+                sum_of_probs_list.append(terms.product(product_list))
+                self.no_of_subformula += 1
 
-                    product_list.append(self.dictOfReals[prob_succ])
-                    sum_of_probs_list.append(Product(product_list))
+                # loop condition, only needed on cycles
+                if not on_cycle:
+                    continue
+                if self.leavesComponent(r_state, cs, relevant_quantifier):
+                    loop_condition.append(terms.less(terms.real(0), terms.product(sched_prob_list)))
                     self.no_of_subformula += 1
-
-                    # loop condition
-                    holds_succ += '_' + str(index_of_phi1)
-                    self.addToVariableList(holds_succ)
-                    d_current += '_' + str(index_of_phi1)
-                    self.addToVariableList(d_current)
-                    d_succ += '_' + str(index_of_phi1)
-                    self.addToVariableList(d_succ)
-                    loop_condition.append(And(Product(sched_prob_list) > RealVal(0),  #
-                                              Or(self.dictOfBools[holds_succ],
-                                                 self.dictOfReals[d_current] > self.dictOfReals[d_succ])
-                                              ))
-                    self.no_of_subformula += 3
-
-            implies_antecedent_and1 = self.dictOfReals[prob_phi] == Sum(sum_of_probs_list)
-            self.no_of_subformula += 1
-            implies_antecedent_and2 = Implies(self.dictOfReals[prob_phi] > RealVal(0),
-                                              Or(loop_condition))
+                    continue
+                holds_succ += '_' + str(index_of_phi1)
+                self.addToVariableList(holds_succ)
+                d_current += '_' + str(index_of_phi1)
+                self.addToVariableList(d_current)
+                d_succ += '_' + str(index_of_phi1)
+                self.addToVariableList(d_succ)
+                loop_condition.append(terms.conjunction([
+                    terms.less(terms.real(0), terms.product(sched_prob_list)),
+                    terms.disjunction([self.boolTerm(holds_succ),
+                                       terms.greater(self.realTerm(d_current), self.realTerm(d_succ))])]))
+                self.no_of_subformula += 3
+
+        implies_antecedent_and1 = terms.equal(self.realTerm(prob_phi), terms.sum(sum_of_probs_list))
+        self.no_of_subformula += 1
+        implies_antecedent = implies_antecedent_and1
+        if on_cycle:
+            implies_antecedent_and2 = terms.implies(terms.less(terms.real(0), self.realTerm(prob_phi)),
+                                                    terms.disjunction(loop_condition))
             self.no_of_subformula += 2
-            implies_antecedent = And(implies_antecedent_and1, implies_antecedent_and2)
+            implies_antecedent = terms.conjunction([implies_antecedent_and1, implies_antecedent_and2])
             self.no_of_subformula += 1
-            self.solver.add(Implies(implies_precedent, implies_antecedent))
-            self.no_of_subformula += 1
-        return relevant_quantifier
+        assertions.append(terms.expression(terms.implies(implies_precedent, implies_antecedent)))
+        self.no_of_subformula += 1
+        terms.release()
+        return assertions
 
+    @traced(describeSubformula)
     def encodeGlobalSemantics(self, hyperproperty, relevant_quantifier=[]):
         print("\nNow encoding: " + str(hyperproperty))
         index_of_phi = self.list_of_subformula.index(hyperproperty)
@@ -967,105 +940,238 @@ class SemanticsEncoder:
         rel_quant1 = self.encodeSemantics(phi1)
         relevant_quantifier = extendWithoutDuplicates(rel_quant1, relevant_quantifier)
         combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
+        self.encodeStates('encodeGlobalState', combined_state_list,
+                          (relevant_quantifier, index_of_phi, index_of_phi1), True)
+        return relevant_quantifier
 
-        for r_state in combined_state_list:
-            print(".", end="")
-            # encode cases where we know probability is 0 and require probs variables to be in [0,1]
-            holds1 = 'holds'
-            str_r_state = ""
-            for tup in r_state:
-                str_r_state += "_" + str(tup)
-            holds1 += str_r_state + "_" + str(index_of_phi1)
-            self.addToVariableList(holds1)
-            prob_phi = 'prob'
-            prob_phi += str_r_state + '_' + str(index_of_phi)
-            self.addToVariableList(prob_phi)
-
-            first_implies = And(Implies((Not(self.dictOfBools[holds1])),
-                                        (self.dictOfReals[prob_phi] == RealVal(0))))
-            self.solver.add(first_implies)
+    def encodeGlobalState(self, r_state, relevant_quantifier, index_of_phi, index_of_phi1):
+        """
+        Encode the probability of P(G phi1) in a composed state
+        :return: list of assertions
+        """
+        assertions = []
+        # encode cases where we know probability is 0 and require probs variables to be in [0,1]
+        holds1 = 'holds'
+        str_r_state = ""
+        for tup in r_state:
+            str_r_state += "_" + str(tup)
+        holds1 += str_r_state + "_" + str(index_of_phi1)
+        self.addToVariableList(holds1)
+        prob_phi = 'prob'
+        prob_phi += str_r_state + '_' + str(index_of_phi)
+        self.addToVariableList(prob_phi)
+
+        terms = self.terms
+        first_implies = terms.implies(terms.negation(self.boolTerm(holds1)),
+                                      terms.equal(self.realTerm(prob_phi), terms.real(0)))
+        assertions.append(terms.expression(first_implies))
+        self.no_of_subformula += 1
+
+        # create list of all possible actions for r_state
+        dicts_act = []
+        for l in range(len(relevant_quantifier)):
+            dicts_act.append(self.model.dict_of_acts[r_state[relevant_quantifier[l] - 1][0]])
+        combined_acts = list(itertools.product(*dicts_act))
+
+        implies_precedent = self.boolTerm(holds1)
+        on_cycle = self.onCycle(r_state, relevant_quantifier)
+
+        sum_of_probs_list = []
+        loop_condition = []
+
+        for ca in combined_acts:
+            # create list of successors of r_state with probabilities under currently considered stuttering and actions
+            combined_succ = self.genSucc(r_state, ca, relevant_quantifier)
+
+            # create equation system for probabilities and a loop condition to ensure correctness
+            for cs in combined_succ:
+                prob_succ = 'prob'
+                holds_succ = 'holds'
+                d_current = 'd'
+                d_succ = 'd'
+
+                product_list = []
+                sched_prob_list = []
+
+                for l in range(1, self.no_of_stutter_quantifier + 1):
+                    if l in relevant_quantifier:
+                        l_index = relevant_quantifier.index(l)
+                        succ_state = cs[l_index][0]
+
+                        prob_succ += '_' + succ_state
+                        holds_succ += '_' + succ_state
+                        d_succ += '_' + succ_state
+
+                        step_prob = self.realTerm('stepProb_' + str(l) + '_' + str(r_state[l - 1]) + '_' +
+                                                     str(ca[l_index]) + '_' + cs[l_index][0])
+                        product_list.append(step_prob)
+                        sched_prob_list.append(step_prob)
+                    else:
+                        prob_succ += '_' + str((0, 0))
+                        holds_succ += '_' + str((0, 0))
+                        d_succ += '_' + str((0, 0))
+                    d_current += '_' + str(r_state[l - 1])
+
+                prob_succ += '_' + str(index_of_phi)
+                self.addToVariableList(prob_succ)
+
+                product_list.append(self.realTerm(prob_succ))
+                sum_of_probs_list.append(terms.product(product_list))
+                self.no_of_subformula += 1
+
+                # loop condition, only needed on cycles
+                if not on_cycle:
+                    continue
+                if self.leavesComponent(r_state, cs, relevant_quantifier):
+                    loop_condition.append(terms.less(terms.real(0), terms.product(sched_prob_list)))
+                    self.no_of_subformula += 1
+                    continue
+                holds_succ += '_' + str(index_of_phi1)
+                self.addToVariableList(holds_succ)
+                d_current += '_' + str(index_of_phi1)
+                self.addToVariableList(d_current)
+                d_succ += '_' + str(index_of_phi1)
+                self.addToVariableList(d_succ)
+                loop_condition.append(terms.conjunction([
+                    terms.less(terms.real(0), terms.product(sched_prob_list)),
+                    terms.disjunction([terms.negation(self.boolTerm(holds_succ)),
+                                       terms.greater(self.realTerm(d_current), self.realTerm(d_succ))])]))
+                self.no_of_subformula += 3
+
+        implies_antecedent_and1 = terms.equal(self.realTerm(prob_phi), terms.sum(sum_of_probs_list))
+        self.no_of_subformula += 1
+        implies_antecedent = implies_antecedent_and1
+        if on_cycle:
+            implies_antecedent_and2 = terms.implies(terms.greater(terms.real(1), self.realTerm(prob_phi)),
+                                                    terms.disjunction(loop_condition))
+            self.no_of_subformula += 2
+            implies_antecedent = terms.conjunction([implies_antecedent_and1, implies_antecedent_and2])
             self.no_of_subformula += 1
+        assertions.append(terms.expression(terms.implies(implies_precedent, implies_antecedent)))
+        self.no_of_subformula += 1
+        terms.release()
+        return assertions
 
+    @traced(describeSubformula)
+    def encodeBoundedSemantics(self, hyperproperty, relevant_quantifier=[]):
+        """
+        encode Semantics of bounded Until formulas, and of Until, Future and Global formulas bounded to
+        bounded_horizon steps. The probability is unrolled into layers: the variables of layer j are the probabilities
+        in the composed states reached after j steps, those of layer 0 are the probabilities of the formula.
+        Each layer only refers to the next one, so no loop conditions are needed.
+        :param hyperproperty: property of the form P(phi1 U[k1, k2] phi2), P(phi1 U phi2), P(F phi1) or P(G phi1)
+        :param prev_relevant_quantifier: previously relevant quantifiers
+        :return: relevant_quantifier
+        """
+        print("\nNow encoding: " + str(hyperproperty))
+        index_of_phi = self.list_of_subformula.index(hyperproperty)
+        child = hyperproperty.children[0]
+        lower, upper = 0, self.bounded_horizon
+        if child.data == 'until_bounded':
+            phi1, phi2 = child.children[0], child.children[3]
+            lower, upper = untilBounds(child)
+        elif child.data == 'until_unbounded':
+            phi1, phi2 = child.children
+        elif child.data == 'future':
+            phi1, phi2 = None, child.children[0]
+        else:
+            phi1, phi2 = child.children[0], None
+        index_of_phi1, rel_quant1 = None, []
+        if phi1 is not None:
+            index_of_phi1 = self.list_of_subformula.index(phi1)
+            rel_quant1 = self.encodeSemantics(phi1)
+            relevant_quantifier = extendWithoutDuplicates(rel_quant1, relevant_quantifier)
+        index_of_phi2, rel_quant2 = None, []
+        if phi2 is not None:
+            index_of_phi2 = self.list_of_subformula.index(phi2)
+            rel_quant2 = self.encodeSemantics(phi2)
+            relevant_quantifier = extendWithoutDuplicates(rel_quant2, relevant_quantifier)
+        combined_state_list = self.generateComposedStatesWithStutter(relevant_quantifier)
+        for layer in range(upper + 1):
+            self.encodeStates('encodeBoundedState', combined_state_list,
+                              (child.data, relevant_quantifier, rel_quant1, rel_quant2, index_of_phi, index_of_phi1,
+                               index_of_phi2, layer, lower, upper), True)
+        return relevant_quantifier
+
+    def layerName(self, r_state, index_of_phi, layer):
+        """
+        Name of the probability of a bounded temporal subformula in a composed state reached after layer steps
+        """
+        return self.composedName('prob' if layer == 0 else 'probStep' + str(layer), r_state, index_of_phi)
+
+    def encodeBoundedState(self, r_state, temporal_operator, relevant_quantifier, rel_quant1, rel_quant2,
+                           index_of_phi, index_of_phi1, index_of_phi2, layer, lower, upper):
+        """
+        Encode the probability of P(phi1 U[lower, upper] phi2), P(F[0, upper] phi2) or P(G[0, upper] phi1)
+        in a composed state reached after layer steps
+        :param temporal_operator: until_bounded, until_unbounded, future or global
+        :return: list of assertions
+        """
+        assertions = []
+        terms = self.terms
+        prob_phi = self.layerName(r_state, index_of_phi, layer)
+        self.addToVariableList(prob_phi)
+        holds1, holds2 = None, None
+        if index_of_phi1 is not None:
+            name = self.composedName('holds', r_state, index_of_phi1, rel_quant1)
+            self.addToVariableList(name)
+            holds1 = self.boolTerm(name)
+        if index_of_phi2 is not None:
+            name = self.composedName('holds', r_state, index_of_phi2, rel_quant2)
+            self.addToVariableList(name)
+            holds2 = self.boolTerm(name)
+
+        # conditions under which the probability is 1, 0, or given by the next layer; None if that case cannot occur
+        if temporal_operator == 'global':
+            reached = [holds1] if layer == upper else None
+            failed = [terms.negation(holds1)]
+            proceed = [holds1] if layer < upper else None
+        else:
+            # Future formulas have phi1 = true
+            while_phi1 = [holds1] if holds1 is not None else []
+            reached = [holds2] if layer >= lower else None
+            if layer == upper:
+                failed = [terms.negation(holds2)] if layer >= lower else []
+                proceed = None
+            elif layer >= lower:
+                failed = [terms.negation(holds1), terms.negation(holds2)] if holds1 is not None else None
+                proceed = while_phi1 + [terms.negation(holds2)]
+            else:
+                failed = [terms.negation(holds1)] if holds1 is not None else None
+                proceed = while_phi1
+
+        if reached is not None:
+            assertions.append(guarded(terms, reached, terms.equal(self.realTerm(prob_phi), terms.real(1))))
+        if failed is not None:
+            assertions.append(guarded(terms, failed, terms.equal(self.realTerm(prob_phi), terms.real(0))))
+        if proceed is not None:
             # create list of all possible actions for r_state
             dicts_act = []
             for l in range(len(relevant_quantifier)):
                 dicts_act.append(self.model.dict_of_acts[r_state[relevant_quantifier[l] - 1][0]])
             combined_acts = list(itertools.product(*dicts_act))
 
-            implies_precedent = self.dictOfBools[holds1]
-
             sum_of_probs_list = []
-            loop_condition = []
-
             for ca in combined_acts:
-                # create list of successors of r_state with probabilities under currently considered stuttering and actions
-                combined_succ = self.genSucc(r_state, ca, relevant_quantifier)
-
-                # create equation system for probabilities and a loop condition to ensure correctness
-                for cs in combined_succ:
-                    prob_succ = 'prob'
-                    holds_succ = 'holds'
-                    d_current = 'd'
-                    d_succ = 'd'
-
+                for cs in self.genSucc(r_state, ca, relevant_quantifier):
+                    succ_state = []
                     product_list = []
-                    sched_prob_list = []
-
                     for l in range(1, self.no_of_stutter_quantifier + 1):
                         if l in relevant_quantifier:
                             l_index = relevant_quantifier.index(l)
-                            succ_state = cs[l_index][0]
-                            A = set(self.model.dict_of_acts[r_state[l - 1][0]])
-
-                            prob_succ += '_' + succ_state
-                            holds_succ += '_' + succ_state
-                            d_succ += '_' + succ_state
-
-                            product_list.append(self.dictOfReals['go_' + str(l) + '_' + str(r_state[l - 1]) + '_' + str(
-                                ca[l_index]) + '_' + cs[l_index][0]])
-                            product_list.append(self.dictOfReals["a_" + str(A) + "_" + str(ca[l_index])])
-                            product_list.append(self.dictOfReals[
-                                                    'Tr_' + str(l) + '_' + str(r_state[l - 1]) + '_' + str(
-                                                        ca[l_index]) + '_' + cs[l_index][0]])
-
-                            sched_prob_list.append(self.dictOfReals["a_" + str(A) + "_" + str(ca[l_index])])
-                            sched_prob_list.append(self.dictOfReals[
-                                                       'go_' + str(l) + '_' + str(r_state[l - 1]) + '_' + str(
-                                                           ca[l_index]) + '_' + cs[l_index][0]])
+                            succ_state.append(cs[l_index][0])
+                            product_list.append(self.realTerm('stepProb_' + str(l) + '_' + str(r_state[l - 1]) +
+                                                                 '_' + str(ca[l_index]) + '_' + cs[l_index][0]))
                         else:
-                            prob_succ += '_' + str((0, 0))
-                            holds_succ += '_' + str((0, 0))
-                            d_succ += '_' + str((0, 0))
-                        d_current += '_' + str(r_state[l - 1])
-
-                    prob_succ += '_' + str(index_of_phi)
+                            succ_state.append((0, 0))
+                    prob_succ = self.layerName(succ_state, index_of_phi, layer + 1)
                     self.addToVariableList(prob_succ)
-
-                    product_list.append(self.dictOfReals[prob_succ])
-                    sum_of_probs_list.append(Product(product_list))
+                    product_list.append(self.realTerm(prob_succ))
+                    sum_of_probs_list.append(terms.product(product_list))
                     self.no_of_subformula += 1
-
-                    # loop condition
-                    holds_succ += '_' + str(index_of_phi1)
-                    self.addToVariableList(holds_succ)
-                    d_current += '_' + str(index_of_phi1)
-                    self.addToVariableList(d_current)
-                    d_succ += '_' + str(index_of_phi1)
-                    self.addToVariableList(d_succ)
-                    loop_condition.append(And(Product(sched_prob_list) > RealVal(0),
-                                              Or(Not(self.dictOfBools[holds_succ]),
-                                                 self.dictOfReals[d_current] > self.dictOfReals[d_succ])
-                                              ))
-                    self.no_of_subformula += 3
-
-            implies_antecedent_and1 = self.dictOfReals[prob_phi] == Sum(sum_of_probs_list)
-            self.no_of_subformula += 1
-            implies_antecedent_and2 = Implies(self.dictOfReals[prob_phi] < RealVal(1),
-                                              Or(loop_condition))
-            self.no_of_subformula += 2
-            implies_antecedent = And(implies_antecedent_and1, implies_antecedent_and2)
-            self.no_of_subformula += 1
-            self.solver.add(Implies(implies_precedent, implies_antecedent))
-            self.no_of_subformula += 1
-
-        return relevant_quantifier
+            probability_encoding = terms.equal(self.realTerm(prob_phi), terms.sum(sum_of_probs_list))
+            assertions.append(guarded(terms, proceed, probability_encoding))
+        self.no_of_subformula += len(assertions)
+        assertions = [terms.expression(assertion) for assertion in assertions]
+        terms.release()
+        return assertions
@@ -0,0 +1,223 @@
+import collections
+import concurrent.futures
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+
+# caches of a worker process, they live as long as the worker
+model_cache = collections.OrderedDict()  # dict[(absolute model path, modification time)] = Model
+property_cache = collections.OrderedDict()  # dict[property string] = Property
+cache_size = 8
+
+
+def initialiseWorker(size):
+    """
+    Import the heavy dependencies once per worker and send the output of the model checker to stderr,
+    where it does not mix with the results
+    """
+    global cache_size
+    cache_size = size
+    sys.stdout = sys.stderr
+    import hyperprob.modelparser
+    import hyperprob.modelchecker
+
+
+def addToCache(cache, key, value):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > cache_size:
+        cache.popitem(last=False)
+
+
+def getModel(model_path):
+    """
+    Parse and build the model, or take it from the cache if the file has not changed since it was built
+    :return: model, whether it was taken from the cache
+    """
+    from hyperprob.modelparser import Model
+
+    if not os.path.exists(model_path):
+        raise ValueError("Model file " + model_path + " does not exist")
+    key = (os.path.abspath(model_path), os.path.getmtime(model_path))
+    if key in model_cache:
+        model_cache.move_to_end(key)
+        return model_cache[key], True
+    model = Model(model_path)
+    model.parseModel(True)
+    if model.parsed_model is None:
+        raise ValueError("Model could not be parsed")
+    addToCache(model_cache, key, model)
+    return model, False
+
+
+def getProperty(property_string):
+    """
+    Parse the property, or take it from the cache
+    """
+    from hyperprob.propertyparser import Property
+
+    if property_string in property_cache:
+        property_cache.move_to_end(property_string)
+        return property_cache[property_string]
+    hyperproperty = Property(property_string)
+    hyperproperty.parseProperty(False)
+    if hyperproperty.parsed_property is None:
+        raise ValueError("Property could not be parsed")
+    addToCache(property_cache, property_string, hyperproperty)
+    return hyperproperty
+
+
+def runJob(job):
+    """
+    Model check a single job in a worker process.
+    A job names a model and a property, and optionally stutterLength, maxSchedProb, boundedHorizon,
+    probabilityBounds, preCheck, witnessSearch, encodingReport and dryRun.
+    :return: result with the id of the job, its status, the verdict, the witness if the property holds and the
+             statistics of model checking
+    """
+    from hyperprob.modelchecker import ModelChecker
+
+    result = {'id': job.get('id')}
+    starting_time = time.perf_counter()
+    try:
+        if 'model' not in job or 'property' not in job:
+            raise ValueError("A job has to name a model and a property")
+        hyperproperty = getProperty(job['property'])
+        model, result['model_cached'] = getModel(job['model'])
+        modelchecker = ModelChecker(model, hyperproperty, int(job.get('stutterLength', 1)),
+                                    float(job.get('maxSchedProb', 0.99)),
+                                    boundedHorizon=job.get('boundedHorizon'),
+                                    probabilityBounds=job.get('probabilityBounds', False),
+                                    preCheck=job.get('preCheck', False),
+                                    witnessSearch=job.get('witnessSearch'),
+                                    encodingReport=job.get('encodingReport', False))
+        if job.get('dryRun', False):
+            modelchecker.dryRun()
+        else:
+            modelchecker.modelCheck()
+        result['status'] = 'ok'
+        result['verdict'] = modelchecker.statistics.get('verdict')
+        if modelchecker.witness is not None:
+            result['witness'] = modelchecker.witness
+        result['statistics'] = dict(model.statistics)
+        result['statistics'].update(modelchecker.statistics)
+    except MemoryError:
+        result['status'] = 'error'
+        result['error'] = "Out of memory"
+    except Exception as err:
+        result['status'] = 'error'
+        result['error'] = str(err)
+    result['time'] = time.perf_counter() - starting_time
+    return result
+
+
+class Server:
+    """
+    Stays resident and model checks jobs given as JSON lines, one result is written as a JSON line per job.
+    Jobs are run by a pool of worker processes, each keeping the models and properties it parsed in an LRU cache.
+    Results are written as soon as their job finishes, so they may come back in a different order than the jobs;
+    the id of a job is copied to its result.
+    """
+
+    def __init__(self, workers=1, size_of_cache=8):
+        self.workers = workers
+        self.size_of_cache = size_of_cache
+        self.executor = None
+        self.lock = threading.Lock()
+        self.startPool()
+
+    def startPool(self):
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers,
+                                                               initializer=initialiseWorker,
+                                                               initargs=(self.size_of_cache,))
+
+    def submit(self, line, respond):
+        """
+        Start a job and call respond with its result once it has finished
+        :param line: job as JSON object
+        :param respond: function taking the result
+        :return: future of the job, None if the line is not a valid job
+        """
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("a job has to be a JSON object")
+        except ValueError as err:
+            respond({'id': None, 'status': 'error', 'error': "Invalid job: " + str(err)})
+            return None
+        with self.lock:
+            try:
+                future = self.executor.submit(runJob, job)
+            except concurrent.futures.process.BrokenProcessPool:
+                # a worker died, e.g. because it ran out of memory; replace the pool
+                self.startPool()
+                future = self.executor.submit(runJob, job)
+
+        def done(finished):
+            if finished.exception() is not None:
+                respond({'id': job.get('id'), 'status': 'error', 'error': str(finished.exception())})
+            else:
+                respond(finished.result())
+        future.add_done_callback(done)
+        return future
+
+    def serveStdin(self):
+        """
+        Read jobs from stdin until it is closed and write the results to stdout
+        """
+        output = sys.stdout
+        output_lock = threading.Lock()
+
+        def respond(result):
+            with output_lock:
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+
+        # the output of the model checker must not mix with the results
+        sys.stdout = sys.stderr
+        try:
+            for line in sys.stdin:
+                if line.strip():
+                    self.submit(line, respond)
+        finally:
+            self.executor.shutdown(wait=True)
+            sys.stdout = output
+
+    def serveSocket(self, socket_path):
+        """
+        Accept connections on a Unix socket, each connection sends jobs and receives their results as JSON lines
+        """
+        server = self
+
+        class JobHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                output_lock = threading.Lock()
+                futures = []
+
+                def respond(result):
+                    with output_lock:
+                        try:
+                            self.wfile.write((json.dumps(result) + "\n").encode())
+                            self.wfile.flush()
+                        except OSError:
+                            pass  # the client has gone away
+
+                for line in self.rfile:
+                    if line.strip():
+                        futures.append(server.submit(line.decode(), respond))
+                concurrent.futures.wait([future for future in futures if future is not None])
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        with socketserver.ThreadingUnixStreamServer(socket_path, JobHandler) as unix_server:
+            print("Listening on " + socket_path, file=sys.stderr)
+            try:
+                unix_server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.executor.shutdown(wait=False)
+                os.remove(socket_path)
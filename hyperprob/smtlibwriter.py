@@ -0,0 +1,347 @@
+import os
+import re
+import shutil
+import subprocess
+from fractions import Fraction
+
+from z3 import Bool, Real, Solver, sat, unsat, unknown
+
+from hyperprob.utility import common
+
+# assertions collected before they are written, the terms of at most this many assertions are alive at a time
+BATCH_SIZE = 1000
+# symbols that need no quoting in SMT-LIB2, other names are enclosed in |...| as done by z3
+SIMPLE_SYMBOL = re.compile(r"[A-Za-z~!@$%^&*_+=<>.?/-][A-Za-z0-9~!@$%^&*_+=<>.?/-]*")
+
+
+def noOfAssertions(solver):
+    """
+    :param solver: z3 solver or SmtLibWriter
+    :return: number of assertions added to the solver
+    """
+    if isinstance(solver, SmtLibWriter):
+        return solver.noOfAssertions()
+    return len(solver.assertions())
+
+
+def addVariable(variables, name, sort):
+    """
+    Add a variable to a dict of variables, only by its name if the encoding is written to an SMT-LIB file
+    :param sort: Real or Bool
+    """
+    if isinstance(variables, SmtLibVariables):
+        variables.add(name)
+    else:
+        variables[name] = sort(name)
+
+
+def symbol(name):
+    return name if SIMPLE_SYMBOL.fullmatch(name) else "|" + name + "|"
+
+
+def numeral(value):
+    """
+    :param value: int or string of a rational number, as for RealVal
+    :return: the number in SMT-LIB2, as a decimal or a quotient of decimals
+    """
+    value = Fraction(value)
+    text = str(abs(value.numerator)) + ".0"
+    if value.denominator != 1:
+        text = "(/ " + text + " " + str(value.denominator) + ".0)"
+    return "(- " + text + ")" if value < 0 else text
+
+
+def declaredName(line):
+    """
+    :param line: (declare-fun name () sort) as written by z3
+    :return: name of the declared variable
+    """
+    rest = line[len("(declare-fun "):]
+    if rest.startswith("|"):
+        return rest[1:rest.index("|", 1)]
+    return rest[:rest.index(" ")]
+
+
+class SmtLibVariables(dict):
+    """
+    Variables of an encoding written to an SMT-LIB file, declared in the file when they are added. The z3 variable of
+    a name is only created when it is looked up, by the parts of the encoding that are built as z3 terms; the encoders
+    using SmtLibTerms only write the name.
+    """
+
+    def __init__(self, writer, sort):
+        """
+        :param sort: Real or Bool
+        """
+        super().__init__()
+        self.writer = writer
+        self.sort = sort
+
+    def add(self, name):
+        if name not in self:
+            super().__setitem__(name, None)
+            self.writer.declare(name, self.sort.__name__)
+
+    def __getitem__(self, name):
+        variable = super().__getitem__(name)
+        if variable is None:
+            variable = self.sort(name)
+            super().__setitem__(name, variable)
+        return variable
+
+
+class SmtLibTerms:
+    """
+    Builds the terms of the encoders as SMT-LIB2 text instead of z3 terms, with the methods of TermBuilder.
+    Variables are referred to by their names, so an assertion is written to the file without calling z3.
+    """
+
+    def __init__(self):
+        self.numerals = dict()  # dict[value] = numeral in SMT-LIB2
+
+    @staticmethod
+    def variable(variables, name):
+        return symbol(name)
+
+    @staticmethod
+    def expression(term):
+        return term
+
+    def release(self):
+        pass
+
+    def real(self, value):
+        if value not in self.numerals:
+            self.numerals[value] = numeral(value)
+        return self.numerals[value]
+
+    @staticmethod
+    def boolean(value):
+        return "true" if value else "false"
+
+    @staticmethod
+    def application(operator, terms, neutral):
+        if len(terms) == 0:
+            return neutral
+        if len(terms) == 1:
+            return terms[0]
+        return "(" + operator + " " + " ".join(terms) + ")"
+
+    def conjunction(self, terms):
+        return self.application("and", terms, "true")
+
+    def disjunction(self, terms):
+        return self.application("or", terms, "false")
+
+    def product(self, terms):
+        return self.application("*", terms, "1.0")
+
+    def sum(self, terms):
+        return self.application("+", terms, "0.0")
+
+    @staticmethod
+    def negation(term):
+        return "(not " + term + ")"
+
+    @staticmethod
+    def implies(term1, term2):
+        return "(=> " + term1 + " " + term2 + ")"
+
+    @staticmethod
+    def equal(term1, term2):
+        return "(= " + term1 + " " + term2 + ")"
+
+    @staticmethod
+    def less(term1, term2):
+        return "(< " + term1 + " " + term2 + ")"
+
+    @staticmethod
+    def lessEqual(term1, term2):
+        return "(<= " + term1 + " " + term2 + ")"
+
+    @staticmethod
+    def greater(term1, term2):
+        return "(> " + term1 + " " + term2 + ")"
+
+    @staticmethod
+    def greaterEqual(term1, term2):
+        return "(>= " + term1 + " " + term2 + ")"
+
+
+def tokenize(text):
+    """
+    Split the output of z3 into parentheses, quoted symbols, string literals and other atoms
+    """
+    tokens = []
+    position = 0
+    while position < len(text):
+        character = text[position]
+        if character.isspace():
+            position += 1
+        elif character in '()':
+            tokens.append(character)
+            position += 1
+        elif character in '|"':
+            end = text.index(character, position + 1)
+            tokens.append(text[position:end + 1])
+            position = end + 1
+        else:
+            end = position
+            while end < len(text) and not text[end].isspace() and text[end] not in '()|"':
+                end += 1
+            tokens.append(text[position:end])
+            position = end
+    return tokens
+
+
+def parseExpressions(text):
+    """
+    :return: list of the s-expressions in the text, lists for applications and strings for atoms
+    """
+    expressions = [[]]
+    for token in tokenize(text):
+        if token == '(':
+            expressions.append([])
+        elif token == ')':
+            expression = expressions.pop()
+            expressions[-1].append(expression)
+        else:
+            expressions[-1].append(token)
+    return expressions[0]
+
+
+def parseValue(expression):
+    """
+    :return: value of a model as a Fraction or bool, None for irrational values
+    """
+    if expression in ['true', 'false']:
+        return expression == 'true'
+    if isinstance(expression, str):
+        return Fraction(expression)
+    if expression[0] == '/':
+        return parseValue(expression[1]) / parseValue(expression[2])
+    if expression[0] == '-' and len(expression) == 2:
+        return -parseValue(expression[1])
+    return None
+
+
+class SmtLibWriter:
+    """
+    Takes the place of the z3 solver: the assertions are written to a file in SMT-LIB2 as they are added instead of
+    being kept in memory, and the file is solved by the z3 executable. Assertions are added as SMT-LIB2 text built by
+    SmtLibTerms, which is written right away, or as z3 terms, which are written in batches. Only the names of the
+    declared variables and a batch of z3 terms are held by this process.
+    """
+
+    def __init__(self, path, executable=None):
+        self.path = path
+        self.executable = executable if executable is not None else shutil.which('z3')
+        self.file = None  # opened when the first line is written, so that nothing is left open if nothing is encoded
+        self.declarations = set()  # names of the declared variables
+        self.pending = []
+        self.no_of_assertions = 0
+        self.assignments = []
+        self.solver_statistics = ""
+
+    def add(self, *assertions):
+        for assertion in assertions:
+            if isinstance(assertion, (list, tuple)):
+                self.add(*assertion)
+            elif isinstance(assertion, str):
+                self.no_of_assertions += 1
+                self.write("(assert " + assertion + ")\n")
+            else:
+                self.pending.append(assertion)
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def declare(self, name, sort):
+        """
+        :param sort: Real or Bool
+        """
+        if name not in self.declarations:
+            self.declarations.add(name)
+            self.write("(declare-fun " + symbol(name) + " () " + sort + ")\n")
+
+    def flush(self):
+        if len(self.pending) > 0:
+            solver = Solver()
+            solver.add(self.pending)
+            self.pending = []
+            self.addSmtLib(solver.sexpr())
+
+    def addSmtLib(self, text):
+        """
+        Write assertions given in SMT-LIB2, e.g. encoded by a worker process, without building their terms
+        """
+        for line in text.splitlines(keepends=True):
+            if line.startswith("(declare-fun "):
+                name = declaredName(line)
+                if name in self.declarations:
+                    continue
+                self.declarations.add(name)
+            elif line.startswith("(assert "):
+                self.no_of_assertions += 1
+            self.write(line)
+
+    def write(self, text):
+        if self.file is None:
+            self.file = open(self.path, 'w')
+            self.file.write("(set-logic QF_NRA)\n")
+        self.file.write(text)
+
+    def noOfAssertions(self):
+        """
+        Only the number of assertions is kept, the assertions themselves are in the file
+        """
+        return self.no_of_assertions + len(self.pending)
+
+    def discard(self):
+        """
+        Close and remove the file if it has not been solved, e.g. after the encoding failed, so that no truncated
+        encoding is left behind
+        """
+        if self.file is not None and not self.file.closed:
+            self.file.close()
+            os.remove(self.path)
+
+    def check(self):
+        """
+        Solve the file with the z3 executable and read back the model
+        :return: sat, unsat or unknown
+        """
+        self.flush()
+        # irrational values are printed as roots of polynomials, the second model gives them as decimals
+        self.write("(check-sat)\n(get-model)\n(set-option :pp.decimal true)\n"
+                   "(set-option :pp.decimal_precision 20)\n(get-model)\n")
+        self.file.close()
+        if self.executable is None:
+            raise FileNotFoundError("The z3 executable is needed to solve " + self.path + ".")
+        process = subprocess.run([self.executable, '-st', '-smt2', self.path], capture_output=True, text=True)
+        output = process.stdout
+        expressions = parseExpressions(output)
+        truth = {'sat': sat, 'unsat': unsat}.get(expressions[0] if len(expressions) > 0 else None, unknown)
+        # get-model fails after unsat, so only a missing result means that z3 failed
+        if truth == unknown and process.returncode != 0:
+            common.colourerror("The z3 executable exited with code " + str(process.returncode) + " on " + self.path)
+        if truth == sat:
+            exact, decimal = expressions[1], expressions[2]
+            decimal_values = {definition[1].strip('|'): definition[4] for definition in decimal}
+            for definition in exact:
+                name, value = definition[1].strip('|'), parseValue(definition[4])
+                if value is None:
+                    value = decimal_values[name]
+                self.assignments.append((name, value))
+        if len(expressions) > 0 and isinstance(expressions[-1], list) and len(expressions[-1]) > 0 and \
+                str(expressions[-1][0]).startswith(':'):
+            self.solver_statistics = output[output.rindex("(:"):].strip()
+        return truth
+
+    def model(self):
+        """
+        :return: list of the variables and their values, as Fraction, bool, or decimal string if irrational
+        """
+        return self.assignments
+
+    def statistics(self):
+        return self.solver_statistics
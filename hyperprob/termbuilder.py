@@ -0,0 +1,117 @@
+from z3 import BoolVal, RealVal, main_ctx, z3core
+from z3.z3 import _to_expr_ref
+from z3.z3types import Ast
+
+# initial size of the argument array, it is doubled when a term has more arguments
+ARGUMENTS_SIZE = 64
+
+
+class TermBuilder:
+    """
+    Builds terms directly through the C API of z3, for the loops encoding every composed state.
+    The wrappers And, Or, Product, Sum, ... of the z3 Python API coerce and check their arguments and create a Python
+    object for every term. Here the arguments are copied into an array allocated once, the terms are plain ASTs and
+    only the finished assertions are wrapped by expression.
+    Each term built is kept alive by increasing its reference count until release is called, which decreases the
+    counts of all terms built since the last release at once. The arguments are ASTs of this builder or z3
+    expressions and must have matching sorts, as they are not coerced.
+    """
+
+    def __init__(self):
+        self.ctx = main_ctx()
+        self.ref = self.ctx.ref()
+        self.arguments = (Ast * ARGUMENTS_SIZE)()
+        self.intermediates = []  # terms built since the last release
+        self.numerals = dict()  # dict[value] = z3 expression of the numeral, kept alive
+        self.truth_values = dict()  # dict[value] = z3 expression of the truth value, kept alive
+        self.no_of_terms = 0  # number of terms built, for the benchmark
+
+    def fill(self, terms):
+        """
+        Copy the terms into the argument array
+        :return: number of terms
+        """
+        if len(terms) > len(self.arguments):
+            self.arguments = (Ast * max(len(terms), 2 * len(self.arguments)))()
+        arguments = self.arguments
+        for position, term in enumerate(terms):
+            arguments[position] = term if isinstance(term, Ast) else term.as_ast()
+        return len(terms)
+
+    def keep(self, term):
+        z3core.Z3_inc_ref(self.ref, term)
+        self.intermediates.append(term)
+        self.no_of_terms += 1
+        return term
+
+    def release(self):
+        """
+        Decrease the reference counts of all terms built since the last release. Terms that are still needed have to
+        be wrapped by expression before.
+        """
+        for term in self.intermediates:
+            z3core.Z3_dec_ref(self.ref, term)
+        self.intermediates = []
+
+    @staticmethod
+    def variable(variables, name):
+        """
+        :param variables: dict of the variables by name, dictOfReals or dictOfBools
+        """
+        return variables[name]
+
+    def expression(self, term):
+        """
+        :return: z3 expression of the term, holding its own reference
+        """
+        return _to_expr_ref(term, self.ctx) if isinstance(term, Ast) else term
+
+    def real(self, value):
+        """
+        :param value: int or string of a rational number, as for RealVal
+        """
+        if value not in self.numerals:
+            self.numerals[value] = RealVal(value)
+        return self.numerals[value].as_ast()
+
+    def boolean(self, value):
+        if value not in self.truth_values:
+            self.truth_values[value] = BoolVal(value)
+        return self.truth_values[value].as_ast()
+
+    def conjunction(self, terms):
+        return self.keep(z3core.Z3_mk_and(self.ref, self.fill(terms), self.arguments))
+
+    def disjunction(self, terms):
+        return self.keep(z3core.Z3_mk_or(self.ref, self.fill(terms), self.arguments))
+
+    def product(self, terms):
+        return self.keep(z3core.Z3_mk_mul(self.ref, self.fill(terms), self.arguments))
+
+    def sum(self, terms):
+        return self.keep(z3core.Z3_mk_add(self.ref, self.fill(terms), self.arguments))
+
+    def negation(self, term):
+        return self.keep(z3core.Z3_mk_not(self.ref, self.ast(term)))
+
+    def implies(self, term1, term2):
+        return self.keep(z3core.Z3_mk_implies(self.ref, self.ast(term1), self.ast(term2)))
+
+    def equal(self, term1, term2):
+        return self.keep(z3core.Z3_mk_eq(self.ref, self.ast(term1), self.ast(term2)))
+
+    def less(self, term1, term2):
+        return self.keep(z3core.Z3_mk_lt(self.ref, self.ast(term1), self.ast(term2)))
+
+    def lessEqual(self, term1, term2):
+        return self.keep(z3core.Z3_mk_le(self.ref, self.ast(term1), self.ast(term2)))
+
+    def greater(self, term1, term2):
+        return self.keep(z3core.Z3_mk_gt(self.ref, self.ast(term1), self.ast(term2)))
+
+    def greaterEqual(self, term1, term2):
+        return self.keep(z3core.Z3_mk_ge(self.ref, self.ast(term1), self.ast(term2)))
+
+    @staticmethod
+    def ast(term):
+        return term if isinstance(term, Ast) else term.as_ast()
@@ -0,0 +1,58 @@
+def stronglyConnectedComponents(nodes, successors):
+    """
+    Tarjan's algorithm, iterative so that long paths do not exceed the recursion limit
+    :param nodes: list of nodes of the graph
+    :param successors: function returning the list of successors of a node
+    :return: dict[node] = number of its strongly connected component, set of nodes lying on a cycle,
+             i.e. in a component with several nodes or with a self-loop.
+             Components are numbered in reverse topological order, successors first.
+    """
+    component = dict()
+    on_cycle = set()
+    index = dict()
+    lowlink = dict()
+    stack = []
+    on_stack = set()
+    no_of_components = 0
+    for root in nodes:
+        if root in index:
+            continue
+        # each frame is a node and the iterator over its remaining successors
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        frames = [(root, iter(successors(root)))]
+        while len(frames) > 0:
+            node, remaining = frames[-1]
+            descended = False
+            for succ in remaining:
+                if succ not in index:
+                    index[succ] = lowlink[succ] = len(index)
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    frames.append((succ, iter(successors(succ))))
+                    descended = True
+                    break
+                if succ in on_stack:
+                    lowlink[node] = min(lowlink[node], index[succ])
+                if succ == node:
+                    on_cycle.add(node)
+            if descended:
+                continue
+            frames.pop()
+            if len(frames) > 0:
+                parent = frames[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                members = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component[member] = no_of_components
+                    members.append(member)
+                    if member == node:
+                        break
+                if len(members) > 1:
+                    on_cycle.update(members)
+                no_of_components += 1
+    return component, on_cycle
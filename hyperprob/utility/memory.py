@@ -0,0 +1,14 @@
+import resource
+import sys
+
+
+def getPeakMemory():
+    """
+    Peak resident set size of the current process
+    :return: peak memory usage in megabytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
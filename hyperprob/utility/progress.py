@@ -0,0 +1,99 @@
+import sys
+import time
+
+# seconds between two calls of the callbacks while a phase is running
+CALLBACK_INTERVAL = 0.2
+# seconds between two lines of ProgressReporter when the output is not a terminal
+LOG_INTERVAL = 10.0
+
+
+class Progress:
+    """
+    Progress of the encoding phases iterating over composed states or state tuples.
+    The callbacks are called with the name of the phase, the number of tuples done, the total number of tuples, the
+    number of assertions added, the throughput in tuples per second and whether the phase is finished. They are called
+    when a phase starts and ends, and at most every interval seconds in between.
+    """
+
+    def __init__(self, callbacks=None, interval=CALLBACK_INTERVAL):
+        self.callbacks = list(callbacks) if callbacks is not None else []
+        self.interval = interval
+        self.phase = None
+        self.total = 0
+        self.done = 0
+        self.assertions = 0
+        self.starting_time = 0.0
+        self.last_call = 0.0
+
+    def addCallback(self, callback):
+        self.callbacks.append(callback)
+
+    def begin(self, phase, total):
+        self.phase = phase
+        self.total = total
+        self.done = 0
+        self.assertions = 0
+        self.starting_time = self.last_call = time.perf_counter()
+        self.notify(False)
+
+    def advance(self, tuples=1, assertions=0):
+        self.done += tuples
+        self.assertions += assertions
+        if len(self.callbacks) > 0 and time.perf_counter() - self.last_call >= self.interval:
+            self.notify(False)
+
+    def end(self):
+        self.notify(True)
+        self.phase = None
+
+    def notify(self, finished):
+        now = time.perf_counter()
+        self.last_call = now
+        elapsed = now - self.starting_time
+        throughput = self.done / elapsed if elapsed > 0 else 0.0
+        for callback in self.callbacks:
+            callback(self.phase, self.done, self.total, self.assertions, throughput, finished)
+
+
+class ProgressReporter:
+    """
+    Callback of Progress rendering the progress on a terminal as a single line, redrawn at most every interval seconds.
+    If the stream is not a terminal, a line of key=value pairs is written every LOG_INTERVAL seconds and at the end of
+    each phase instead.
+    """
+
+    def __init__(self, stream=None, interval=CALLBACK_INTERVAL):
+        self.stream = stream if stream is not None else sys.stdout
+        self.terminal = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        self.interval = interval if self.terminal else LOG_INTERVAL
+        self.last_output = None
+
+    def __call__(self, phase, done, total, assertions, throughput, finished):
+        now = time.perf_counter()
+        if done == 0 and not finished:
+            # start of a phase
+            self.last_output = now
+            if self.terminal:
+                self.render(phase, done, total, assertions, throughput, False)
+            return
+        if not finished and now - self.last_output < self.interval:
+            return
+        self.last_output = now
+        if self.terminal:
+            self.render(phase, done, total, assertions, throughput, finished)
+        else:
+            eta = (total - done) / throughput if throughput > 0 else None
+            self.stream.write("progress phase=" + phase + " done=" + str(done) + " total=" + str(total) +
+                              " assertions=" + str(assertions) + " rate=" + str(round(throughput, 1)) +
+                              " eta=" + (str(round(eta, 1)) if eta is not None else "unknown") +
+                              (" finished" if finished else "") + "\n")
+            self.stream.flush()
+
+    def render(self, phase, done, total, assertions, throughput, finished):
+        line = phase + ": " + str(done) + "/" + str(total) + " tuples, " + str(assertions) + " assertions, " + \
+               str(round(throughput)) + " tuples/s"
+        if not finished and throughput > 0:
+            line += ", ETA " + str(round((total - done) / throughput, 1)) + " s"
+        # padded to overwrite a longer previous line
+        self.stream.write("\r" + line.ljust(79) + ("\n" if finished else ""))
+        self.stream.flush()
@@ -0,0 +1,87 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+
+class Tracer:
+    """
+    Records nested spans of the phases of model checking and exports them in the Chrome trace-event format,
+    which can be opened in chrome://tracing or https://ui.perfetto.dev.
+    Spans are only recorded after enable() has been called.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.start_time = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+        self.events = []
+        self.start_time = time.perf_counter()
+
+    def timestamp(self):
+        return (time.perf_counter() - self.start_time) * 1e6
+
+    @contextlib.contextmanager
+    def span(self, name, arguments=None, counters=None):
+        """
+        Record a span around the enclosed block
+        :param name: name of the span
+        :param arguments: dict of additional information shown with the span
+        :param counters: function returning a dict of counts, e.g. variables and assertions;
+                         the increase of each count during the span is recorded with it
+        """
+        if not self.enabled:
+            yield
+            return
+        arguments = dict(arguments) if arguments is not None else dict()
+        counts_before = counters() if counters is not None else dict()
+        starting_time = self.timestamp()
+        try:
+            yield
+        finally:
+            end_time = self.timestamp()
+            if counters is not None:
+                counts_after = counters()
+                for key, value in counts_after.items():
+                    arguments[key + "_added"] = value - counts_before.get(key, 0)
+                self.events.append({'name': 'encoding size', 'ph': 'C', 'ts': end_time,
+                                    'pid': os.getpid(), 'tid': threading.get_ident(), 'args': counts_after})
+            self.events.append({'name': name, 'cat': 'hyperprob', 'ph': 'X', 'ts': starting_time,
+                                'dur': end_time - starting_time, 'pid': os.getpid(),
+                                'tid': threading.get_ident(), 'args': arguments})
+
+    def exportChromeTrace(self, path):
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': sorted(self.events, key=lambda event: event['ts']),
+                       'displayTimeUnit': 'ms'}, trace_file)
+
+
+tracer = Tracer()
+
+
+def traced(describe=None):
+    """
+    Decorator recording a span for each call of a method.
+    The span is named after the method, the counters are taken from the traceCounters method of the object.
+    :param describe: function taking the arguments of the method and returning a suffix for the name of the span
+                     and a dict of arguments shown with the span
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not tracer.enabled:
+                return method(self, *args, **kwargs)
+            name = method.__name__
+            arguments = None
+            if describe is not None:
+                suffix, arguments = describe(*args)
+                name += suffix
+            with tracer.span(name, arguments, getattr(self, 'traceCounters', None)):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
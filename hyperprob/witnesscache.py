@@ -0,0 +1,53 @@
+import hashlib
+import json
+import os
+
+from hyperprob.output import valueToString
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'hyperprob')
+
+
+class WitnessCache:
+    """
+    Stores the scheduler and stutter-scheduler assignments of properties that hold, one file per model and property.
+    The witness of a property is kept when the model file is edited or the parameters change, since it is only
+    a guess for the next run: the model checker tries it first and uses it as hints for the solver if it fails.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY):
+        self.directory = os.path.join(directory, 'witnesses')
+
+    def path(self, model_path, property_string):
+        key = json.dumps([os.path.abspath(model_path), property_string])
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def load(self, model_path, property_string):
+        """
+        :return: dict with the parameters the witness was found for and its assignments as strings,
+                 None if no witness is stored or the file cannot be read
+        """
+        try:
+            with open(self.path(model_path, property_string)) as witness_file:
+                witness = json.load(witness_file)
+        except (OSError, ValueError):
+            return None
+        if witness.get('model') != os.path.abspath(model_path) or witness.get('property') != property_string:
+            return None
+        return witness
+
+    def store(self, model_path, property_string, parameters, assignments):
+        """
+        :param parameters: dict of the parameters of model checking, e.g. stutterLength and maxSchedProb
+        :param assignments: list of variable names and their values in the z3 model
+        """
+        witness = {'model': os.path.abspath(model_path), 'property': property_string, 'parameters': parameters,
+                   'assignments': {name: valueToString(value) for name, value in assignments}}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # write to a temporary file first, so that concurrent runs never read half a witness
+            temporary_path = self.path(model_path, property_string) + "." + str(os.getpid())
+            with open(temporary_path, 'w') as witness_file:
+                json.dump(witness, witness_file, indent=1)
+            os.replace(temporary_path, self.path(model_path, property_string))
+        except OSError:
+            pass  # a witness that cannot be stored only costs time on the next run
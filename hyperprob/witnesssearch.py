@@ -0,0 +1,330 @@
+import random
+import time
+from fractions import Fraction
+
+try:
+    import numpy
+except ImportError:
+    raise ImportError("The witness search requires numpy, install it with 'pip install hyperprob[search]' or 'pip install numpy'.")
+
+from hyperprob.probabilitybounds import infeasibleActionSets
+from hyperprob.propertyparser import untilBounds
+
+# probabilities are compared up to this difference, the error of floating-point arithmetic; a candidate is only a
+# witness once the solver has verified it
+COMPARISON_TOLERANCE = 1e-9
+# sampled scheduler probabilities are rounded to fractions with at most this denominator
+MAX_DENOMINATOR = 1000
+# the iterative solution of the equation systems stops once no probability changes by more than this
+ITERATION_TOLERANCE = 1e-14
+# time in seconds a worker searches before reporting back, so that all workers stop soon after a witness is found
+ROUND_DURATION = 1.0
+
+COMPARISONS = {'less_probability': lambda x, y: x < y - COMPARISON_TOLERANCE,
+               'less_and_equal_probability': lambda x, y: x <= y + COMPARISON_TOLERANCE,
+               'greater_probability': lambda x, y: x > y + COMPARISON_TOLERANCE,
+               'greater_and_equal_probability': lambda x, y: x >= y - COMPARISON_TOLERANCE,
+               'equal_probability': lambda x, y: numpy.abs(x - y) <= COMPARISON_TOLERANCE}
+CONNECTIVES = {'and': numpy.logical_and,
+               'or': numpy.logical_or,
+               'implies': lambda x, y: numpy.logical_or(numpy.logical_not(x), y),
+               'biconditional': numpy.equal}
+ARITHMETIC = {'add_probability': numpy.add,
+              'subtract_probability': numpy.subtract,
+              'multiply_probability': numpy.multiply}
+
+
+class SearchTimeout(Exception):
+    """
+    The time of the search ran out while a candidate was evaluated
+    """
+    pass
+
+
+def initialiseSearchWorker(search):
+    global worker_search
+    worker_search = search
+
+
+def searchRound(seed, duration):
+    """
+    Sample candidates in a worker process
+    :return: see WitnessSearch.search
+    """
+    return worker_search.search(seed, duration)
+
+
+class WitnessSearch:
+    """
+    Samples schedulers and stutter-schedulers and evaluates the property on the chains they induce.
+    Each stutter quantifier moves through its own copy of the states with stuttering, a composed state is a tuple of
+    such nodes and its successors are the products of the successors of the nodes. The value of a subformula is an
+    array with an axis per stutter quantifier, of length one for the stutter quantifiers it does not depend on.
+    """
+
+    def __init__(self, model, non_quantified_property, state_quantifiers, state_domains, stutter_state_mapping,
+                 lengthOfStutter, maxSchedProb, boundedHorizon=None):
+        self.formula = non_quantified_property
+        self.state_quantifiers = state_quantifiers
+        self.state_domains = state_domains
+        self.stutter_state_mapping = stutter_state_mapping
+        self.no_of_stutter_quantifier = len(stutter_state_mapping)
+        self.stutterLength = lengthOfStutter
+        self.maxSchedProb = Fraction(str(maxSchedProb))
+        self.boundedHorizon = boundedHorizon
+        # copy what is needed from the model, so that the search can be sent to worker processes
+        self.states = model.getListOfStates()
+        self.state_index = {state: index for index, state in enumerate(self.states)}
+        self.no_of_nodes = len(self.states) * lengthOfStutter
+        self.actions = {state: list(model.dict_of_acts[state]) for state in self.states}
+        self.transitions = dict()  # dict[(state, action)] = list of (successor, probability)
+        for state in self.states:
+            for action in self.actions[state]:
+                self.transitions[(state, action)] = [
+                    (int(tran[0:tran.find(' ')]), float(Fraction(tran[tran.find(' ') + 1:])))
+                    for tran in model.dict_of_acts_tran[str(state) + ' ' + str(action)]]
+        labeling = model.parsed_model.labeling
+        self.labels = {state: set(labeling.get_labels_of_state(state)) for state in self.states}
+        # action sets share the probabilities of the scheduler, as in ModelChecker.encodeScheduler
+        self.action_sets = sorted({frozenset(actions) for actions in self.actions.values()}, key=sorted)
+        self.infeasible_action_sets = infeasibleActionSets(self.action_sets, maxSchedProb)
+        self.end_time = None  # time.perf_counter() at which the evaluation of a candidate is abandoned, set by search
+
+    def node(self, state, stutter):
+        return self.state_index[state] * self.stutterLength + stutter
+
+    def sample(self, rnd):
+        """
+        Sample a scheduler within the bounds of maxSchedProb and stutter durations
+        :return: dict of the probabilities of the scheduler, dict of the stutter durations, by variable name
+        """
+        scheduler = dict()
+        min_value = 1 - self.maxSchedProb
+        for action_set in self.action_sets:
+            actions = sorted(action_set)
+            if len(actions) == 1:
+                scheduler["a_" + str(set(action_set)) + "_" + str(actions[0])] = Fraction(1)
+                continue
+            while True:
+                self.checkTime()
+                if rnd.random() < 0.5:
+                    # a vertex of the polytope of schedulers, witnesses are often found there
+                    weights = [0.0] * len(actions)
+                    weights[rnd.randrange(len(actions))] = 1.0
+                else:
+                    weights = [rnd.expovariate(1.0) for _ in actions]
+                total = sum(weights)
+                probabilities = [(min_value + (1 - len(actions) * min_value) * Fraction(weight / total))
+                                 .limit_denominator(MAX_DENOMINATOR) for weight in weights[:-1]]
+                probabilities.append(1 - sum(probabilities))
+                if all(min_value <= probability <= self.maxSchedProb for probability in probabilities):
+                    break
+            for action, probability in zip(actions, probabilities):
+                scheduler["a_" + str(set(action_set)) + "_" + str(action)] = probability
+        stutter_scheduler = dict()
+        for quant in range(1, self.no_of_stutter_quantifier + 1):
+            for state in self.states:
+                for action in self.actions[state]:
+                    stutter_scheduler["t_" + str(quant) + "_" + str(state) + "_" + str(action)] = \
+                        rnd.randrange(self.stutterLength)
+        return scheduler, stutter_scheduler
+
+    def chain(self, quant, scheduler, stutter_scheduler):
+        """
+        Transition matrix of the nodes of a stutter quantifier under the scheduler and its stutter-scheduler, in
+        coordinate format, as each node has only a few successors
+        :return: arrays of the rows, columns and probabilities of the entries, an entry may occur more than once
+        """
+        rows, columns, probabilities = [], [], []
+        for state in self.states:
+            action_set = str(set(frozenset(self.actions[state])))
+            for stutter in range(self.stutterLength):
+                node = self.node(state, stutter)
+                for action in self.actions[state]:
+                    probability = float(scheduler["a_" + action_set + "_" + str(action)])
+                    if stutter < stutter_scheduler["t_" + str(quant) + "_" + str(state) + "_" + str(action)]:
+                        rows.append(node)
+                        columns.append(self.node(state, stutter + 1))
+                        probabilities.append(probability)
+                    else:
+                        for succ, succ_probability in self.transitions[(state, action)]:
+                            rows.append(node)
+                            columns.append(self.node(succ, 0))
+                            probabilities.append(probability * succ_probability)
+        return numpy.array(rows, dtype=int), numpy.array(columns, dtype=int), numpy.array(probabilities)
+
+    def evaluate(self, scheduler, stutter_scheduler):
+        """
+        :return: array of the truth values of the non-quantified property in the state tuples, with an axis per
+                 state quantifier ranging over its domain
+        """
+        chains = [self.chain(quant, scheduler, stutter_scheduler)
+                  for quant in range(1, self.no_of_stutter_quantifier + 1)]
+        holds = self.value(self.formula, chains, dict())
+        shape = tuple(len(self.state_domains[state_index]) for state_index, _, _ in self.state_quantifiers)
+        position_in_prefix = {state_index: pos for pos, (state_index, _, _) in enumerate(self.state_quantifiers)}
+        indices = []
+        for quant in range(1, self.no_of_stutter_quantifier + 1):
+            if holds.shape[quant - 1] == 1:
+                indices.append(0)
+                continue
+            pos = position_in_prefix[self.stutter_state_mapping[quant]]
+            nodes = numpy.array([self.node(state, 0) for state in self.state_domains[self.stutter_state_mapping[quant]]])
+            indices.append(nodes.reshape([-1 if axis == pos else 1 for axis in range(len(shape))]))
+        return numpy.broadcast_to(holds[tuple(indices)], shape)
+
+    def holds(self, state_tuple_values):
+        """
+        Fold the truth values of the state tuples over the state quantifiers, the innermost first
+        """
+        folded = state_tuple_values
+        for _, quantifier, _ in reversed(self.state_quantifiers):
+            folded = folded.all(axis=-1) if quantifier == 'A' else folded.any(axis=-1)
+        return bool(folded)
+
+    def value(self, formula, chains, values):
+        """
+        :param chains: transition matrices of the stutter quantifiers, as returned by chain
+        :param values: dict[id of subformula] = its value, for subformulas occurring several times
+        :return: array of the truth values or probabilities of the formula in the composed states
+        """
+        if id(formula) in values:
+            return values[id(formula)]
+        one = (1,) * self.no_of_stutter_quantifier
+        data = formula.data
+        if data == 'true':
+            result = numpy.ones(one, dtype=bool)
+        elif data == 'atomic_proposition':
+            ap_name = formula.children[0].children[0].value
+            quant = int(formula.children[1].children[0].value[1:])
+            labelled = numpy.array([ap_name in self.labels[state] for state in self.states for _ in
+                                    range(self.stutterLength)])
+            result = labelled.reshape([-1 if axis == quant - 1 else 1 for axis in range(self.no_of_stutter_quantifier)])
+        elif data == 'not':
+            result = numpy.logical_not(self.value(formula.children[0], chains, values))
+        elif data == 'constant_probability':
+            result = numpy.full(one, float(Fraction(formula.children[0].value)))
+        elif data in CONNECTIVES.keys() or data in COMPARISONS.keys() or data in ARITHMETIC.keys():
+            operation = CONNECTIVES.get(data) or COMPARISONS.get(data) or ARITHMETIC.get(data)
+            result = operation(self.value(formula.children[0], chains, values),
+                               self.value(formula.children[1], chains, values))
+        elif data == 'probability':
+            result = self.probability(formula.children[0], chains, values)
+        else:
+            raise ValueError("The witness search does not support " + data + ".")
+        values[id(formula)] = result
+        return result
+
+    def probability(self, path_formula, chains, values):
+        data = path_formula.data
+        true = numpy.ones((1,) * self.no_of_stutter_quantifier, dtype=bool)
+        if data == 'next':
+            phi = self.value(path_formula.children[0], chains, values).astype(float)
+            return self.step(phi, chains, [axis for axis in range(phi.ndim) if phi.shape[axis] > 1])
+        elif data == 'until_bounded':
+            lower, upper = untilBounds(path_formula)
+            return self.boundedUntil(self.value(path_formula.children[0], chains, values),
+                                     self.value(path_formula.children[3], chains, values), chains, lower, upper)
+        elif data == 'global':
+            phi = self.value(path_formula.children[0], chains, values)
+            if self.boundedHorizon is not None:
+                return self.boundedUntil(phi, phi, chains, 0, self.boundedHorizon, globally=True)
+            return 1 - self.until(true, numpy.logical_not(phi), chains)
+        elif data in ['until_unbounded', 'future']:
+            phi1 = self.value(path_formula.children[0], chains, values) if data == 'until_unbounded' else true
+            phi2 = self.value(path_formula.children[-1], chains, values)
+            if self.boundedHorizon is not None:
+                return self.boundedUntil(phi1, phi2, chains, 0, self.boundedHorizon)
+            return self.until(phi1, phi2, chains)
+        raise ValueError("The witness search does not support " + data + ".")
+
+    def step(self, value, chains, axes):
+        """
+        Expected value after one step of the composed states, which move along all given axes at once
+        """
+        for axis in axes:
+            rows, columns, probabilities = chains[axis]
+            moved = numpy.moveaxis(value, axis, 0)
+            contributions = probabilities.reshape((-1,) + (1,) * (moved.ndim - 1)) * moved[columns]
+            stepped = numpy.zeros((self.no_of_nodes,) + moved.shape[1:])
+            numpy.add.at(stepped, rows, contributions)
+            value = numpy.moveaxis(stepped, 0, axis)
+        return value
+
+    def checkTime(self):
+        if self.end_time is not None and time.perf_counter() > self.end_time:
+            raise SearchTimeout()
+
+    def until(self, phi1, phi2, chains):
+        """
+        Probability of phi1 U phi2, the least solution of the equation system of the composed states.
+        The chains of the stutter quantifiers are kept apart, as the chain of the composed states has the product of
+        their sizes squared as entries: the system is solved by value iteration with step, from below, until no
+        probability changes by more than ITERATION_TOLERANCE
+        """
+        phi1, phi2 = numpy.broadcast_arrays(phi1, phi2)
+        axes = [axis for axis in range(phi1.ndim) if phi1.shape[axis] > 1]
+        # states reaching phi2 through phi1 with positive probability
+        reaching = phi2.copy()
+        while True:
+            self.checkTime()
+            extended = numpy.logical_or(reaching, numpy.logical_and(phi1, self.step(reaching.astype(float), chains,
+                                                                                     axes) > 0))
+            if numpy.array_equal(extended, reaching):
+                break
+            reaching = extended
+        targets = phi2.astype(float)
+        undecided = numpy.logical_and(reaching, numpy.logical_not(phi2))
+        result = targets
+        while undecided.any():
+            self.checkTime()
+            iterated = numpy.where(undecided, self.step(result, chains, axes), targets)
+            if numpy.max(numpy.abs(iterated - result)) <= ITERATION_TOLERANCE:
+                return iterated
+            result = iterated
+        return result
+
+    def boundedUntil(self, phi1, phi2, chains, lower, upper, globally=False):
+        """
+        Probability of phi1 U[lower, upper] phi2, or of G[0, upper] phi1 if globally, layer by layer from the last,
+        as in SemanticsEncoder.encodeBoundedState
+        """
+        phi1, phi2 = numpy.broadcast_arrays(phi1, phi2)
+        axes = [axis for axis in range(phi1.ndim) if phi1.shape[axis] > 1]
+        if globally:
+            result = phi1.astype(float)
+        else:
+            result = phi2.astype(float) if upper >= lower else numpy.zeros(phi1.shape)
+        for layer in range(upper - 1, -1, -1):
+            self.checkTime()
+            proceed = self.step(result, chains, axes)
+            if globally:
+                result = numpy.where(phi1, proceed, 0.0)
+            elif layer >= lower:
+                result = numpy.where(phi2, 1.0, numpy.where(phi1, proceed, 0.0))
+            else:
+                result = numpy.where(phi1, proceed, 0.0)
+        return result
+
+    def search(self, seed, duration):
+        """
+        Sample candidates until one satisfies the property or the time is up, a candidate whose evaluation is not
+        finished in time is dropped
+        :return: scheduler, stutter-scheduler and truth values of the state tuples of the witness, None if none was
+                 found; number of candidates sampled
+        """
+        rnd = random.Random(seed)
+        self.end_time = time.perf_counter() + duration
+        no_of_candidates = 0
+        try:
+            while time.perf_counter() < self.end_time:
+                scheduler, stutter_scheduler = self.sample(rnd)
+                no_of_candidates += 1
+                state_tuple_values = self.evaluate(scheduler, stutter_scheduler)
+                if self.holds(state_tuple_values):
+                    return (scheduler, stutter_scheduler, state_tuple_values), no_of_candidates
+        except SearchTimeout:
+            pass  # the time ran out while evaluating the last candidate
+        finally:
+            self.end_time = None
+        return None, no_of_candidates
@@ -1,12 +1,17 @@
 from setuptools import setup, find_packages
+import os
+import re
 import sys
 
 if sys.version_info[0] == 2:
     sys.exit('Sorry, Python 2.x is not supported')
 
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hyperprob', '__init__.py')) as init_file:
+    version = re.search(r"__version__ = '(.*)'", init_file.read()).group(1)
+
 setup(
     name='hyperprob',
-    version='0.1.0',
+    version=version,
     description='Model checker for Probabilistic Hyperproperties',
     url='https://github.com/TART-MSU/HyperProb',
     author='Oyendrila Dobe',
@@ -18,6 +23,9 @@ setup(
         'z3-solver==4.11.2',
         'termcolor'
     ],
+    extras_require={
+        'search': ['numpy']
+    },
     python_requires='>=3.9',
 
     classifiers=[
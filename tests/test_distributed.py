@@ -0,0 +1,102 @@
+"""
+Coordinator and worker of the distributed job runner on localhost. The worker process runs the jobs with a stand-in
+for server.runJob, so neither stormpy nor z3 is needed: a job sleeps, kills its process, or reports the number of
+models cached by its process.
+"""
+import io
+import json
+import os
+import threading
+import time
+
+import hyperprob.server
+from hyperprob import distributed
+from hyperprob.distributed import Coordinator, Worker
+
+
+def runFakeJob(job):
+    action = job.get('action')
+    if action == 'sleep':
+        time.sleep(60)
+    elif action == 'die':
+        os._exit(1)
+    elif action == 'die_once':
+        # the marker file tells the attempts apart, as each attempt runs in a new process
+        if not os.path.exists(job['marker']):
+            open(job['marker'], 'w').close()
+            os._exit(1)
+    elif action == 'cache':
+        hyperprob.server.addToCache(hyperprob.server.model_cache, job['id'], object())
+        return {'id': job.get('id'), 'status': 'ok', 'cached': len(hyperprob.server.model_cache)}
+    return {'id': job.get('id'), 'status': 'ok'}
+
+
+def serveFakeJobs(connection, size_of_cache):
+    distributed.initialiseWorker = lambda size: None
+    distributed.runJob = runFakeJob
+    distributed.serveJobs(connection, size_of_cache)
+
+
+def runJobs(monkeypatch, jobs, retries=2, job_timeout=None):
+    """
+    Hand out the jobs from a coordinator on a free port to a single worker
+    :return: dict[id] = result
+    """
+    monkeypatch.setattr(distributed, 'serveJobs', serveFakeJobs)
+    output = io.StringIO()
+    coordinator = Coordinator(jobs, retries=retries, job_timeout=job_timeout, output=output)
+    thread = threading.Thread(target=coordinator.serve, kwargs={'port': 0})
+    thread.start()
+    while coordinator.tcp_server is None:
+        time.sleep(0.01)
+    Worker(port=coordinator.tcp_server.server_address[1], name='test').serve()
+    thread.join(timeout=30)
+    assert not thread.is_alive()
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert len(results) == len(jobs)
+    return {result['id']: result for result in results}
+
+
+def test_results_come_back(monkeypatch):
+    results = runJobs(monkeypatch, [{'id': index} for index in range(3)])
+    assert set(results) == {0, 1, 2}
+    for result in results.values():
+        assert result['status'] == 'ok'
+        assert result['worker'] == 'test'
+        assert result['attempts'] == 1
+
+
+def test_timeout_is_retried(monkeypatch):
+    results = runJobs(monkeypatch, [{'id': 'slow', 'action': 'sleep', 'timeout': 0.5}, {'id': 'fast'}], retries=2)
+    assert results['slow']['status'] == 'timeout'
+    assert results['slow']['attempts'] == 3
+    assert results['fast']['status'] == 'ok'
+
+
+def test_killed_process_is_retried(monkeypatch, tmp_path):
+    results = runJobs(monkeypatch, [{'id': 'dies', 'action': 'die'},
+                                    {'id': 'recovers', 'action': 'die_once', 'marker': str(tmp_path / 'marker')}],
+                      retries=1)
+    assert results['dies']['status'] == 'crashed'
+    assert results['dies']['attempts'] == 2
+    assert results['recovers']['status'] == 'ok'
+    assert results['recovers']['attempts'] == 2
+
+
+def test_memory_limit_clears_caches(monkeypatch):
+    results = runJobs(monkeypatch, [{'id': 1, 'action': 'cache'}, {'id': 2, 'action': 'cache'},
+                                    {'id': 3, 'action': 'cache', 'memoryLimit': 100000}])
+    assert [results[index]['cached'] for index in [1, 2, 3]] == [1, 2, 1]
+
+
+def test_failed_job_is_queued_again():
+    output = io.StringIO()
+    coordinator = Coordinator([{'id': 'job'}], retries=1, output=output)
+    job, attempts = coordinator.take()
+    coordinator.finish(job, attempts + 1, 'worker', {'id': 'job', 'status': 'crashed'})
+    assert output.getvalue() == ""
+    job, attempts = coordinator.take()
+    assert attempts == 1
+    coordinator.finish(job, attempts + 1, 'worker', {'id': 'job', 'status': 'crashed'})
+    assert json.loads(output.getvalue())['attempts'] == 2
+    assert coordinator.take() is None
@@ -0,0 +1,153 @@
+"""
+Differential check of the verdicts of the encoding with and without the options that change it, on small random MDPs
+built in memory: the shortcut of the loop conditions for composed states not on a cycle, the probability bounds
+asserted as lemmas, the lazy instantiation of universal state quantifiers, the encoding workers, the interval
+pre-check deciding properties before encoding and the encoding written to an SMT-LIB file.
+"""
+import contextlib
+import io
+import random
+import shutil
+from fractions import Fraction
+
+import pytest
+
+pytest.importorskip("stormpy")
+
+from hyperprob.modelchecker import ModelChecker
+from hyperprob.modelparser import Model
+from hyperprob.propertyparser import Property
+from hyperprob.semanticencoder import SemanticsEncoder
+
+SEEDS = range(12)
+PROPERTIES = ["ES sh . A s1 . ET t1 (s1) . (P(F a(t1)) > 0.7)",
+              "ES sh . A s1 . ET t1 (s1) . (P(a(t1) U b(t1)) >= 0.5)",
+              "ES sh . E s1 . ET t1 (s1) . (P(G a(t1)) > 0.3)",
+              "ES sh . A s1 . ET t1 (s1) . (P(a(t1) U[1, 3] b(t1)) < 0.6)",
+              "ES sh . A s1 . A s2 . ET t1 (s1) . ET t2 (s2) . (P(F b(t1)) = P(F b(t2)))",
+              "ES sh . A s1 . E s2 . ET t1 (s1) . ET t2 (s2) . (P(G a(t1)) <= P(a(t2) U b(t2)))"]
+
+
+class Transition:
+    def __init__(self, column, probability):
+        self.column = column
+        self.probability = probability
+
+    def value(self):
+        return self.probability
+
+
+class Action:
+    def __init__(self, id, transitions):
+        self.id = id
+        self.transitions = transitions
+
+
+class State:
+    def __init__(self, id, actions):
+        self.id = id
+        self.actions = actions
+
+
+class Labeling:
+    def __init__(self, labels):
+        self.labels = labels  # dict[state] = set of labels
+
+    def get_labels(self):
+        return set().union(*self.labels.values())
+
+    def get_labels_of_state(self, state):
+        return self.labels.get(state, set())
+
+
+class SparseModel:
+    """
+    The part of the exact MDP built by stormpy read by the model checker
+    """
+
+    def __init__(self, states, labels):
+        self.states = states
+        self.labeling = Labeling(labels)
+        self.reward_models = dict()
+
+
+def randomModel(seed):
+    """
+    MDP with three to five states, one or two actions per state and one or two successors per action, state 0 is
+    the initial state and carries both labels a and b
+    """
+    rnd = random.Random(seed)
+    no_of_states = rnd.randint(3, 5)
+    states = []
+    for state in range(no_of_states):
+        actions = []
+        for action in range(rnd.choice([1, 1, 2])):
+            successors = rnd.sample(range(no_of_states), rnd.choice([1, 2]))
+            probabilities = [Fraction(1)] if len(successors) == 1 else [Fraction(1, 3), Fraction(2, 3)]
+            actions.append(Action(action, [Transition(successor, probability)
+                                           for successor, probability in zip(successors, probabilities)]))
+        states.append(State(state, actions))
+    labels = {state: {rnd.choice(['a', 'b'])} for state in range(no_of_states)}
+    labels[0] |= {'a', 'b', 'init'}
+    model = Model("random" + str(seed))
+    model.parsed_model = SparseModel(states, labels)
+    for state in states:
+        model.list_of_states.append(state.id)
+        model.dict_of_acts[state.id] = [action.id for action in state.actions]
+        for action in state.actions:
+            model.dict_of_acts_tran[str(state.id) + ' ' + str(action.id)] = \
+                [str(transition.column) + ' ' + str(transition.value()) for transition in action.transitions]
+    return model
+
+
+def verdict(seed, property_string, maxSchedProb=0.99, **options):
+    hyperproperty = Property(property_string)
+    hyperproperty.parseProperty(False)
+    # the progress reporter takes stdout when it is created
+    with contextlib.redirect_stdout(io.StringIO()):
+        modelchecker = ModelChecker(randomModel(seed), hyperproperty, 1, maxSchedProb, **options)
+        modelchecker.modelCheck()
+    assert modelchecker.statistics['verdict'] in ['holds', 'does not hold']
+    return modelchecker.statistics['verdict']
+
+
+@pytest.mark.parametrize("property_string", PROPERTIES)
+def test_loop_conditions_on_cycles_only(monkeypatch, property_string):
+    verdicts = [verdict(seed, property_string) for seed in SEEDS]
+    # every composed state on a cycle and no successor leaving its component: the loop conditions everywhere
+    monkeypatch.setattr(SemanticsEncoder, 'onCycle', lambda self, r_state, relevant_quantifier: True)
+    monkeypatch.setattr(SemanticsEncoder, 'leavesComponent', lambda self, r_state, cs, relevant_quantifier: False)
+    assert [verdict(seed, property_string) for seed in SEEDS] == verdicts
+
+
+@pytest.mark.parametrize("property_string", PROPERTIES)
+def test_probability_bounds(property_string):
+    assert [verdict(seed, property_string, probabilityBounds=True) for seed in SEEDS] == \
+        [verdict(seed, property_string) for seed in SEEDS]
+
+
+@pytest.mark.parametrize("property_string", PROPERTIES)
+def test_lazy_quantifiers(property_string):
+    assert [verdict(seed, property_string, lazyQuantifiers=True) for seed in SEEDS] == \
+        [verdict(seed, property_string) for seed in SEEDS]
+
+
+@pytest.mark.parametrize("property_string", PROPERTIES[::2])
+def test_encoding_workers(property_string):
+    assert [verdict(seed, property_string, encodingWorkers=2) for seed in SEEDS[:4]] == \
+        [verdict(seed, property_string) for seed in SEEDS[:4]]
+
+
+@pytest.mark.parametrize("maxSchedProb", [0.99, 0.6, 0.3])
+@pytest.mark.parametrize("property_string", PROPERTIES[:3] + ["ES sh . A s1 . ET t1 (s1) . (P(F a(t1)) >= 0)"])
+def test_pre_check(property_string, maxSchedProb):
+    # below 0.5, no scheduler chooses between two actions within maxSchedProb
+    assert [verdict(seed, property_string, maxSchedProb, preCheck=True) for seed in SEEDS] == \
+        [verdict(seed, property_string, maxSchedProb) for seed in SEEDS]
+
+
+@pytest.mark.skipif(shutil.which("z3") is None, reason="needs the z3 executable")
+@pytest.mark.parametrize("property_string", PROPERTIES)
+def test_smtlib_file(tmp_path, property_string):
+    assert [verdict(seed, property_string, smtLibFile=str(tmp_path / "encoding.smt2")) for seed in SEEDS[:6]] == \
+        [verdict(seed, property_string) for seed in SEEDS[:6]]
@@ -0,0 +1,33 @@
+"""
+The LALR parser with its fallback to the Earley parser gives the same trees as the Earley parser alone, including
+propositions starting with F, G or X after a bracket and unbracketed chains of arithmetic operators.
+"""
+import pytest
+
+from hyperprob.propertyparser import getParser, parse
+
+CORPUS = ["ES sh . A s1 . ET t1 (s1) . (P(F a(t1)) > 0.7)",
+          "ES sh . A s1 . ET t1 (s1) . (P(a(t1) U b(t1)) >= 0.5)",
+          "ES sh . E s1 . ET t1 (s1) . (P(G a(t1)) > 0.3)",
+          "ES sh . A s1 . ET t1 (s1) . (P(X a(t1)) <= 1)",
+          "ES sh . A s1 . ET t1 (s1) . (P(a(t1) U[1, 3] b(t1)) < 0.6)",
+          "AS sh . A s1 . A s2 . ET t1 (s1) . ET t2 (s2) . (P(F b(t1)) = P(F b(t2)))",
+          "ES sh . A s1 [init] . E s2 . ET t1 (s1) . ET t2 (s2) . (a(t1) -> (P(G a(t1)) <= P(a(t2) U b(t2))))",
+          "ES sh . A s1 . AT t1 (s1) . ~((a(t1) <-> b(t1)))",
+          "ES sh . A s1 . ET t1 (s1) . (R rew (F a(t1)) < 10)",
+          # propositions starting with F, G or X after a bracket
+          "ES sh . A s1 . (Fin(s1) & a(s1))",
+          "ES sh . A s1 . (Xa(s1) | Ga(s1))",
+          "ES sh . A s1 . ET t1 (s1) . (P(Fin(t1) U Xa(t1)) > 0.5)",
+          "ES sh . A s1 . ET t1 (s1) . (P(F Fin(t1)) > 0.5)",
+          "ES sh . A s1 . ET t1 (s1) . (P(X Xa(t1)) > 0.5)",
+          # unbracketed chains of arithmetic operators
+          "ES sh . A s1 . ET t1 (s1) . (P(F a(t1)) + P(F b(t1)) - P(F c(t1)) > 0.5)",
+          "ES sh . A s1 . ET t1 (s1) . (P(F a(t1)) - P(F b(t1)) + P(F c(t1)) > 0.5)",
+          "ES sh . A s1 . ET t1 (s1) . (P(F a(t1)) . P(F b(t1)) + 0.5 < P(F c(t1)) - 0.1 - 0.2)",
+          "ES sh . A s1 . ET t1 (s1) . (R rew (F a(t1)) + R rew (F b(t1)) - 3 > 1)"]
+
+
+@pytest.mark.parametrize("property_string", CORPUS)
+def test_same_tree_as_earley(property_string):
+    assert parse(property_string) == getParser('earley').parse(property_string)
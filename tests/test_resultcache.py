@@ -0,0 +1,58 @@
+"""
+Keys of the result cache: properties differing only in whitespace, the names of their variables or the notation of
+their constants share an entry, and the satisfying state tuples come back in the order of the property loading them.
+Only the parser is needed, neither stormpy nor z3.
+"""
+import pytest
+
+from hyperprob.propertyparser import Property, canonicalProperty, stateVariableOrder
+from hyperprob.resultcache import ResultCache, fromCanonicalTuple, toCanonicalTuple
+
+
+def parse(property_string):
+    hyperproperty = Property(property_string)
+    hyperproperty.parseProperty(False)
+    return hyperproperty.parsed_property
+
+
+@pytest.mark.parametrize("property_string", ["ES sh . A s1 . ET t1 (s1) . (P(F a(t1)) > 0.7)",
+                                             "ES  sched . A s2 . ET t2 (s2) . (P(F a(t2)) > 0.70)",
+                                             "ES sh . A s1 . ET t1 (s1) . (P(F a(t1)) > .7)"])
+def test_equivalent_properties_share_the_key(property_string):
+    assert canonicalProperty(parse(property_string)) == \
+        canonicalProperty(parse("ES sh . A s1 . ET t1 (s1) . (P(F a(t1)) > 0.7)"))
+
+
+def test_different_properties_differ():
+    assert canonicalProperty(parse("ES sh . A s1 . ET t1 (s1) . (P(F a(t1)) > 0.7)")) != \
+        canonicalProperty(parse("ES sh . E s1 . ET t1 (s1) . (P(F a(t1)) > 0.7)"))
+
+
+def test_state_variables_are_renamed_in_order_of_quantification():
+    swapped = parse("ES sh . A s2 . E s1 . ET t1 (s2) . ET t2 (s1) . (P(F a(t1)) = P(F b(t2)))")
+    ordered = parse("ES sh . A s1 . E s2 . ET t1 (s1) . ET t2 (s2) . (P(F a(t1)) = P(F b(t2)))")
+    assert canonicalProperty(swapped) == canonicalProperty(ordered)
+    assert stateVariableOrder(swapped) == [2, 1]
+    assert stateVariableOrder(ordered) == [1, 2]
+
+
+@pytest.mark.parametrize("order", [[1], [1, 2], [2, 1], [3, 1, 2], [2, 3, 1]])
+def test_canonical_tuple_round_trip(order):
+    state_tuple = tuple(10 * index for index in range(1, len(order) + 1))
+    canonical_tuple = toCanonicalTuple(state_tuple, order)
+    assert canonical_tuple == tuple(10 * index for index in order)
+    assert fromCanonicalTuple(canonical_tuple, order) == state_tuple
+
+
+def test_swapped_properties_share_an_entry(tmp_path):
+    model_path = tmp_path / "model.nm"
+    model_path.write_text("mdp\n")
+    cache = ResultCache(str(tmp_path))
+    parameters = {'stutterLength': 1, 'maxSchedProb': 0.99}
+    swapped = parse("ES sh . A s2 . E s1 . ET t1 (s2) . ET t2 (s1) . (P(F a(t1)) = P(F b(t2)))")
+    ordered = parse("ES sh . A s1 . E s2 . ET t1 (s1) . ET t2 (s2) . (P(F a(t1)) = P(F b(t2)))")
+    # (state of s1, state of s2) of the swapped property
+    cache.store(str(model_path), swapped, parameters, {'verdict': 'holds', 'decided_by': 'solver'}, {'a': 1},
+                {(0, 3), (1, 4)})
+    assert cache.load(str(model_path), ordered, parameters)['satisfying_tuples'] == [(3, 0), (4, 1)]
+    assert cache.load(str(model_path), swapped, parameters)['satisfying_tuples'] == [(0, 3), (1, 4)]